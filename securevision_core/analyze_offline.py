@@ -0,0 +1,229 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import PROCESSING_WIDTH, WEAPON_CLASSES, LUGGAGE_CLASSES
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.ts')
+
+
+class EventRecorder:
+    """
+    StatsManager-compatible event sink for offline runs (no database).
+
+    Events come from two places: `log_event` calls made by the pipeline itself
+    (abandoned luggage) and CRITICAL transitions in the per-frame dashboard data
+    (weapons, confirmed fights). Each event is stamped with the frame number and the
+    video timestamp, and reported once per (event, track) pair.
+    """
+    def __init__(self, video_path):
+        self.video = video_path
+        self.events = []
+        self.frame_number = 0
+        self.timestamp = 0.0
+        self._seen = set()
+
+    def _record(self, event_type, track_id, details):
+        key = (event_type, track_id)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self.events.append({
+            'video': self.video,
+            'frame': self.frame_number,
+            'timestamp': round(self.timestamp, 3),
+            'video_time': time.strftime('%H:%M:%S', time.gmtime(self.timestamp)) + f".{int(self.timestamp * 1000) % 1000:03d}",
+            'event': event_type,
+            'track_id': track_id,
+            'details': details,
+        })
+
+    def log_event(self, event_type, details=None):
+        details = dict(details or {})
+        self._record(event_type, details.pop('track_id', None), details)
+
+    def observe(self, log_data):
+        for item in log_data or []:
+            if item.get('status') != 'CRITICAL':
+                continue
+            category = item.get('category')
+            if category in WEAPON_CLASSES:
+                self._record('WEAPON', item['id'], {'class': category})
+            elif category == 'person' and 'FIGHTING' in item.get('details', ''):
+                self._record('FIGHT', item['id'], {'details': item['details']})
+
+
+def _init_worker(threads):
+    # Each worker gets its share of the cores instead of every worker oversubscribing all of them
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def analyze_video(video_path, capture_dir=None):
+    """
+    Runs the full pipeline over one file as fast as possible.
+
+    Returns:
+        dict: {'video', 'frames', 'seconds', 'fps', 'events', 'error'}
+    """
+    from core_pipeline.pipeline import SecureVisionPipeline
+
+    recorder = EventRecorder(video_path)
+    stream_id = os.path.splitext(os.path.basename(video_path))[0]
+    pipeline = SecureVisionPipeline(stream_id=stream_id, stats_manager=recorder, capture_dir=capture_dir)
+    # Frames arrive as fast as they decode, so async FightNet verdicts would land on a
+    # timing-dependent frame; verify inline so the same video always gives the same events
+    pipeline.fight_detector.verifier = None
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    frame_number = 0
+    started = time.perf_counter()
+    error = None
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_number += 1
+            recorder.frame_number = frame_number
+            pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            recorder.timestamp = pos_ms / 1000.0 if pos_ms > 0 else (frame_number - 1) / fps
+
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            h, w = frame_rgb.shape[:2]
+            frame_small = cv2.resize(frame_rgb, (PROCESSING_WIDTH, int(PROCESSING_WIDTH * h / w)))
+            _, _, log_data = pipeline.process_frame(frame_small, frame_number, full_res_frame=frame_rgb)
+            recorder.observe(log_data)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        cap.release()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'video': video_path,
+        'frames': frame_number,
+        'seconds': round(elapsed, 2),
+        'fps': round(frame_number / elapsed, 1) if elapsed > 0 else 0.0,
+        'events': recorder.events,
+        'error': error,
+    }
+
+
+def collect_videos(inputs, recursive=False):
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                videos.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(VIDEO_EXTENSIONS))
+                if not recursive:
+                    break
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"Skipping missing input: {path}")
+    return videos
+
+
+class EventWriter:
+    """Streams events to JSONL as files finish; Parquet is written once at the end."""
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.rows = []
+        self._file = None if self.parquet else open(path, 'w')
+
+    def write(self, events):
+        if self.parquet:
+            self.rows.extend(events)
+            return
+        for event in events:
+            self._file.write(json.dumps(event, default=str) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if not self.parquet:
+            self._file.close()
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            fallback = os.path.splitext(self.path)[0] + '.jsonl'
+            print(f"pyarrow is not installed; writing {fallback} instead.")
+            with open(fallback, 'w') as f:
+                for event in self.rows:
+                    f.write(json.dumps(event, default=str) + '\n')
+            return
+        # Nested details are stored as JSON strings so every row shares one schema
+        rows = [dict(event, details=json.dumps(event['details'], default=str)) for event in self.rows]
+        pq.write_table(pa.Table.from_pylist(rows), self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch analysis of recorded video (no display, no API).")
+    parser.add_argument('inputs', nargs='+', help="Video files and/or directories")
+    parser.add_argument('-o', '--output', default='events.jsonl', help="Events file (.jsonl or .parquet)")
+    parser.add_argument('-j', '--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Videos analyzed in parallel")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Descend into sub-directories")
+    parser.add_argument('--captures', default=None, help="Directory for critical-event snapshots (off by default)")
+    args = parser.parse_args()
+
+    videos = collect_videos(args.inputs, args.recursive)
+    if not videos:
+        print("No videos found.")
+        sys.exit(1)
+
+    workers = min(args.workers, len(videos))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Analyzing {len(videos)} videos with {workers} workers ({threads} threads each) -> {args.output}")
+
+    writer = EventWriter(args.output)
+    started = time.perf_counter()
+    total_frames = total_events = failures = 0
+    # 'spawn' keeps CUDA/torch state out of forked children
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = {pool.submit(analyze_video, video,
+                               os.path.join(args.captures, os.path.splitext(os.path.basename(video))[0])
+                               if args.captures else None): video
+                   for video in videos}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'video': video, 'frames': 0, 'fps': 0.0, 'events': [], 'error': str(e)}
+            writer.write(result['events'])
+            total_frames += result['frames']
+            total_events += len(result['events'])
+            if result['error']:
+                failures += 1
+                print(f"  [FAILED] {video}: {result['error']}")
+            else:
+                print(f"  {os.path.basename(video)}: {result['frames']} frames @ {result['fps']} FPS, "
+                      f"{len(result['events'])} events")
+    writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {total_frames} frames, {total_events} events, {failures} failed in {elapsed:.1f}s "
+          f"({total_frames / elapsed if elapsed > 0 else 0:.1f} FPS aggregate).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Standalone MJPEG server for the annotated output ring.
+
+Runs in its own process (started by run_system.py when USE_SHARED_FRAME_RING is on),
+so JPEG encoding and HTTP streaming never compete with inference for the GIL.
+Frames are read straight out of shared memory with `SharedFrameRing.read_latest`.
+"""
+import os
+import sys
+import time
+import cv2
+import uvicorn
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import STREAM_JPEG_QUALITY, STREAM_MAX_FPS
+from utils.frame_ring import SharedFrameRing
+
+
+def create_stream_app(ring):
+    app = FastAPI()
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    def mjpeg_frames():
+        last_seq = 0
+        min_interval = 1.0 / STREAM_MAX_FPS
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY]
+        while not ring.closed:
+            latest = ring.read_latest()
+            if latest is None or latest[0] == last_seq:
+                time.sleep(0.005)
+                continue
+
+            seq, _, frame = latest
+            started = time.monotonic()
+            ok, jpeg = cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), encode_params)
+            # The pipeline never waits for us; drop the frame if it was overwritten mid-encode
+            if not ok or not ring.is_current(seq):
+                continue
+            last_seq = seq
+
+            yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n'
+
+            remaining = min_interval - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    @app.get("/video_feed")
+    def video_feed():
+        return StreamingResponse(mjpeg_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+    return app
+
+
+def run_stream_server(ring_spec, port):
+    """Process entry point: attaches to the output ring and serves it on `port`."""
+    ring = SharedFrameRing.attach(**ring_spec)
+    try:
+        uvicorn.run(create_stream_app(ring), host="0.0.0.0", port=port, log_level="warning")
+    finally:
+        ring.close()
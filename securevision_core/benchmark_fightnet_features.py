@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core_pipeline.fightnet_integration import extract_features, FightNet
+from core_pipeline.fightnet_streaming import StreamingFightNet, frame_feature_rows
+from test_fightnet_features import loop_extract_features
+
+
+def _time(fn, repeats):
+    fn() # Warm-up
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FightNet feature extraction: per-frame loop vs vectorized.")
+    parser.add_argument('--frames', type=int, default=30, help="Pose buffer length T")
+    parser.add_argument('--pairs', type=int, default=32, help="Pairs featurized per batch")
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    windows = rng.normal(0, 80, (args.pairs, args.frames, 2, 17, 2)).astype(np.float32)
+
+    max_diff = max(float(np.abs(extract_features(w) - loop_extract_features(w)).max()) for w in windows)
+    print(f"T={args.frames}, B={args.pairs}, max |vectorized - loop| = {max_diff:.2e}")
+
+    loop_ms = _time(lambda: loop_extract_features(windows[0]), args.repeats)
+    single_ms = _time(lambda: extract_features(windows[0]), args.repeats)
+    batch_ms = _time(lambda: extract_features(windows), args.repeats)
+    loop_batch_ms = loop_ms * args.pairs
+
+    print(f"  one pair : loop {loop_ms:8.3f} ms | vectorized {single_ms:8.3f} ms ({loop_ms / single_ms:5.1f}x)")
+    print(f"  {args.pairs:3d} pairs: loop {loop_batch_ms:8.3f} ms | batched    {batch_ms:8.3f} ms "
+          f"({loop_batch_ms / batch_ms:5.1f}x)")
+
+    # Per new frame of one monitored pair: re-featurize and re-run the whole window,
+    # versus one feature row plus an incremental StreamingFightNet push
+    model = FightNet().eval()
+    streaming = StreamingFightNet(model, capacity=args.frames - 1)
+    state = streaming.new_state()
+    window = windows[0]
+    for prev, cur in zip(window[:-1], window[1:]): # Fill the window
+        streaming.push(state, frame_feature_rows(prev[None], cur[None])[0])
+
+    def full_window():
+        with torch.no_grad():
+            torch.sigmoid(model(torch.from_numpy(extract_features(window))[None]))
+
+    def incremental():
+        streaming.push(state, frame_feature_rows(window[-2][None], window[-1][None])[0])
+
+    full_ms = _time(full_window, args.repeats)
+    stream_ms = _time(incremental, args.repeats)
+    print(f"  per frame: full window {full_ms:8.3f} ms | streaming  {stream_ms:8.3f} ms ({full_ms / stream_ms:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
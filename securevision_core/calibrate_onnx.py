@@ -0,0 +1,145 @@
+import argparse
+import os
+import sys
+import cv2
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import PROCESSING_WIDTH, ONNX_CACHE_DIR, POSE_IMGSZ
+from core_pipeline.fused_layer1 import letterbox
+from core_pipeline.inference_backend import calibration_path, quantize, export_yolo, export_module, module_hash
+from core_pipeline.real_layer1 import get_models, get_model_path
+
+REID_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+REID_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def read_frames(video_dir, num_frames):
+    """Samples frames evenly across every video in `video_dir`, resized/converted like run_system.py."""
+    videos = sorted(f for f in os.listdir(video_dir) if f.endswith('.mp4'))
+    if not videos:
+        print(f"No .mp4 files found in {video_dir}")
+        return []
+
+    per_video = max(1, num_frames // len(videos))
+    frames = []
+    for name in videos:
+        cap = cv2.VideoCapture(os.path.join(video_dir, name))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or per_video
+        for idx in np.linspace(0, total - 1, per_video).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            h, w = frame.shape[:2]
+            frames.append(cv2.resize(frame, (PROCESSING_WIDTH, int(PROCESSING_WIDTH * h / w))))
+        cap.release()
+        print(f"  {name}: {len(frames)} frames so far")
+    return frames
+
+
+def to_yolo_input(img, imgsz):
+    """Static-shape letterbox + BGR->RGB swap + CHW, matching FusedDetectionEngine.preprocess."""
+    padded = letterbox(img, new_shape=imgsz, auto=False)[0]
+    return padded[..., ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+
+
+def person_crops(frames, base_model):
+    """Person ROIs found by the base model, used for pose and ReID calibration."""
+    crops = []
+    for frame in frames:
+        results = base_model(frame, verbose=False, device='cpu', conf=0.35)
+        for box, cls_id in zip(results[0].boxes.xyxy.numpy(), results[0].boxes.cls.numpy()):
+            if base_model.names[int(cls_id)] != 'person':
+                continue
+            x1, y1, x2, y2 = map(int, box)
+            if x2 - x1 >= 10 and y2 - y1 >= 10:
+                crops.append(frame[y1:y2, x1:x2])
+    return crops
+
+
+def save_samples(name, samples):
+    path = calibration_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, samples=np.stack(samples).astype(np.float32))
+    print(f"  Saved {len(samples)} calibration samples -> {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build INT8 calibration sets from testvideos/ and quantize the ONNX models.")
+    parser.add_argument('--videos', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testvideos'))
+    parser.add_argument('--frames', type=int, default=200, help="Frames sampled across all videos")
+    parser.add_argument('--mode', choices=['static', 'dynamic'], default='static')
+    parser.add_argument('--models', default='yolo_base,yolo_weapons,pose,reid,fightnet',
+                        help="Comma-separated subset of yolo_base,yolo_weapons,pose,reid,fightnet")
+    args = parser.parse_args()
+    selected = set(args.models.split(','))
+
+    print(f"Sampling {args.frames} frames from {args.videos} ...")
+    frames = read_frames(args.videos, args.frames)
+    if not frames:
+        sys.exit(1)
+
+    models = get_models()
+    if models is None:
+        print("Ultralytics not installed; cannot export YOLO models.")
+        sys.exit(1)
+
+    for key in ('base', 'weapons'):
+        name = f"yolo_{key}"
+        if name not in selected:
+            continue
+        print(f"[{name}]")
+        path = export_yolo(models[key], name, get_model_path(key))
+        if args.mode == 'static':
+            save_samples(name, [to_yolo_input(f, 640) for f in frames])
+        print(f"  -> {quantize(path, name, args.mode)}")
+
+    crops = person_crops(frames, models['base']) if selected & {'pose', 'reid'} else []
+    print(f"Found {len(crops)} person crops for pose/ReID calibration")
+
+    if 'pose' in selected:
+        from core_pipeline.pose_filter import PoseKeypointFilter
+        print("[pose]")
+        pose_model = PoseKeypointFilter().model
+        path = export_yolo(pose_model, 'pose', pose_model.ckpt_path)
+        if args.mode == 'static' and crops:
+            # Raw ROIs, letterboxed to POSE_IMGSZ like PoseKeypointFilter._infer_keypoints
+            save_samples('pose', [to_yolo_input(c, POSE_IMGSZ) for c in crops])
+        print(f"  -> {quantize(path, 'pose', args.mode)}")
+
+    if 'reid' in selected:
+        import torch
+        from torchvision import models as tv_models
+        print("[reid]")
+        backbone = tv_models.mobilenet_v3_large(pretrained=True)
+        backbone.classifier = torch.nn.Identity()
+        backbone.eval()
+        path = export_module(backbone, 'reid', torch.zeros(1, 3, 224, 224), {0: 'batch'}, module_hash(backbone))
+        if args.mode == 'static' and crops:
+            samples = [((cv2.resize(c, (224, 224)).astype(np.float32) / 255.0 - REID_MEAN) / REID_STD).transpose(2, 0, 1)
+                       for c in crops]
+            save_samples('reid', samples)
+        print(f"  -> {quantize(path, 'reid', args.mode)}")
+
+    if 'fightnet' in selected:
+        import torch
+        from core_pipeline.fightnet_integration import FightNet, FIGHTNET_WEIGHTS
+        from core_pipeline.inference_backend import file_hash
+        print("[fightnet] (dynamic INT8 only: inputs are pose features, not frames)")
+        model = FightNet()
+        model.load_state_dict(torch.load(FIGHTNET_WEIGHTS, map_location='cpu'))
+        model.eval()
+        path = export_module(model, 'fightnet', torch.zeros(1, 29, 150), {0: 'batch', 1: 'time'},
+                             file_hash(FIGHTNET_WEIGHTS))
+        print(f"  -> {quantize(path, 'fightnet', 'dynamic')}")
+
+    print(f"Done. Cache: {ONNX_CACHE_DIR}")
+    print("Run with SECUREVISION_BACKEND=onnx SECUREVISION_QUANTIZATION=" + args.mode)
+
+
+if __name__ == "__main__":
+    main()
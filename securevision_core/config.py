@@ -22,7 +22,93 @@ MODEL_PATH_LAYER3 = 'fight_classifier.pt'
 
 # Tracker Configuration
 TRACKER_TYPE = 'botsort.yaml' # Heavy ReID CNN enabled
-USE_CUDA = True # Set to True if NVIDIA GPU is available
+USE_CUDA = os.getenv('SECUREVISION_USE_CUDA', 'true').lower() == 'true' # Set SECUREVISION_USE_CUDA=false on CPU-only edge boxes
+
+# Inference Backend (core_pipeline/inference_backend.py)
+INFERENCE_BACKEND = os.getenv('SECUREVISION_BACKEND', 'torch') # 'torch' (eager PyTorch) | 'onnx' (ONNX Runtime CPU)
+ONNX_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'models', 'onnx_cache') # Exports keyed by weights hash
+ONNX_INTRA_OP_THREADS = int(os.getenv('SECUREVISION_ORT_THREADS', '0')) # 0 = let ONNX Runtime decide
+ONNX_INTER_OP_THREADS = 1
+ONNX_QUANTIZATION = os.getenv('SECUREVISION_QUANTIZATION') or None # None | 'dynamic' | 'static' (needs calibrate_onnx.py)
+ONNX_OPSET = 17
+
+# Layer 1 Inference
+USE_FUSED_DETECTION = True # Share preprocessing + one tracker across base/weapon models (core_pipeline/fused_layer1.py)
+DETECTION_IMGSZ = 640      # Letterbox target size for Layer 1 models
+NMS_IOU_THRESHOLD = 0.7    # Ultralytics default IoU for predict/track
+
+# Cross-Camera Batched Inference (core_pipeline/inference_scheduler.py)
+USE_INFERENCE_SCHEDULER = False # Batch Layer 1 across all pipelines in this process
+INFERENCE_BATCH_WINDOW_MS = 10  # How long the first queued frame waits for others
+INFERENCE_MAX_BATCH = 8         # Upper bound on frames per forward pass
+
+# Adaptive Detection Stride (core_pipeline/detection_stride.py)
+ADAPTIVE_DETECTION_STRIDE = False # Run full detection every K frames, predict tracks in between
+DETECTION_STRIDE_MAX = 4          # Largest K used on quiet scenes
+DETECTION_STRIDE_RAMP_FRAMES = 30 # Quiet frames required before K grows by one
+
+# Motion Gate (core_pipeline/motion_gate.py)
+MOTION_GATE_ENABLED = False             # Skip Layer 1 on static frames and carry previous tracks forward
+MOTION_GATE_METHOD = 'diff'             # 'diff' (vs last detected frame) | 'mog2' (background model)
+MOTION_GATE_WIDTH = 160                 # Width of the grayscale thumbnail the gate compares
+MOTION_GATE_PIXEL_THRESHOLD = 25        # Per-pixel intensity change counted as motion ('diff')
+MOTION_GATE_MIN_CHANGED_FRACTION = 0.002 # Fraction of changed pixels needed to run detection
+MOTION_GATE_MAX_SKIP_SECONDS = 2.0      # Force a full detection at least this often
+
+# Shared-Memory Frame Bus (utils/frame_ring.py, run_system.py)
+USE_SHARED_FRAME_RING = False # Decode in a separate process and serve MJPEG from another, sharing frames via shared memory
+FRAME_RING_SLOTS = 8          # Frame slots per ring (decoder stays at most this many frames ahead of inference)
+STREAM_PORT = 8000            # MJPEG /video_feed server (api/stream.py); the frontend expects :8000
+STREAM_JPEG_QUALITY = 80      # JPEG quality for the MJPEG stream
+STREAM_MAX_FPS = 30           # Upper bound on frames pushed to each stream client
+
+# Multi-Camera Supervisor (supervisor.py)
+CAMERA_CONFIG_PATH = 'cameras.json'   # JSON list of {"id", "source", "loop"} camera entries
+STREAMS_PER_WORKER = 1                # Streams handled round-robin by each worker process
+WORKER_CPU_PINNING = True             # Pin each worker to its own slice of cores (Linux only)
+WORKER_HEARTBEAT_TIMEOUT_SECONDS = 30 # Worker is restarted if it stops reporting for this long
+WORKER_STARTUP_TIMEOUT_SECONDS = 300 # Worker is restarted if capture setup + model warm-up take longer
+WORKER_RESTART_BACKOFF_SECONDS = 2.0  # Initial restart delay, doubled per consecutive crash (max 60s)
+TELEMETRY_QUEUE_SIZE = 1000           # Worker -> supervisor telemetry; log messages are dropped when full
+
+# Person-Anchored Weapon Cascade (FusedDetectionEngine.detect_cascade)
+WEAPON_CASCADE_MODE = False # Weapon model runs only on full-resolution person crops (per-stream engine, not the scheduler)
+CASCADE_CROP_SIZE = 320     # Letterbox size for each person crop
+CASCADE_CROP_PADDING = 0.15 # Fraction of bbox width/height added around each person
+CASCADE_MAX_CROPS = 16      # Largest N persons per frame sent to the weapon model
+
+# Pose Verification (core_pipeline/pose_filter.py)
+POSE_IMGSZ = 640         # Square letterbox size for batched person ROIs (matches calibrate_onnx.py)
+POSE_MAX_BATCH = 16      # Upper bound on ROIs per pose forward pass
+POSE_KEYPOINT_CONF = 0.5 # Joints below this confidence are zeroed (treated as not visible), like Ultralytics Keypoints.xy
+
+# FightNet Verification (core_pipeline/fight_verifier.py, core_pipeline/fightnet_streaming.py)
+FIGHT_WINDOW_FRAMES = 30        # Pose frames kept per pair (FightNet sees FIGHT_WINDOW_FRAMES - 1 feature rows)
+FIGHTNET_STREAMING = False      # Score every candidate pair on every frame with the incremental model (no pose-activity gate)
+ASYNC_FIGHT_VERIFICATION = True # Score pose buffers on a background worker; verdicts apply on a later frame
+FIGHTNET_QUEUE_SIZE = 64        # Pending verifications; pairs are retried next frame when full
+FIGHTNET_MAX_BATCH = 32         # Pose buffers scored per worker pass
+
+# Person ReID (core_pipeline/reid_manager.py, core_pipeline/reid_gallery.py)
+REID_INPUT_SIZE = 224                 # Square crop size fed to the MobileNetV3 backbone
+REID_MAX_BATCH = 32                   # Upper bound on crops per ReID forward pass
+REID_EMBEDDINGS_PER_IDENTITY = 5      # Most recent embeddings kept per identity in the gallery matrix
+REID_GALLERY_INITIAL_IDENTITIES = 256 # Identity blocks preallocated up front (doubles when full)
+REID_ANN_INDEX = False                # Search the gallery with an IVF index (core_pipeline/reid_index.py) instead of a full scan
+REID_ANN_NPROBE = 8                   # IVF cells scanned per query; higher = better recall, slower
+REID_ANN_MIN_TRAIN = 20000            # Stored embeddings before the index clusters itself (exact search until then)
+REID_USE_PROJECTION = False           # Project embeddings with the PCA fitted by fit_reid_projection.py before matching/storage
+REID_PROJECTION_PATH = os.path.join(os.path.dirname(__file__), 'models', 'reid_projection.npz')
+REID_PROJECTION_DIM = 128             # Components kept by fit_reid_projection.py (128-256)
+REID_STORAGE_DTYPE = 'float32'        # Gallery storage: 'float32' | 'float16' | 'int8' (per-vector scale)
+
+# ReID Extraction Scheduling (core_pipeline/reid_scheduler.py)
+REID_ADAPTIVE_SCHEDULING = False           # Re-extract on appearance change instead of at fixed track ages (5, 30, 60)
+REID_MIN_TRACK_AGE_FRAMES = 5              # First embedding once a track has this much history
+REID_MAX_EXTRACTION_INTERVAL_FRAMES = 300  # Re-extract at least this often even if the appearance looks stable
+REID_OCCLUSION_GAP_FRAMES = 15             # A track back after being unseen this long is re-extracted
+REID_SIGNATURE_HIST_THRESHOLD = 0.3        # Colour histogram distance (0-1) that forces re-extraction
+REID_SIGNATURE_GEOMETRY_THRESHOLD = 0.5    # Relative bbox area/aspect change that forces re-extraction
 
 # Detection Classes
 # Base Classes (Using custom weapon_detection2 now instead of COCO YOLO)
@@ -48,9 +134,23 @@ MIN_CONFIDENCE = 0.15 # The baseline threshold passed to YOLO
 # Luggage Abandonment Logic
 ABANDONED_DURATION_FRAMES = 150  # 5 seconds at 30 FPS
 LUGGAGE_PROXIMITY_THRESHOLD = 200 # Pixels (approx 1-2 meters depending on depth)
+SPATIAL_GRID_MIN_PAIRS = 4096     # Above this many candidate pairs (luggage x person, person x person) a spatial grid replaces the dense distance matrix
 GHOST_FRAMES_WEAPON = 0    # Instantly drop weapons to avoid false positive blips
 GHOST_FRAMES_LUGGAGE = 30  # Keep luggage boxes for 1 second if occluded by pedestrians
 GHOST_FRAMES_PERSON = 15   # Keep people for 0.5 seconds
+ACTIVE_TRACK_WINDOW = 60   # Frames a track stays in TrackerState's active index (>= largest ghost window + 30-frame alert hold)
+
+# Bounded Pipeline State (utils/state_expiry.py)
+TRACK_TTL_FRAMES = 300             # Tracks (and their id_map entries) unseen this long are released; must exceed ACTIVE_TRACK_WINDOW
+MAX_TRACKS = 4096                  # LRU cap on stored tracks per pipeline
+POSE_HISTORY_TTL_SECONDS = 10.0    # Wrist history of people not pose-checked for this long is dropped
+MAX_POSE_HISTORIES = 512           # LRU cap on per-person pose histories
+REID_IDENTITY_TTL_FRAMES = 54000   # ~30 min at 30 FPS; identities not seen for this long are forgotten
+MAX_REID_IDENTITIES = 5000         # LRU cap on the ReID gallery
+ALERT_PERSISTENCE_TTL_FRAMES = 60  # Visual alert holds are dropped after this many frames without a refresh
+LUGGAGE_ALERT_COOLDOWN_SECONDS = 10.0 # Seconds before re-alerting for the same luggage ID (utils/alert_throttle.py)
+SENT_ALERTS_MAX = 1024             # LRU cap on the alert throttle table (entries also expire after the cooldown)
+STATE_STATS_INTERVAL_FRAMES = 900  # How often run_system logs state sizes and eviction counters
 
 # Database Configuration
 DB_CONFIG = {
@@ -0,0 +1,42 @@
+from config import DETECTION_STRIDE_MAX, DETECTION_STRIDE_RAMP_FRAMES
+
+
+class DetectionStrideController:
+    """
+    Decides on which frames full Layer 1 detection runs.
+
+    The stride K grows by one for every `ramp_frames` consecutive quiet frames (up to
+    `max_stride`) and snaps back to 1 as soon as anything alert-worthy is active
+    (weapon track, fight candidate pair or luggage countdown). Frames in between are
+    covered by `TrackerState.predict`.
+    """
+    def __init__(self, max_stride=DETECTION_STRIDE_MAX, ramp_frames=DETECTION_STRIDE_RAMP_FRAMES):
+        self.max_stride = max(1, max_stride)
+        self.ramp_frames = max(1, ramp_frames)
+        self.stride = 1
+        self.quiet_frames = 0
+        self.frames_since_detection = 0
+
+        # Telemetry
+        self.detected_frames = 0
+        self.predicted_frames = 0
+
+    def should_detect(self):
+        """Returns True if this frame needs a full detection pass."""
+        if self.frames_since_detection + 1 >= self.stride:
+            self.frames_since_detection = 0
+            self.detected_frames += 1
+            return True
+        self.frames_since_detection += 1
+        self.predicted_frames += 1
+        return False
+
+    def update(self, alert_active):
+        """Adapts the stride after the frame has been processed."""
+        if alert_active:
+            self.quiet_frames = 0
+            self.stride = 1
+            self.frames_since_detection = 0 # Next frame is detected immediately
+        else:
+            self.quiet_frames += 1
+            self.stride = min(self.max_stride, 1 + self.quiet_frames // self.ramp_frames)
@@ -0,0 +1,127 @@
+import numpy as np
+from config import BASE_CLASSES, WEAPON_CLASSES, LUGGAGE_CLASSES, CONFIDENCE_THRESHOLDS
+
+# Global class vocabulary shared by every Detections batch (order-preserving, de-duplicated)
+CLASS_NAMES = tuple(dict.fromkeys(BASE_CLASSES + WEAPON_CLASSES + LUGGAGE_CLASSES))
+CLASS_IDS = {name: i for i, name in enumerate(CLASS_NAMES)}
+_CLASS_NAME_ARRAY = np.array(CLASS_NAMES, dtype=object)
+
+
+def class_ids_for(names):
+    """Returns the vocabulary ids for an iterable of class names (unknown names are skipped)."""
+    return np.array([CLASS_IDS[n] for n in names if n in CLASS_IDS], dtype=np.int64)
+
+
+def build_class_lookup(model_names, valid_classes):
+    """
+    Precomputes per-model lookup arrays indexed by the model's raw class id.
+
+    Args:
+        model_names (dict): Ultralytics `model.names` ({id: name}).
+        valid_classes (list): Classes this model is allowed to report.
+
+    Returns:
+        tuple: (vocab_ids, thresholds). Invalid classes map to -1 with an infinite
+               threshold, so class gating and per-class confidence filtering collapse
+               into a single vectorized comparison.
+    """
+    size = max(model_names) + 1 if model_names else 0
+    vocab_ids = np.full(size, -1, dtype=np.int64)
+    thresholds = np.full(size, np.inf, dtype=np.float32)
+    for cls_id, name in model_names.items():
+        if name in valid_classes and name in CLASS_IDS:
+            vocab_ids[cls_id] = CLASS_IDS[name]
+            thresholds[cls_id] = CONFIDENCE_THRESHOLDS.get(name, 0.4)
+    return vocab_ids, thresholds
+
+
+class Detections:
+    """
+    Columnar batch of Layer 1 detections for one frame.
+
+    Attributes:
+        xyxy (np.ndarray): (N, 4) float32 boxes [x1, y1, x2, y2].
+        centroid (np.ndarray): (N, 2) float32 box centres.
+        class_id (np.ndarray): (N,) int64 index into CLASS_NAMES.
+        confidence (np.ndarray): (N,) float32 scores.
+        track_id (np.ndarray): (N,) int64 BoTSORT IDs (-1 if untracked).
+
+    Iterating yields the legacy per-detection dicts, so older callers keep working.
+    """
+    __slots__ = ('xyxy', 'centroid', 'class_id', 'confidence', 'track_id')
+
+    def __init__(self, xyxy, class_id, confidence, track_id, centroid=None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.class_id = np.asarray(class_id, dtype=np.int64).reshape(-1)
+        self.confidence = np.asarray(confidence, dtype=np.float32).reshape(-1)
+        self.track_id = np.asarray(track_id, dtype=np.int64).reshape(-1)
+        if centroid is None:
+            centroid = (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+        self.centroid = np.asarray(centroid, dtype=np.float32).reshape(-1, 2)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), [], [], [])
+
+    @classmethod
+    def from_dicts(cls, detections):
+        """Builds a batch from the legacy list-of-dicts format (mock layer, tests)."""
+        if not detections:
+            return cls.empty()
+        return cls(
+            [d['bbox'] for d in detections],
+            [CLASS_IDS[d['class']] for d in detections],
+            [d.get('confidence', 1.0) for d in detections],
+            [d['track_id'] for d in detections],
+            centroid=[d['centroid'] for d in detections],
+        )
+
+    @classmethod
+    def concatenate(cls, batches):
+        batches = [b for b in batches if len(b)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        return cls(
+            np.concatenate([b.xyxy for b in batches]),
+            np.concatenate([b.class_id for b in batches]),
+            np.concatenate([b.confidence for b in batches]),
+            np.concatenate([b.track_id for b in batches]),
+            centroid=np.concatenate([b.centroid for b in batches]),
+        )
+
+    @property
+    def class_names(self):
+        """(N,) object array of class names."""
+        return _CLASS_NAME_ARRAY[self.class_id]
+
+    def class_mask(self, names):
+        """Boolean mask of rows whose class is in `names`."""
+        return np.isin(self.class_id, class_ids_for(names))
+
+    def __len__(self):
+        return len(self.track_id)
+
+    def __getitem__(self, index):
+        """Row selection with a boolean mask or index array; returns a new batch."""
+        return Detections(self.xyxy[index], self.class_id[index], self.confidence[index],
+                          self.track_id[index], centroid=self.centroid[index])
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def to_dicts(self):
+        """Legacy list-of-dicts view (same keys as `get_yolo_detections` used to return)."""
+        return [
+            {
+                'track_id': tid,
+                'class': name,
+                'bbox': bbox,
+                'centroid': centroid,
+                'confidence': conf,
+            }
+            for tid, name, bbox, centroid, conf in zip(
+                self.track_id.tolist(), self.class_names.tolist(), self.xyxy.tolist(),
+                self.centroid.tolist(), self.confidence.tolist())
+        ]
@@ -1,6 +1,8 @@
 import cv2
 import math
-from config import SUSTAINED_DURATION_FRAMES, PROXIMITY_THRESHOLD_METERS, PROCESSING_WIDTH
+import numpy as np
+from config import (SUSTAINED_DURATION_FRAMES, PROXIMITY_THRESHOLD_METERS, PROCESSING_WIDTH, SPATIAL_GRID_MIN_PAIRS,
+                    ASYNC_FIGHT_VERIFICATION, FIGHT_WINDOW_FRAMES, FIGHTNET_STREAMING)
 
 # Heuristic: Pixel threshold for "Close Proximity"
 # People interacting (fighting/hugging) are usually within this range
@@ -11,8 +13,13 @@ VELOCITY_THRESHOLD_ACITVITY = 2.0 # Significant movement
 VELOCITY_THRESHOLD_EXPLOSIVE = 5.0 # Very fast movement (immediate trigger)
 
 # Import FightNet
-from core_pipeline.fightnet_integration import run_fightnet
+from core_pipeline.fightnet_integration import score_features, FIGHTNET_THRESHOLD
+from core_pipeline.fightnet_streaming import FEATURE_WINDOW, frame_feature_rows, load_streaming_fightnet
+from core_pipeline.fight_verifier import get_fight_verifier
 from core_pipeline.pose_filter import PoseKeypointFilter
+from core_pipeline.detections import CLASS_IDS
+from core_pipeline.spatial_index import SpatialGrid
+from utils.pose_window import PoseWindow
 
 class FightDetector:
     def __init__(self):
@@ -27,115 +34,230 @@ class FightDetector:
         
         self.pose_filter = PoseKeypointFilter()
         self.POSE_ACTIVITY_THRESHOLD = 30.0 # Heuristic combination of velocity + contact
+
+        # FightNet runs on the shared background worker; verdicts land on a later frame
+        self.verifier = get_fight_verifier() if ASYNC_FIGHT_VERIFICATION else None
+        # Incremental FightNet scoring every candidate pair every frame (replaces the worker)
+        self.streaming = load_streaming_fightnet() if FIGHTNET_STREAMING else None
+
+    def _verify(self, pair_key):
+        """Runs FightNet on a pair's feature window, inline or through the verification worker."""
+        pair = self.active_pairs[pair_key]
+        if self.verifier is None:
+            prob = score_features([pair['features'].copy()])[0]
+            pair['status'] = 'CONFIRMED' if prob is not None and prob > FIGHTNET_THRESHOLD else 'WARNING'
+            return
+        if 'verification' in pair:
+            return # Previous snapshot still in flight
+        future = self.verifier.submit(pair['features'].copy())
+        if future is not None: # Queue full: retried on the pair's next active frame
+            pair['verification'] = future
+
+    def _apply_verdicts(self):
+        """Applies verdicts the worker finished since the last frame."""
+        for pair in self.active_pairs.values():
+            future = pair.get('verification')
+            if future is None or not future.done():
+                continue
+            del pair['verification']
+            if pair['status'] != 'CONFIRMED':
+                pair['status'] = 'CONFIRMED' if future.result() else 'WARNING'
         
-    def _calculate_body_velocity(self, track1, track2):
+    def _body_velocities(self, tracks):
         """
-        Calculates the average velocity (pixels/frame) of two bodies based on centroid history.
+        Average speed (pixels/frame) over the last 3 centroids for every person at once.
+        Tracks backed by the TrackerState store are read straight from its centroid rings.
         """
-        def get_v(track):
+        if tracks and all(hasattr(track, 'slot') for track in tracks):
+            slots = np.fromiter((track.slot for track in tracks), dtype=np.int64, count=len(tracks))
+            return tracks[0].store.velocity(slots, lag=3)
+
+        # Plain dict tracks: same rule, one pass over the histories
+        velocities = np.zeros(len(tracks), dtype=np.float32)
+        for i, track in enumerate(tracks):
             history = track['centroid']
-            if len(history) < 3: return 0.0 # Need at least 3 points for reliable speed
-            # Distance between now and 3 frames ago
-            c_now = history[-1]
-            c_old = history[-3]
-            dist = math.sqrt((c_now[0]-c_old[0])**2 + (c_now[1]-c_old[1])**2)
-            return dist / 3.0 # pixels per frame
-        
-        v1 = get_v(track1)
-        v2 = get_v(track2)
-        return (v1 + v2) / 2.0  
+            if len(history) >= 3: # Need at least 3 points for reliable speed
+                velocities[i] = math.dist(history[-1], history[-3]) / 3.0
+        return velocities
 
-    def process(self, tracks, frame_number, frame):
+    def _active_people(self, tracks, frame_number, detections=None):
         """
-        Returns: List of detected events.
+        Collects people seen within the last 5 frames.
+        When the current frame's Detections batch is given, live people are read straight
+        from its columns and only the remaining tracks are checked for recent ghosts.
+
+        Returns:
+            tuple: (ids list, tracks list, centroids (N, 2) array, bboxes (N, 4) array)
         """
-        current_people = []
-        
-        # 1. Filter for active People
+        ids, people, centroids, bboxes = [], [], [], []
+        seen = set()
+
+        if detections is not None and len(detections):
+            person_rows = np.flatnonzero(detections.class_id == CLASS_IDS['person'])
+            for row, tid in zip(person_rows.tolist(), detections.track_id[person_rows].tolist()):
+                track = tracks.get(tid)
+                if track is not None:
+                    ids.append(tid)
+                    people.append(track)
+                    centroids.append(detections.centroid[row])
+                    bboxes.append(detections.xyxy[row])
+                    seen.add(tid)
+
         for tid, track in tracks.items():
+            if tid in seen:
+                continue
             if track['class'] == 'person':
                 if frame_number - track['last_seen'] < 5: 
                      if len(track['centroid']) > 0:
-                        current_people.append((tid, track, track['centroid'][-1], track['bbox'][-1]))
+                        ids.append(tid)
+                        people.append(track)
+                        centroids.append(track['centroid'][-1])
+                        bboxes.append(track['bbox'][-1])
+
+        centroids = np.asarray(centroids, dtype=np.float32).reshape(-1, 2)
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        return ids, people, centroids, bboxes
+
+    def _close_pairs(self, centroids):
+        """
+        Index pairs (i < j) of people closer than FIGHT_PROXIMITY_THRESHOLD_PIXELS, in
+        row-major order. Uses one pairwise distance matrix for small crowds and a spatial
+        grid once the number of candidate pairs exceeds SPATIAL_GRID_MIN_PAIRS.
+
+        Returns:
+            tuple: (i, j, distance) arrays.
+        """
+        n = len(centroids)
+        if n * (n - 1) // 2 <= SPATIAL_GRID_MIN_PAIRS:
+            i, j = np.triu_indices(n, k=1)
+            dist = np.linalg.norm(centroids[i] - centroids[j], axis=1)
+            keep = dist < FIGHT_PROXIMITY_THRESHOLD_PIXELS
+            return i[keep], j[keep], dist[keep]
+        i, j, dist = SpatialGrid(centroids, FIGHT_PROXIMITY_THRESHOLD_PIXELS).pairs_within(FIGHT_PROXIMITY_THRESHOLD_PIXELS)
+        order = np.lexsort((j, i))
+        return i[order], j[order], dist[order]
+
+    def process(self, tracks, frame_number, frame, detections=None):
+        """
+        Args:
+            tracks (dict): TrackerState tracks ({tid: track}); the pipeline passes only the
+                           people from the active index seen within the last 5 frames.
+            frame_number (int): Current frame number.
+            frame (np.array): Current frame (pose ROIs are cropped from it).
+            detections (Detections, optional): This frame's Layer 1 batch, used directly
+                                               for live people instead of re-reading tracks.
+
+        Returns: List of detected events.
+        """
+        self._apply_verdicts()
+
+        # 1. Filter for active People
+        ids, people, centroids, bboxes = self._active_people(tracks, frame_number, detections)
 
-        current_pair_keys = set()
         detected_fights = [] 
 
-        # Naive O(N^2)
-        for i in range(len(current_people)):
-            for j in range(i + 1, len(current_people)):
-                id1, track1, cen1, bbox1 = current_people[i]
-                id2, track2, cen2, bbox2 = current_people[j]
+        # Candidate pairs and both bodies' velocities, computed for everyone at once
+        pair_i, pair_j, pair_dist = self._close_pairs(centroids)
+        if len(pair_i):
+            velocities = self._body_velocities(people)
+            pair_velocity = ((velocities[pair_i] + velocities[pair_j]) / 2.0).tolist()
+            id_array = np.asarray(ids, dtype=np.int64)
+            key_lo = np.minimum(id_array[pair_i], id_array[pair_j]).tolist()
+            key_hi = np.maximum(id_array[pair_i], id_array[pair_j]).tolist()
+        else:
+            pair_velocity = key_lo = key_hi = []
+
+        pairs = []      # (pair_key, dist) in row-major order
+        candidates = [] # Pairs that need pose verification this frame
+        for i, j, dist, body_velocity, lo, hi in zip(pair_i.tolist(), pair_j.tolist(), pair_dist.tolist(),
+                                                      pair_velocity, key_lo, key_hi):
+            pair_key = (lo, hi)
+            pairs.append((pair_key, dist))
+
+            if pair_key not in self.active_pairs:
+                self.active_pairs[pair_key] = {
+                    'start_frame': frame_number,
+                    'last_seen': frame_number,
+                    'status': 'MONITORING'
+                }
+            else:
+                self.active_pairs[pair_key]['last_seen'] = frame_number
                 
-                # Euclidean Distance
-                dist = math.sqrt((cen1[0] - cen2[0])**2 + (cen1[1] - cen2[1])**2)
+                # Logic: Proximity + Velocity = Fight Candidate
+                # Trigger Conditions
+                is_candidate = False
                 
-                if dist < FIGHT_PROXIMITY_THRESHOLD_PIXELS:
-                    pair_key = tuple(sorted((id1, id2)))
-                    current_pair_keys.add(pair_key)
+                # A. Sustained Activity
+                duration = frame_number - self.active_pairs[pair_key]['start_frame']
+                if duration > 30 and body_velocity > VELOCITY_THRESHOLD_ACITVITY:
+                    is_candidate = True
                     
-                    if pair_key not in self.active_pairs:
-                        self.active_pairs[pair_key] = {
-                            'start_frame': frame_number,
-                            'last_seen': frame_number,
-                            'status': 'MONITORING'
-                        }
-                    else:
-                        self.active_pairs[pair_key]['last_seen'] = frame_number
-                        
-                        # Logic: Proximity + Velocity = Fight Candidate
-                        body_velocity = self._calculate_body_velocity(track1, track2)
-                        
-                        # Trigger Conditions
-                        is_candidate = False
-                        
-                        # A. Sustained Activity
-                        duration = frame_number - self.active_pairs[pair_key]['start_frame']
-                        if duration > 30 and body_velocity > VELOCITY_THRESHOLD_ACITVITY:
-                            is_candidate = True
-                            
-                        # B. Explosive Movement (Immediate)
-                        if body_velocity > VELOCITY_THRESHOLD_EXPLOSIVE:
-                            is_candidate = True
-                            
-                        if is_candidate:
-                            # Advanced Gate: Pose Verification
-                            arm_score_1, kpts1 = self.pose_filter.get_arm_velocity_score(frame, id1, bbox1)
-                            arm_score_2, kpts2 = self.pose_filter.get_arm_velocity_score(frame, id2, bbox2)
-                            
-                            if 'pose_buffer' not in self.active_pairs[pair_key]:
-                                self.active_pairs[pair_key]['pose_buffer'] = []
-                                
-                            import numpy as np
-                            frame_features = np.stack([kpts1, kpts2])
-                            self.active_pairs[pair_key]['pose_buffer'].append(frame_features)
-                            
-                            if len(self.active_pairs[pair_key]['pose_buffer']) > 30:
-                                self.active_pairs[pair_key]['pose_buffer'].pop(0)
-                            
-                            pose_activity = max(arm_score_1, arm_score_2)
-                            
-                            if pose_activity > self.POSE_ACTIVITY_THRESHOLD:
-                                # Run Mock Model Verification
-                                if len(self.active_pairs[pair_key]['pose_buffer']) >= 15:
-                                    if self.active_pairs[pair_key]['status'] != 'CONFIRMED':
-                                        result = run_fightnet(self.active_pairs[pair_key]['pose_buffer'])
-                                        if result:
-                                            self.active_pairs[pair_key]['status'] = 'CONFIRMED'
-                                        else:
-                                            self.active_pairs[pair_key]['status'] = 'WARNING'
+                # B. Explosive Movement (Immediate)
+                if body_velocity > VELOCITY_THRESHOLD_EXPLOSIVE:
+                    is_candidate = True
                     
-                    # Add to return list 
-                    status = self.active_pairs[pair_key]['status']
-                    pose_len = len(self.active_pairs[pair_key].get('pose_buffer', []))
-                    if status == 'CONFIRMED' or pose_len > 0:
-                        display_status = status if status == 'CONFIRMED' else 'WARNING'
-                        detected_fights.append({
-                            'ids': list(pair_key),
-                            'status': display_status,
-                            'distance': dist,
-                            'timer': pose_len
-                        })
+                if is_candidate:
+                    candidates.append((pair_key, i, j))
+
+        if candidates:
+            # Advanced Gate: Pose Verification
+            # One batched pose pass over the unique people in candidate pairs
+            people_rows = sorted({row for _, i, j in candidates for row in (i, j)})
+            poses = self.pose_filter.score_people(frame, [(ids[row], bboxes[row]) for row in people_rows], frame_number)
+
+            transitions = [] # (pair_key, previous frame, new frame) for pairs that already had a frame
+            pose_activity = {}
+            for pair_key, i, j in candidates:
+                pair = self.active_pairs[pair_key]
+                arm_score_1, kpts1 = poses[ids[i]]
+                arm_score_2, kpts2 = poses[ids[j]]
+                
+                if 'pose_buffer' not in pair:
+                    # Preallocated rings: the oldest frame drops out as a new one is written
+                    pair['pose_buffer'] = PoseWindow(FIGHT_WINDOW_FRAMES, shape=(2, 17, 2))
+                    pair['features'] = PoseWindow(FEATURE_WINDOW, shape=(150,))
+                    
+                frame_features = np.stack([kpts1, kpts2])
+                if len(pair['pose_buffer']):
+                    transitions.append((pair_key, pair['pose_buffer'][-1].copy(), frame_features))
+                pair['pose_buffer'].append(frame_features)
+                
+                pose_activity[pair_key] = max(arm_score_1, arm_score_2)
+
+            # FightNet features of each pair's new frame, computed once as it enters the window
+            if transitions:
+                rows = frame_feature_rows(np.stack([t[1] for t in transitions]), np.stack([t[2] for t in transitions]))
+                for (pair_key, _, _), row in zip(transitions, rows):
+                    pair = self.active_pairs[pair_key]
+                    pair['features'].append(row)
+                    if self.streaming is not None:
+                        if 'stream' not in pair:
+                            pair['stream'] = self.streaming.new_state()
+                        pair['fight_prob'] = self.streaming.push(pair['stream'], row)
+
+            for pair_key, _, _ in candidates:
+                pair = self.active_pairs[pair_key]
+                if len(pair['pose_buffer']) < 15 or pair['status'] == 'CONFIRMED':
+                    continue
+                if self.streaming is not None:
+                    # Streaming scores are O(1) per frame, so every candidate frame counts (no pose-activity gate)
+                    pair['status'] = 'CONFIRMED' if pair['fight_prob'] > FIGHTNET_THRESHOLD else 'WARNING'
+                elif pose_activity[pair_key] > self.POSE_ACTIVITY_THRESHOLD:
+                    # Run Mock Model Verification
+                    self._verify(pair_key)
+
+        # Add to return list 
+        for pair_key, dist in pairs:
+            status = self.active_pairs[pair_key]['status']
+            pose_len = len(self.active_pairs[pair_key].get('pose_buffer', ()))
+            if status == 'CONFIRMED' or pose_len > 0:
+                display_status = status if status == 'CONFIRMED' else 'WARNING'
+                detected_fights.append({
+                    'ids': list(pair_key),
+                    'status': display_status,
+                    'distance': dist,
+                    'timer': pose_len
+                })
 
         # Cleanup stale pairs
         keys_to_delete = []
@@ -0,0 +1,132 @@
+import threading
+import queue
+import time
+from collections import deque, Counter
+from concurrent.futures import Future
+from config import FIGHTNET_QUEUE_SIZE, FIGHTNET_MAX_BATCH
+from core_pipeline.fightnet_integration import score_features, FIGHTNET_THRESHOLD
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _VerificationJob:
+    __slots__ = ('features', 'future', 'enqueued_at')
+
+    def __init__(self, features):
+        self.features = features
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class FightNetVerificationWorker:
+    """
+    Runs FightNet off the frame loop, shared by every `FightDetector` in the process.
+
+    `submit` puts a snapshot of a pair's feature window into a bounded queue and
+    returns a Future immediately; the worker thread drains everything pending (up to
+    `max_batch`) and scores it in one padded pass (`score_features`). Detectors apply
+    verdicts on a later frame, so a burst of verifications never stalls frame
+    processing. When the queue is full the job is refused and the detector simply
+    retries on its next frame.
+    """
+    def __init__(self, max_queue=FIGHTNET_QUEUE_SIZE, max_batch=FIGHTNET_MAX_BATCH):
+        self.max_batch = max_batch
+        self._jobs = queue.Queue(maxsize=max_queue)
+
+        # Statistics
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=1000)  # Seconds between submit and verdict
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FightNetVerifier", daemon=True)
+        self._thread.start()
+
+    def submit(self, features):
+        """
+        Queues a feature window for verification.
+
+        Args:
+            features (np.ndarray): (T-1, 150) window; must not be modified afterwards
+                                   (pass `PoseWindow.copy()`, not a view).
+
+        Returns:
+            Future: Resolves to True (fight) / False, or None if the queue is full.
+        """
+        job = _VerificationJob(features)
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            self._rejected += 1
+            return None
+        self._submitted += 1
+        return job.future
+
+    def stop(self):
+        self._running = False
+        self._thread.join(timeout=2.0)
+
+    def get_stats(self):
+        """Returns queue depth, batch sizes and verdict latency for telemetry."""
+        total_batches = sum(self._batch_sizes.values())
+        latencies = sorted(self._latencies)
+        return {
+            'queue_depth': self._jobs.qsize(),
+            'submitted': self._submitted,
+            'rejected': self._rejected,
+            'completed': self._completed,
+            'batches': total_batches,
+            'avg_batch_size': round(self._completed / total_batches, 2) if total_batches else 0.0,
+            'batch_size_histogram': dict(self._batch_sizes),
+            'avg_latency_ms': round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'p95_latency_ms': round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else 0.0,
+            'max_latency_ms': round(1000 * latencies[-1], 2) if latencies else 0.0,
+        }
+
+    def _collect_batch(self):
+        try:
+            batch = [self._jobs.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        # Take whatever else is already waiting; no batching window, verdicts should land fast
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                probs = score_features([job.features for job in batch])
+            except Exception as e:
+                logger.error(f"[FightNet] Verification batch of {len(batch)} failed: {e}")
+                probs = [None] * len(batch)
+
+            finished = time.perf_counter()
+            self._batch_sizes[len(batch)] += 1
+            self._completed += len(batch)
+            for job, prob in zip(batch, probs):
+                self._latencies.append(finished - job.enqueued_at)
+                job.future.set_result(prob is not None and prob > FIGHTNET_THRESHOLD)
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_fight_verifier():
+    """Returns the process-wide verification worker, starting it on first use."""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            _verifier = FightNetVerificationWorker()
+            logger.info(f"[FightNet] Verification worker started (queue={FIGHTNET_QUEUE_SIZE}, max_batch={FIGHTNET_MAX_BATCH}).")
+    return _verifier
@@ -2,6 +2,24 @@ import torch
 import torch.nn as nn
 import numpy as np
 import cv2
+import threading
+from core_pipeline.inference_backend import use_onnx, load_module_backend, file_hash
+
+# Contact-Aware Features: (joint of one person, joint of the other) in feature order.
+# Each pair is measured both ways (p1 -> p2, then p2 -> p1).
+_WRISTS = [9, 10]
+_KNEES = [15, 16]
+_HEAD = [0]
+_TORSO = [5, 6, 11, 12]
+_CONTACT_PAIRS = np.array([(w, t) for w in _WRISTS for t in _HEAD + _TORSO] +
+                          [(k, t) for k in _KNEES for t in _TORSO])
+_CONTACT_FROM = _CONTACT_PAIRS[:, 0]
+_CONTACT_TO = _CONTACT_PAIRS[:, 1]
+
+# Elbow and knee angles: (shoulder/hip, elbow/knee, wrist/ankle) per limb
+_ANGLE_A = np.array([5, 6, 11, 12])
+_ANGLE_B = np.array([7, 8, 13, 14])
+_ANGLE_C = np.array([9, 10, 15, 16])
 
 def compute_angle(a, b, c):
     ba = a - b
@@ -13,95 +31,73 @@ def compute_angle(a, b, c):
     return np.arccos(cosine)
 
 def normalize_skeleton(joints):
-    left_shoulder = joints[:, 5]
-    right_shoulder = joints[:, 6]
+    left_shoulder = joints[..., 5, :]
+    right_shoulder = joints[..., 6, :]
     shoulder_center = (left_shoulder + right_shoulder) / 2
-    return joints - shoulder_center[:, None, :]  # keep scale info
+    return joints - shoulder_center[..., None, :]  # keep scale info
 
 def extract_features(pose_window):
     """
-    User's Cell 7 geometric feature extractor.
-    pose_window: (T, max_persons*17*2) flat, or (T, 2, 17, 2)
-    We'll assume it's passed as (T, 2, 17, 2).
+    User's Cell 7 geometric feature extractor, vectorized over frames and pairs.
+
+    pose_window: (T, 2, 17, 2), (T, 68) flat, or a batch (B, T, 2, 17, 2).
+    Returns (T-1, 150) features, or (B, T-1, 150) for a batch.
     """
-    if pose_window.ndim == 4:
-        T, P, K, D = pose_window.shape
-        pose_window = pose_window.reshape(T, P*K*D)
+    pose_window = np.asarray(pose_window)
+    batched = pose_window.ndim == 5
+    if pose_window.ndim == 2:
+        pose_window = pose_window.reshape(pose_window.shape[0], 2, 17, 2)
+    if not batched:
+        pose_window = pose_window[None]
 
     pose_window = np.nan_to_num(pose_window, nan=0.0)
-    T = pose_window.shape[0]
+    B, T = pose_window.shape[:2]
 
     if T < 2:
-        return np.zeros((1, 150), dtype=np.float32)
-
-    p1 = pose_window[:, :34].reshape(T, 17, 2)
-    p2 = pose_window[:, 34:].reshape(T, 17, 2)
+        empty = np.zeros((B, 1, 150), dtype=np.float32)
+        return empty if batched else empty[0]
 
-    p1 = normalize_skeleton(p1)
-    p2 = normalize_skeleton(p2)
+    p1 = normalize_skeleton(pose_window[:, :, 0]) # (B, T, 17, 2)
+    p2 = normalize_skeleton(pose_window[:, :, 1])
 
     rel_joints = p1 - p2
-    rel_joints_flat = rel_joints.reshape(T, -1)
+    rel_joints_flat = rel_joints.reshape(B, T, -1)
 
     def get_angles(person):
-        return np.stack([
-            compute_angle(person[:, 5], person[:, 7], person[:, 9]),
-            compute_angle(person[:, 6], person[:, 8], person[:, 10]),
-            compute_angle(person[:, 11], person[:, 13], person[:, 15]),
-            compute_angle(person[:, 12], person[:, 14], person[:, 16])
-        ], axis=1)
-
-    angle_features = np.concatenate([get_angles(p1), get_angles(p2)], axis=1)
-
-    p1_center = p1.mean(axis=1)
-    p2_center = p2.mean(axis=1)
-    inter_dist = np.linalg.norm(p1_center - p2_center, axis=1, keepdims=True)
-
-    combined = np.concatenate([p1.reshape(T, -1), p2.reshape(T, -1)], axis=1)
-    velocities = combined[1:] - combined[:-1]
-    speed = np.linalg.norm(velocities, axis=1, keepdims=True)
-
-    rel_vel = rel_joints[1:] - rel_joints[:-1]
-    rel_speed = np.linalg.norm(rel_vel.reshape(T - 1, -1), axis=1, keepdims=True)
-
-    # Contact-Aware Features
-    wrists = [9, 10]
-    knees = [15, 16]
-    head = [0]
-    torso = [5, 6, 11, 12]
-
-    contact_features = []
-    for t in range(T):
-        frame_features = []
-        for w in wrists:
-            for h in head:
-                frame_features.append(np.linalg.norm(p1[t, w] - p2[t, h]))
-                frame_features.append(np.linalg.norm(p2[t, w] - p1[t, h]))
-            for tr in torso:
-                frame_features.append(np.linalg.norm(p1[t, w] - p2[t, tr]))
-                frame_features.append(np.linalg.norm(p2[t, w] - p1[t, tr]))
-        for k in knees:
-            for tr in torso:
-                frame_features.append(np.linalg.norm(p1[t, k] - p2[t, tr]))
-                frame_features.append(np.linalg.norm(p2[t, k] - p1[t, tr]))
-
-        dists = np.linalg.norm(p1[t][:, None, :] - p2[t][None, :, :], axis=-1)
-        frame_features.append(np.min(dists))
-        contact_features.append(frame_features)
-
-    contact_features = np.array(contact_features)
+        return compute_angle(person[:, :, _ANGLE_A], person[:, :, _ANGLE_B], person[:, :, _ANGLE_C])
+
+    angle_features = np.concatenate([get_angles(p1), get_angles(p2)], axis=2)
+
+    p1_center = p1.mean(axis=2)
+    p2_center = p2.mean(axis=2)
+    inter_dist = np.linalg.norm(p1_center - p2_center, axis=2, keepdims=True)
+
+    combined = np.concatenate([p1.reshape(B, T, -1), p2.reshape(B, T, -1)], axis=2)
+    velocities = combined[:, 1:] - combined[:, :-1]
+    speed = np.linalg.norm(velocities, axis=2, keepdims=True)
+
+    rel_vel = rel_joints[:, 1:] - rel_joints[:, :-1]
+    rel_speed = np.linalg.norm(rel_vel.reshape(B, T - 1, -1), axis=2, keepdims=True)
+
+    # Contact-Aware Features: every (limb, target) distance in both directions, interleaved
+    to_p2 = np.linalg.norm(p1[:, :, _CONTACT_FROM] - p2[:, :, _CONTACT_TO], axis=-1)
+    to_p1 = np.linalg.norm(p2[:, :, _CONTACT_FROM] - p1[:, :, _CONTACT_TO], axis=-1)
+    directed = np.stack([to_p2, to_p1], axis=-1).reshape(B, T, -1)
+    dists = np.linalg.norm(p1[:, :, :, None, :] - p2[:, :, None, :, :], axis=-1) # (B, T, 17, 17)
+    closest = dists.reshape(B, T, -1).min(axis=2, keepdims=True)
+    contact_features = np.concatenate([directed, closest], axis=2)
 
     features = np.concatenate([
         velocities,
         speed,
-        rel_joints_flat[1:],
+        rel_joints_flat[:, 1:],
         rel_speed,
-        angle_features[1:],
-        inter_dist[1:],
-        contact_features[1:]
-    ], axis=1)
+        angle_features[:, 1:],
+        inter_dist[:, 1:],
+        contact_features[:, 1:]
+    ], axis=2).astype(np.float32)
 
-    return features.astype(np.float32)
+    return features if batched else features[0]
 
 
 class SEBlock(nn.Module):
@@ -145,25 +141,42 @@ class FightNet(nn.Module):
             nn.Linear(hidden_dim, 1)
         )
 
-    def forward(self, x):
-        # x is (B, T, 150)
+    def forward(self, x, lengths=None):
+        # x is (B, T, 150); with `lengths` (B,) rows past each length are padding
+        mask = None
+        if lengths is not None:
+            steps = torch.arange(x.shape[1], device=x.device)
+            mask = (steps[None] < lengths[:, None]).unsqueeze(1).to(x.dtype) # (B, 1, T)
+
         x = self.input_proj(x) # (B, T, 96)
         
         # Conv1d expects (B, C, T)
         x = x.transpose(1, 2)
-        x = self.temporal(x) # (B, 96, T)
+        if mask is None:
+            x = self.temporal(x) # (B, 96, T)
+        else:
+            # Zeroing padding before every conv reproduces the unpadded conv's zero border
+            x = x * mask
+            for layer in self.temporal:
+                x = layer(x)
+                if isinstance(layer, nn.ReLU):
+                    x = x * mask
         
         x = x.transpose(1, 2) # (B, T, 96)
         
         # SE block (ignoring true logic for now as it needs careful reconstruction, let's just make shapes match)
         # Actually SE logic: Global avg pool -> fc1 -> relu -> fc2 -> sigmoid -> scale
-        w = x.mean(dim=1) # (B, 96)
+        w = x.mean(dim=1) if mask is None else x.sum(dim=1) / lengths[:, None].to(x.dtype) # (B, 96)
         w = torch.relu(self.se.fc1(w))
         w = torch.sigmoid(self.se.fc2(w))
         x = x * w.unsqueeze(1) # (B, T, 96)
         
         # Attention
-        a = self.attn(x) # (B, T, 1)
+        if mask is None:
+            a = self.attn(x) # (B, T, 1)
+        else:
+            logits = self.attn[0](x).masked_fill(mask.transpose(1, 2) == 0, float('-inf'))
+            a = self.attn[1](logits) # Padding gets zero weight
         x = (x * a).sum(dim=1) # (B, 96)
         
         # Classifier
@@ -171,40 +184,98 @@ class FightNet(nn.Module):
         return x
 
 _model_instance = None
+_model_device = 'cpu'
+_model_lock = threading.Lock()
+FIGHTNET_WEIGHTS = 'models/fightnet_best_model.pt'
+FIGHTNET_THRESHOLD = 0.40 # from config we see best_threshold is likely around 0.35 to 0.5
+
+def load_fightnet():
+    """Loads FightNet once per process (thread-safe). Returns the model, or None if it failed."""
+    global _model_instance, _model_device
+    with _model_lock:
+        if _model_instance is None:
+            try:
+                device = 'cuda' if torch.cuda.is_available() and not use_onnx() else 'cpu'
+                model = FightNet().to(device)
+                model.load_state_dict(torch.load(FIGHTNET_WEIGHTS, map_location=device))
+                model.eval()
+                if use_onnx():
+                    # Time axis stays dynamic: buffers are verified from 15 frames upwards
+                    model = load_module_backend(model, 'fightnet', torch.zeros(1, 29, 150),
+                                                {0: 'batch', 1: 'time'}, weights_hash=file_hash(FIGHTNET_WEIGHTS))
+                _model_instance = model
+                _model_device = device
+                print("[FightNet] Loaded successfully.")
+            except Exception as e:
+                print(f"[FightNet] Failed to load: {e}")
+                return None
+    return _model_instance
+
+def score_features(windows):
+    """
+    Fight probabilities for several feature windows in one forward pass.
+
+    Windows are right-padded to the longest into one (B, T-1, 150) batch and FightNet
+    masks the padding (convolution borders, SE pooling and attention), so each score
+    matches the single-window path. The ONNX graph takes the window alone, so on that
+    backend equal-length windows are stacked instead (one pass per distinct length).
+
+    Args:
+        windows (list): Each a (T-1, 150) feature array.
+
+    Returns:
+        list: Probability per window (None when the model is unavailable or the window is empty).
+    """
+    probs = [None] * len(windows)
+    model = load_fightnet()
+    if model is None:
+        return probs
+
+    valid = [i for i, window in enumerate(windows) if len(window)]
+    if isinstance(model, nn.Module):
+        groups = [valid] if valid else []
+    else:
+        by_length = {}
+        for i in valid:
+            by_length.setdefault(len(windows[i]), []).append(i)
+        groups = list(by_length.values())
+
+    for indices in groups:
+        lengths = [len(windows[i]) for i in indices]
+        batch = np.zeros((len(indices), max(lengths), windows[indices[0]].shape[1]), dtype=np.float32)
+        for row, i in enumerate(indices):
+            batch[row, :lengths[row]] = windows[i]
+        tensor = torch.from_numpy(batch).to(_model_device)
+        with torch.no_grad():
+            if isinstance(model, nn.Module):
+                out = model(tensor, torch.tensor(lengths, device=_model_device))
+            else:
+                out = model(tensor)
+            out = torch.sigmoid(out).reshape(-1).cpu().tolist()
+        for i, prob in zip(indices, out):
+            probs[i] = prob
+    return probs
+
+def score_pose_buffers(pose_buffers):
+    """
+    `score_features` for raw pose buffers (lists of (2, 17, 2) frames); equal-length
+    buffers are featurized in one batch.
+    """
+    windows = [np.zeros((0, 150), dtype=np.float32)] * len(pose_buffers)
+    by_length = {}
+    for i, buffer in enumerate(pose_buffers):
+        if len(buffer) >= 2:
+            by_length.setdefault(len(buffer), []).append(i)
+    for indices in by_length.values():
+        features = extract_features(np.stack([np.array(pose_buffers[i]) for i in indices])) # (B, T-1, 150)
+        for i, window in zip(indices, features):
+            windows[i] = window
+    return score_features(windows)
 
 def run_fightnet(pose_buffer):
     """
-    pose_buffer: list of 30 frames, each is (2, 17, 2)
+    pose_buffer: PoseWindow or list of up to 30 frames, each is (2, 17, 2)
     Returns boolean TRUE if fight.
     """
-    global _model_instance
-    if _model_instance is None:
-        try:
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            _model_instance = FightNet().to(device)
-            _model_instance.load_state_dict(torch.load('models/fightnet_best_model.pt', map_location=device))
-            _model_instance.eval()
-            print("[FightNet] Loaded successfully.")
-        except Exception as e:
-            print(f"[FightNet] Failed to load: {e}")
-            return False
-
-    if len(pose_buffer) < 2:
-        return False
-        
-    seq = np.array(pose_buffer) # (T, 2, 17, 2)
-    features = extract_features(seq) # (T-1, 150)
-    
-    # Pad to 30 if necessary for Conv1d temporal shapes, though CNN handles variable lengths
-    # But usually models trained on length 30 might expect it.
-    
-    tensor = torch.tensor(features, dtype=torch.float32).unsqueeze(0) # (1, T-1, 150)
-    device = next(_model_instance.parameters()).device
-    tensor = tensor.to(device)
-    
-    with torch.no_grad():
-        out = _model_instance(tensor)
-        prob = torch.sigmoid(out).item()
-        
-    # from config we see best_threshold is likely around 0.35 to 0.5
-    return prob > 0.40
+    prob = score_pose_buffers([pose_buffer])[0]
+    return prob is not None and prob > FIGHTNET_THRESHOLD
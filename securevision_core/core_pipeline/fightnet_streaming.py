@@ -0,0 +1,159 @@
+import threading
+import numpy as np
+import torch
+from config import FIGHT_WINDOW_FRAMES
+from core_pipeline.fightnet_integration import FightNet, FIGHTNET_WEIGHTS, extract_features
+
+# One feature row per consecutive pair of pose frames
+FEATURE_WINDOW = FIGHT_WINDOW_FRAMES - 1
+
+
+def frame_feature_rows(previous, current):
+    """
+    FightNet feature rows for a batch of frame transitions, computed once as each frame
+    enters a pair's window. Every feature only depends on a frame and the one before it,
+    so a window's features are just its rows stacked.
+
+    Args:
+        previous (np.ndarray): (B, 2, 17, 2) poses of the prior frame.
+        current (np.ndarray): (B, 2, 17, 2) poses of the new frame.
+
+    Returns:
+        np.ndarray: (B, 150) float32 rows.
+    """
+    return extract_features(np.stack([previous, current], axis=1))[:, 0]
+
+
+class _StreamState:
+    """
+    Cached activations of one pair's window: input projection and every conv layer.
+    Each is (capacity + 2, hidden) with the window in rows 1..count and zero rows around
+    it, which doubles as the convolutions' zero padding.
+    """
+    __slots__ = ('layers', 'count')
+
+    def __init__(self, capacity, hidden, depth):
+        self.layers = [np.zeros((capacity + 2, hidden), dtype=np.float32) for _ in range(depth + 1)]
+        self.count = 0
+
+
+class StreamingFightNet:
+    """
+    FightNet evaluated incrementally over a sliding window.
+
+    With kernel-3, padding-1 convolutions, adding a frame on the right only changes the
+    last `l + 1` positions of conv layer `l`, and dropping the oldest frame only changes
+    the first `l` positions (their zero padding moved). Everything else is the same
+    activation shifted by one, so each push recomputes a constant number of positions
+    per layer instead of the whole window. BatchNorm is folded into the conv weights.
+    The SE gate and attention pooling still read the whole (T, hidden) window, which is
+    a few small vector ops.
+
+    Scores match `FightNet.forward` on the same window (float tolerance).
+    """
+    def __init__(self, model, capacity=FEATURE_WINDOW):
+        self.capacity = capacity
+        as_np = lambda t: t.detach().cpu().float().numpy()
+
+        self.proj_w = as_np(model.input_proj.weight).T.copy() # (150, hidden)
+        self.proj_b = as_np(model.input_proj.bias)
+        self.hidden = len(self.proj_b)
+
+        # Conv1d + BatchNorm1d (eval) folded into one (3, C_in, C_out) kernel per layer
+        self.conv = []
+        modules = list(model.temporal)
+        for conv, bn in zip(modules[0::3], modules[1::3]):
+            scale = as_np(bn.weight) / np.sqrt(as_np(bn.running_var) + bn.eps)
+            kernel = as_np(conv.weight) * scale[:, None, None]         # (C_out, C_in, 3)
+            bias = (as_np(conv.bias) - as_np(bn.running_mean)) * scale + as_np(bn.bias)
+            self.conv.append((np.ascontiguousarray(kernel.transpose(2, 1, 0)), bias.astype(np.float32)))
+
+        self.se_fc1 = (as_np(model.se.fc1.weight).T.copy(), as_np(model.se.fc1.bias))
+        self.se_fc2 = (as_np(model.se.fc2.weight).T.copy(), as_np(model.se.fc2.bias))
+        self.attn_w = as_np(model.attn[0].weight)[0]
+        self.attn_b = float(as_np(model.attn[0].bias)[0])
+        norm = model.classifier[0]
+        self.norm_w, self.norm_b, self.norm_eps = as_np(norm.weight), as_np(norm.bias), norm.eps
+        self.out_w = as_np(model.classifier[1].weight)[0]
+        self.out_b = float(as_np(model.classifier[1].bias)[0])
+        self._positions = {}
+
+    def new_state(self):
+        return _StreamState(self.capacity, self.hidden, len(self.conv))
+
+    def _conv_at(self, layer, source, rows):
+        """Recomputes conv `layer` at padded `rows` of `source` (neighbours outside the window are zero rows)."""
+        kernel, bias = self.conv[layer]
+        out = source[rows - 1] @ kernel[0] + source[rows] @ kernel[1] + source[rows + 1] @ kernel[2] + bias
+        return np.maximum(out, 0.0, out=out)
+
+    def push(self, state, row):
+        """
+        Appends one feature row to a pair's window and returns the updated fight probability.
+
+        Args:
+            state (_StreamState): From `new_state()`.
+            row (np.ndarray): (150,) feature row (see `frame_feature_rows`).
+
+        Returns:
+            float: Sigmoid score for the current window.
+        """
+        dropped = state.count == self.capacity
+        if dropped:
+            for layer in state.layers:
+                layer[1:-2] = layer[2:-1]
+            state.count -= 1
+        n = state.count = state.count + 1
+        state.layers[0][n] = row @ self.proj_w + self.proj_b
+
+        for l, rows in enumerate(self._changed_rows(n, dropped), start=1):
+            state.layers[l][rows] = self._conv_at(l - 1, state.layers[l - 1], rows)
+        return self.score(state)
+
+    def _changed_rows(self, count, dropped):
+        """Per conv layer, the padded rows a push can change (cached per window length)."""
+        key = (count, dropped)
+        positions = self._positions.get(key)
+        if positions is None:
+            positions = []
+            for l in range(1, len(self.conv) + 1):
+                changed = np.arange(max(0, count - 1 - l), count)
+                if dropped:
+                    changed = np.union1d(np.arange(min(l - 1, count - 1) + 1), changed)
+                positions.append(changed + 1)
+            self._positions[key] = positions
+        return positions
+
+    def score(self, state):
+        """Fight probability for the window as it stands."""
+        x = state.layers[-1][1:state.count + 1]                       # (T, hidden)
+        w = np.maximum(x.mean(axis=0) @ self.se_fc1[0] + self.se_fc1[1], 0.0)
+        w = 1.0 / (1.0 + np.exp(-(w @ self.se_fc2[0] + self.se_fc2[1])))
+        x = x * w
+        logits = x @ self.attn_w + self.attn_b
+        a = np.exp(logits - logits.max())
+        pooled = (a / a.sum()) @ x
+        mean, var = pooled.mean(), pooled.var()
+        pooled = (pooled - mean) / np.sqrt(var + self.norm_eps) * self.norm_w + self.norm_b
+        return float(1.0 / (1.0 + np.exp(-(pooled @ self.out_w + self.out_b))))
+
+
+_streaming_model = None
+_streaming_lock = threading.Lock()
+
+
+def load_streaming_fightnet():
+    """Shared StreamingFightNet built from the FightNet weights on CPU. Returns None if they fail to load."""
+    global _streaming_model
+    with _streaming_lock:
+        if _streaming_model is None:
+            try:
+                model = FightNet()
+                model.load_state_dict(torch.load(FIGHTNET_WEIGHTS, map_location='cpu'))
+                model.eval()
+                _streaming_model = StreamingFightNet(model)
+                print("[FightNet] Streaming model ready.")
+            except Exception as e:
+                print(f"[FightNet] Failed to load streaming model: {e}")
+                return None
+    return _streaming_model
@@ -0,0 +1,293 @@
+import cv2
+import numpy as np
+try:
+    import torch
+    from ultralytics.nn.autobackend import AutoBackend
+    from ultralytics.utils import ops
+    from ultralytics.utils.checks import check_yaml
+    from ultralytics.trackers.bot_sort import BOTSORT
+    from ultralytics.engine.results import Boxes
+    from torchvision.ops import batched_nms
+    try:
+        from ultralytics.utils import yaml_load
+    except ImportError:
+        # Newer Ultralytics releases moved the helper onto the YAML class
+        from ultralytics.utils import YAML
+        yaml_load = YAML.load
+    from ultralytics.utils import IterableSimpleNamespace
+except ImportError:
+    AutoBackend = None
+from config import (BASE_CLASSES, WEAPON_CLASSES, MIN_CONFIDENCE,
+                    NMS_IOU_THRESHOLD, DETECTION_IMGSZ, TRACKER_TYPE, USE_CUDA, FRAME_RATE,
+                    CASCADE_CROP_SIZE, CASCADE_CROP_PADDING, CASCADE_MAX_CROPS)
+from core_pipeline.real_layer1 import get_models, get_model_path
+from core_pipeline.inference_backend import use_onnx, load_yolo_backend
+from core_pipeline.detections import Detections, CLASS_IDS, build_class_lookup
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Inference backends are shared by every engine (one copy of the weights per process),
+# while each engine owns its own tracker so streams never share track IDs.
+_backends = {'base': None, 'weapons': None}
+
+
+def get_backends():
+    """Wraps the lazily loaded YOLO models in raw inference backends (no predictor/tracker)."""
+    global _backends
+    if AutoBackend is None:
+        logger.error("Ultralytics not installed. Fused detection unavailable.")
+        return None
+
+    if _backends['base'] is None or _backends['weapons'] is None:
+        models = get_models()
+        if models is None:
+            return None
+
+        if use_onnx():
+            for key in ('base', 'weapons'):
+                _backends[key] = load_yolo_backend(models[key], f"yolo_{key}", get_model_path(key))
+            logger.info("Fused Layer 1 backends ready on ONNX Runtime (CPU).")
+            return _backends
+
+        device = torch.device('cuda:0' if USE_CUDA and torch.cuda.is_available() else 'cpu')
+        for key in ('base', 'weapons'):
+            backend = AutoBackend(weights=models[key].model, device=device, fp16=device.type == 'cuda', fuse=True, verbose=False)
+            backend.eval()
+            _backends[key] = backend
+        logger.info(f"Fused Layer 1 backends ready on {device}.")
+
+    return _backends
+
+
+def letterbox(img, new_shape=DETECTION_IMGSZ, stride=32, auto=True):
+    """
+    Resizes and pads an image to a stride-multiple shape while keeping the aspect ratio.
+    Mirrors the Ultralytics LetterBox transform so boxes match what `.track()` produced.
+
+    Returns:
+        tuple: (padded_img, ratio, (pad_w, pad_h))
+    """
+    h, w = img.shape[:2]
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    if auto:
+        # Minimum rectangle: only pad up to the next stride multiple
+        dw, dh = np.mod(dw, stride), np.mod(dh, stride)
+    dw /= 2
+    dh /= 2
+
+    if (w, h) != new_unpad:
+        img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return img, r, (dw, dh)
+
+
+class FusedDetectionEngine:
+    """
+    Layer 1 engine that runs the base and weapon models on one shared input tensor.
+
+    Compared to two sequential `.track()` calls this:
+      1. Letterboxes/normalizes the frame once for both models.
+      2. Gates classes inside NMS (`classes=`) instead of after the fact.
+      3. Feeds one merged detection set to a single BoTSORT tracker, so base and
+         weapon tracks can no longer collide on the same track ID.
+    """
+    def __init__(self):
+        self.tracker = None
+        self._model_meta = None    # Per-model NMS class filter and merged class offset
+
+    def ready(self):
+        """Lazily loads shared backends and creates this engine's tracker. Returns False if unavailable."""
+        return self.tracker is not None or self._setup()
+
+    def _setup(self):
+        backends = get_backends()
+        if backends is None:
+            return False
+
+        models = get_models()
+        self._model_meta = {}
+        vocab_parts, threshold_parts = [], []
+        offset = 0
+        for key, valid_classes in (('base', BASE_CLASSES), ('weapons', WEAPON_CLASSES)):
+            vocab_ids, thresholds = build_class_lookup(models[key].names, valid_classes)
+            self._model_meta[key] = {
+                'keep_ids': np.flatnonzero(vocab_ids >= 0).tolist(),
+                'offset': offset,
+            }
+            vocab_parts.append(vocab_ids)
+            threshold_parts.append(thresholds)
+            offset += len(vocab_ids)
+
+        # Merged class id -> vocabulary id / confidence threshold
+        self._merged_to_vocab = np.concatenate(vocab_parts)
+        self._class_thresholds = np.concatenate(threshold_parts)
+
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(TRACKER_TYPE)))
+        self.tracker = BOTSORT(args=cfg, frame_rate=FRAME_RATE)
+        return True
+
+    def preprocess(self, frames, auto=True, imgsz=DETECTION_IMGSZ):
+        """
+        Converts a list of frames into one normalized BCHW tensor.
+        Batched frames must letterbox to the same shape (use auto=False for mixed resolutions).
+
+        Returns:
+            tuple: (tensor, letterboxed_shape)
+        """
+        device = next(iter(_backends.values())).device
+        padded = [letterbox(f, new_shape=imgsz, auto=auto)[0] for f in frames]
+        # Ultralytics treats numpy input as BGR and swaps to RGB; mirror it so the
+        # models see exactly what they saw through `.track()`.
+        batch = np.ascontiguousarray(np.stack(padded)[..., ::-1].transpose(0, 3, 1, 2))
+        tensor = torch.from_numpy(batch).to(device)
+        tensor = tensor.half() if device.type == 'cuda' else tensor.float()
+        tensor /= 255.0
+        return tensor, padded[0].shape[:2]
+
+    def infer(self, tensor, keys=('base', 'weapons')):
+        """
+        Runs the selected models (both by default) on the same tensor with in-NMS class filtering.
+
+        Returns:
+            list: One (N, 6) tensor per image [x1, y1, x2, y2, conf, merged_cls] in letterbox coords.
+        """
+        merged = [[] for _ in range(tensor.shape[0])]
+        with torch.no_grad():
+            for key in keys:
+                meta = self._model_meta[key]
+                preds = _backends[key](tensor)
+                dets = ops.non_max_suppression(preds, MIN_CONFIDENCE, NMS_IOU_THRESHOLD,
+                                               classes=meta['keep_ids'], max_det=300)
+                for i, det in enumerate(dets):
+                    det[:, 5] += meta['offset']
+                    merged[i].append(det)
+        return [torch.cat(d) for d in merged]
+
+    def _to_frame(self, det, input_shape, frame_shape):
+        """Scales letterbox-space detections to the frame and moves them to a float32 numpy array."""
+        if len(det):
+            det[:, :4] = ops.scale_boxes(input_shape, det[:, :4], frame_shape[:2])
+        return det.float().cpu().numpy()
+
+    def _update_tracker(self, det, frame):
+        """Applies per-class thresholds to frame-space detections and updates this engine's tracker."""
+        keep = det[:, 4] >= self._class_thresholds[det[:, 5].astype(int)]
+        det = det[keep]
+
+        tracks = self.tracker.update(Boxes(det, frame.shape[:2]), frame)
+        if len(tracks) == 0:
+            return Detections.empty()
+
+        # tracks: [x1, y1, x2, y2, track_id, conf, merged_cls, det_idx]
+        return Detections(np.trunc(tracks[:, :4]), self._merged_to_vocab[tracks[:, 6].astype(np.int64)],
+                          tracks[:, 5], tracks[:, 4])
+
+    def track(self, det, input_shape, frame):
+        """
+        Rescales merged detections to the frame, applies per-class thresholds and
+        updates this engine's tracker.
+
+        Returns:
+            Detections: Columnar batch of active tracks.
+        """
+        return self._update_tracker(self._to_frame(det, input_shape, frame.shape), frame)
+
+    def detect(self, frame, frame_number):
+        """
+        Drop-in replacement for `real_layer1.get_yolo_detections` (same signature and output
+        format; `frame_number` is unused because the tracker counts its own frames).
+        """
+        if not self.ready():
+            return Detections.empty()
+
+        tensor, input_shape = self.preprocess([frame])
+        det = self.infer(tensor)[0]
+        return self.track(det, input_shape, frame)
+
+    def detect_cascade(self, frame, full_frame):
+        """
+        Person-anchored weapon detection.
+
+        The base model runs on the (downscaled) processing frame. The weapon model then
+        runs only on padded person crops cut from `full_frame` at native resolution, so
+        small handguns keep their pixels and empty scenes skip weapon inference entirely.
+        Weapon boxes are mapped back into processing-frame coordinates before tracking.
+
+        Args:
+            frame (np.array): Processing frame (e.g. PROCESSING_WIDTH wide).
+            full_frame (np.array): Same frame before downscaling.
+        """
+        if not self.ready():
+            return Detections.empty()
+
+        tensor, input_shape = self.preprocess([frame])
+        base_det = self._to_frame(self.infer(tensor, keys=('base',))[0], input_shape, frame.shape)
+
+        base_cls = base_det[:, 5].astype(np.int64)
+        person_mask = (self._merged_to_vocab[base_cls] == CLASS_IDS['person']) & \
+            (base_det[:, 4] >= self._class_thresholds[base_cls])
+        persons = base_det[person_mask]
+
+        weapon_det = self._detect_weapons_in_crops(persons[:, :4], frame.shape, full_frame)
+        return self._update_tracker(np.concatenate([base_det, weapon_det]), frame)
+
+    def _detect_weapons_in_crops(self, person_boxes, frame_shape, full_frame):
+        """Runs the weapon model on batched full-resolution person crops. Returns frame-space (N, 6)."""
+        if len(person_boxes) == 0:
+            return np.zeros((0, 6), dtype=np.float32)
+
+        full_h, full_w = full_frame.shape[:2]
+        sx, sy = full_w / frame_shape[1], full_h / frame_shape[0]
+
+        # Largest persons first: they are the most likely to hold a visible weapon
+        areas = (person_boxes[:, 2] - person_boxes[:, 0]) * (person_boxes[:, 3] - person_boxes[:, 1])
+        person_boxes = person_boxes[np.argsort(-areas)[:CASCADE_MAX_CROPS]]
+
+        crops, offsets = [], []
+        for x1, y1, x2, y2 in person_boxes:
+            pad_x = (x2 - x1) * CASCADE_CROP_PADDING
+            pad_y = (y2 - y1) * CASCADE_CROP_PADDING
+            cx1 = int(max(0, (x1 - pad_x) * sx))
+            cy1 = int(max(0, (y1 - pad_y) * sy))
+            cx2 = int(min(full_w, (x2 + pad_x) * sx))
+            cy2 = int(min(full_h, (y2 + pad_y) * sy))
+            if cx2 - cx1 < 2 or cy2 - cy1 < 2:
+                continue
+            crops.append(full_frame[cy1:cy2, cx1:cx2])
+            offsets.append((cx1, cy1))
+
+        if not crops:
+            return np.zeros((0, 6), dtype=np.float32)
+
+        # Square letterbox so every crop stacks into one batch
+        tensor, input_shape = self.preprocess(crops, auto=False, imgsz=CASCADE_CROP_SIZE)
+        dets = self.infer(tensor, keys=('weapons',))
+
+        mapped = []
+        for det, crop, (ox, oy) in zip(dets, crops, offsets):
+            det = self._to_frame(det, input_shape, crop.shape)
+            if len(det) == 0:
+                continue
+            # Crop -> full frame -> processing frame
+            det[:, [0, 2]] = (det[:, [0, 2]] + ox) / sx
+            det[:, [1, 3]] = (det[:, [1, 3]] + oy) / sy
+            mapped.append(det)
+
+        if not mapped:
+            return np.zeros((0, 6), dtype=np.float32)
+        weapon_det = np.concatenate(mapped)
+
+        # Overlapping crops (people standing together) can see the same weapon twice
+        boxes = torch.from_numpy(np.ascontiguousarray(weapon_det[:, :4]))
+        scores = torch.from_numpy(np.ascontiguousarray(weapon_det[:, 4]))
+        classes = torch.from_numpy(weapon_det[:, 5].astype(np.int64))
+        keep = batched_nms(boxes, scores, classes, NMS_IOU_THRESHOLD)
+        return weapon_det[keep.numpy()]
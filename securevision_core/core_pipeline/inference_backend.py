@@ -0,0 +1,214 @@
+"""
+Pluggable inference backend.
+
+With `INFERENCE_BACKEND = 'torch'` every network runs through eager PyTorch exactly as
+before. With `'onnx'` the YOLO detection models, the pose model, the ReID backbone and
+FightNet are exported to ONNX once, cached under `ONNX_CACHE_DIR` with a content hash of
+the source weights, optionally INT8-quantized, and executed with ONNX Runtime on CPU.
+
+`OnnxModel` is call-compatible with the torch modules it replaces: it accepts a torch
+tensor (or numpy array) and returns a torch tensor, so callers keep their
+`with torch.no_grad(): out = model(x)` code unchanged.
+"""
+import os
+import shutil
+import hashlib
+import numpy as np
+try:
+    import torch
+except ImportError:
+    torch = None
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+from config import (INFERENCE_BACKEND, ONNX_CACHE_DIR, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS,
+                    ONNX_QUANTIZATION, ONNX_OPSET)
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Loaded sessions are shared by every pipeline in the process
+_sessions = {}
+
+
+def use_onnx():
+    """True if the ONNX Runtime backend is selected and importable."""
+    if INFERENCE_BACKEND != 'onnx':
+        return False
+    if ort is None:
+        logger.error("INFERENCE_BACKEND='onnx' but onnxruntime is not installed. Falling back to PyTorch.")
+        return False
+    return True
+
+
+def file_hash(path):
+    """SHA-256 of a weights file (streamed, so large checkpoints are fine)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def module_hash(module):
+    """SHA-256 over a module's state_dict, for networks without a local weights file (e.g. torchvision)."""
+    h = hashlib.sha256()
+    for key, tensor in module.state_dict().items():
+        h.update(key.encode())
+        h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return h.hexdigest()
+
+
+def cache_path(name, weights_hash, suffix=''):
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    return os.path.join(ONNX_CACHE_DIR, f"{name}-{weights_hash[:16]}{suffix}.onnx")
+
+
+def calibration_path(name):
+    return os.path.join(ONNX_CACHE_DIR, 'calibration', f"{name}.npz")
+
+
+class OnnxModel:
+    """ONNX Runtime CPU session with a torch-module-like call signature."""
+    def __init__(self, path, intra_op_threads=ONNX_INTRA_OP_THREADS, inter_op_threads=ONNX_INTER_OP_THREADS):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+        # Attributes the pipeline reads off torch backends
+        self.device = torch.device('cpu') if torch is not None else 'cpu'
+        self.fp16 = False
+
+    def __call__(self, x):
+        is_tensor = torch is not None and isinstance(x, torch.Tensor)
+        array = x.detach().cpu().float().numpy() if is_tensor else np.asarray(x, dtype=np.float32)
+        outputs = self.session.run(self.output_names, {self.input_name: array})
+        if is_tensor:
+            outputs = [torch.from_numpy(o) for o in outputs]
+        return outputs[0] if len(outputs) == 1 else outputs
+
+    def eval(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+
+def export_module(module, name, example_input, dynamic_axes, weights_hash=None):
+    """
+    Exports a torch module to ONNX (once per weights hash).
+
+    Args:
+        module (nn.Module): Network in eval mode.
+        name (str): Cache name, e.g. 'reid' or 'fightnet'.
+        example_input (torch.Tensor): Tracing input.
+        dynamic_axes (dict): Axes left symbolic for the 'input' tensor, e.g. {0: 'batch'}.
+    """
+    weights_hash = weights_hash or module_hash(module)
+    path = cache_path(name, weights_hash)
+    if not os.path.exists(path):
+        logger.info(f"[ONNX] Exporting {name} -> {path}")
+        module = module.cpu().eval()
+        kwargs = dict(opset_version=ONNX_OPSET, input_names=['input'], output_names=['output'],
+                      dynamic_axes={'input': dynamic_axes, 'output': {0: 'batch'}})
+        with torch.no_grad():
+            try:
+                # TorchScript exporter: single self-contained file, honours dynamic_axes
+                torch.onnx.export(module, example_input.cpu(), path, dynamo=False, **kwargs)
+            except TypeError:
+                # Older torch without the `dynamo` switch
+                torch.onnx.export(module, example_input.cpu(), path, **kwargs)
+    return path
+
+
+def export_yolo(yolo_model, name, weights_path):
+    """Exports an Ultralytics model (detect or pose) with dynamic batch/shape via its own exporter."""
+    path = cache_path(name, file_hash(weights_path))
+    if not os.path.exists(path):
+        logger.info(f"[ONNX] Exporting {name} ({os.path.basename(weights_path)}) -> {path}")
+        exported = yolo_model.export(format='onnx', dynamic=True, simplify=False, opset=ONNX_OPSET, verbose=False)
+        shutil.move(exported, path)
+    return path
+
+
+def quantize(path, name, mode=ONNX_QUANTIZATION):
+    """
+    Returns the INT8 variant of an exported model, creating it if needed.
+
+    'dynamic' needs no data. 'static' reads the calibration set written by
+    `calibrate_onnx.py`; without one it falls back to dynamic quantization. Static
+    outputs are keyed on the calibration file's hash, so recalibrating requantizes.
+    """
+    if not mode:
+        return path
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantType, QuantFormat
+
+    if mode == 'static' and not os.path.exists(calibration_path(name)):
+        logger.warning(f"[ONNX] No calibration data for {name} (run calibrate_onnx.py). Using dynamic INT8.")
+        mode = 'dynamic'
+
+    suffix = f'-int8-static-{file_hash(calibration_path(name))[:16]}' if mode == 'static' else f'-int8-{mode}'
+    out_path = path.replace('.onnx', f'{suffix}.onnx')
+    if os.path.exists(out_path):
+        return out_path
+
+    logger.info(f"[ONNX] Quantizing {name} ({mode}) -> {out_path}")
+    if mode == 'static':
+        quantize_static(path, out_path, NpzCalibrationReader(path, calibration_path(name)),
+                        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8)
+    else:
+        quantize_dynamic(path, out_path, weight_type=QuantType.QUInt8)
+    return out_path
+
+
+def load_session(path):
+    if path not in _sessions:
+        _sessions[path] = OnnxModel(path)
+        logger.info(f"[ONNX] Loaded {os.path.basename(path)} "
+                    f"(intra_op_threads={ONNX_INTRA_OP_THREADS or 'auto'})")
+    return _sessions[path]
+
+
+def load_yolo_backend(yolo_model, name, weights_path):
+    """ONNX Runtime replacement for an Ultralytics model's raw forward pass."""
+    return load_session(quantize(export_yolo(yolo_model, name, weights_path), name))
+
+
+def load_module_backend(module, name, example_input, dynamic_axes, weights_hash=None):
+    """ONNX Runtime replacement for a plain torch module (ReID backbone, FightNet)."""
+    path = export_module(module, name, example_input, dynamic_axes, weights_hash)
+    # FightNet consumes geometric features, not images, so it is only ever dynamically quantized
+    mode = 'dynamic' if ONNX_QUANTIZATION and name == 'fightnet' else ONNX_QUANTIZATION
+    return load_session(quantize(path, name, mode))
+
+
+if ort is not None:
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class NpzCalibrationReader(CalibrationDataReader):
+        """Feeds samples saved by `calibrate_onnx.py` (one array 'samples' of shape (N, ...))."""
+        def __init__(self, model_path, npz_path):
+            session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+            self.input_name = session.get_inputs()[0].name
+            self.samples = np.load(npz_path)['samples']
+            self.index = 0
+
+        def get_next(self):
+            if self.index >= len(self.samples):
+                return None
+            sample = self.samples[self.index:self.index + 1].astype(np.float32)
+            self.index += 1
+            return {self.input_name: sample}
+
+        def rewind(self):
+            self.index = 0
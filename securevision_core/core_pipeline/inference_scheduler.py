@@ -0,0 +1,174 @@
+import threading
+import queue
+import time
+from collections import deque, Counter
+from concurrent.futures import Future
+from config import INFERENCE_BATCH_WINDOW_MS, INFERENCE_MAX_BATCH
+from core_pipeline.fused_layer1 import FusedDetectionEngine
+from core_pipeline.detections import Detections
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _InferenceRequest:
+    __slots__ = ('stream_id', 'frame', 'frame_number', 'future', 'enqueued_at')
+
+    def __init__(self, stream_id, frame, frame_number):
+        self.stream_id = stream_id
+        self.frame = frame
+        self.frame_number = frame_number
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """
+    Central Layer 1 scheduler shared by every `SecureVisionPipeline` in the process.
+
+    Frames submitted by all registered streams within `window_ms` of the first queued
+    frame (or until every registered stream has one queued) are letterboxed into one batch and pushed through the base and weapon models
+    in a single forward pass each. The merged detections are then routed back to each
+    stream's own `FusedDetectionEngine`, so BoTSORT state never leaks between cameras.
+    """
+    def __init__(self, window_ms=INFERENCE_BATCH_WINDOW_MS, max_batch=INFERENCE_MAX_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._requests = queue.Queue()
+        self._engines = {}  # stream_id -> FusedDetectionEngine (per-stream tracker)
+        self._batch_engine = FusedDetectionEngine()  # Shared preprocess + inference stages
+        self._lock = threading.Lock()
+
+        # Statistics
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=1000)  # Seconds between submit and batch start
+        self._frames_processed = 0
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="InferenceScheduler", daemon=True)
+        self._thread.start()
+
+    def register_stream(self, stream_id):
+        """Registers (or resets) a stream. Re-registering starts a fresh tracker."""
+        with self._lock:
+            self._engines[stream_id] = FusedDetectionEngine()
+
+    def unregister_stream(self, stream_id):
+        with self._lock:
+            self._engines.pop(stream_id, None)
+
+    def submit(self, stream_id, frame, frame_number):
+        """
+        Queues a frame for the next batch.
+
+        Returns:
+            Future: Resolves to the stream's Detections batch.
+        """
+        if stream_id not in self._engines:
+            self.register_stream(stream_id)
+        request = _InferenceRequest(stream_id, frame, frame_number)
+        self._requests.put(request)
+        return request.future
+
+    def detect(self, stream_id, frame, frame_number):
+        """Blocking convenience wrapper around `submit`."""
+        return self.submit(stream_id, frame, frame_number).result()
+
+    def stop(self):
+        self._running = False
+        self._thread.join(timeout=2.0)
+
+    def get_stats(self):
+        """Returns batch-size and queue-wait statistics for telemetry."""
+        total_batches = sum(self._batch_sizes.values())
+        waits = sorted(self._queue_waits)
+        return {
+            'streams': len(self._engines),
+            'batches': total_batches,
+            'frames': self._frames_processed,
+            'avg_batch_size': round(self._frames_processed / total_batches, 2) if total_batches else 0.0,
+            'batch_size_histogram': dict(self._batch_sizes),
+            'queue_depth': self._requests.qsize(),
+            'avg_queue_wait_ms': round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+            'p95_queue_wait_ms': round(1000 * waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+            'max_queue_wait_ms': round(1000 * waits[-1], 2) if waits else 0.0,
+        }
+
+    def _collect_batch(self):
+        try:
+            first = self._requests.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        # At most one frame per registered stream can be in flight, so stop waiting once
+        # every stream is in the batch (immediately with a single stream)
+        with self._lock:
+            target = max(1, min(self.max_batch, len(self._engines)))
+        batch = [first]
+        deadline = first.enqueued_at + self.window
+        while len(batch) < target:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                logger.error(f"[Scheduler] Batch of {len(batch)} failed: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _process_batch(self, batch):
+        started = time.perf_counter()
+        for request in batch:
+            self._queue_waits.append(started - request.enqueued_at)
+        self._batch_sizes[len(batch)] += 1
+        self._frames_processed += len(batch)
+
+        if not self._batch_engine.ready():
+            for request in batch:
+                request.future.set_result(Detections.empty())
+            return
+
+        # Single frames keep the minimal-padding letterbox; mixed batches pad to a square
+        auto = len(batch) == 1
+        tensor, input_shape = self._batch_engine.preprocess([r.frame for r in batch], auto=auto)
+        dets = self._batch_engine.infer(tensor)
+
+        # Route results back; tracking runs in submission order per stream
+        for request, det in zip(batch, dets):
+            with self._lock:
+                engine = self._engines.get(request.stream_id)
+            if engine is None or not engine.ready():
+                request.future.set_result(Detections.empty())
+                continue
+            try:
+                request.future.set_result(engine.track(det, input_shape, request.frame))
+            except Exception as e:
+                request.future.set_exception(e)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide scheduler, starting it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = InferenceScheduler()
+            logger.info(f"[Scheduler] Started (window={INFERENCE_BATCH_WINDOW_MS}ms, max_batch={INFERENCE_MAX_BATCH}).")
+    return _scheduler
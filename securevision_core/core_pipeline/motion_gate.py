@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+from config import (FRAME_RATE, MOTION_GATE_METHOD, MOTION_GATE_WIDTH, MOTION_GATE_PIXEL_THRESHOLD,
+                    MOTION_GATE_MIN_CHANGED_FRACTION, MOTION_GATE_MAX_SKIP_SECONDS)
+
+
+class MotionGate:
+    """
+    Cheap pre-Layer-1 check that decides whether a frame changed enough to be worth detecting.
+
+    Works on a heavily downscaled, blurred grayscale copy of the frame:
+      - 'diff': absolute difference against the last frame that went through detection
+        (comparing to the last *detected* frame means slow drift still accumulates).
+      - 'mog2': OpenCV MOG2 background model; foreground pixels count as motion.
+
+    A full detection is forced at least every `max_skip_seconds` (counted in frames,
+    so recorded footage processed faster than real time behaves the same).
+    """
+    def __init__(self, method=MOTION_GATE_METHOD, width=MOTION_GATE_WIDTH,
+                 pixel_threshold=MOTION_GATE_PIXEL_THRESHOLD,
+                 min_changed_fraction=MOTION_GATE_MIN_CHANGED_FRACTION,
+                 max_skip_seconds=MOTION_GATE_MAX_SKIP_SECONDS):
+        self.method = method
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip_frames = max(1, int(max_skip_seconds * FRAME_RATE))
+
+        self._reference = None
+        self._last_detect_frame = None
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16, detectShadows=False) \
+            if method == 'mog2' else None
+
+        # Telemetry
+        self.frames_seen = 0
+        self.frames_skipped = 0
+        self.last_changed_fraction = 0.0
+
+    def _downscale(self, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        h, w = gray.shape[:2]
+        small = cv2.resize(gray, (self.width, max(1, int(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def is_static(self, frame, frame_number):
+        """
+        Returns True if detection can be skipped and the previous tracks carried forward.
+        Returning False means the caller must run detection on this frame.
+        """
+        self.frames_seen += 1
+        small = self._downscale(frame)
+
+        if self._subtractor is not None:
+            # The background model must see every frame to stay current
+            changed = float(np.count_nonzero(self._subtractor.apply(small))) / small.size
+        elif self._reference is None or self._reference.shape != small.shape:
+            changed = 1.0
+        else:
+            diff = cv2.absdiff(small, self._reference)
+            changed = float(np.count_nonzero(diff > self.pixel_threshold)) / small.size
+        self.last_changed_fraction = changed
+
+        overdue = self._last_detect_frame is None or \
+            frame_number - self._last_detect_frame >= self.max_skip_frames
+        if changed < self.min_changed_fraction and not overdue:
+            self.frames_skipped += 1
+            return True
+
+        self._reference = small
+        self._last_detect_frame = frame_number
+        return False
+
+    def get_stats(self):
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_skipped': self.frames_skipped,
+            'skip_ratio': round(self.frames_skipped / self.frames_seen, 3) if self.frames_seen else 0.0,
+            'last_changed_fraction': round(self.last_changed_fraction, 4),
+        }
@@ -1,43 +1,188 @@
+import os
 import cv2
+from concurrent.futures import Future
 import numpy as np
-from config import SUSTAINED_DURATION_FRAMES, WEAPON_CLASSES
+from config import (SUSTAINED_DURATION_FRAMES, WEAPON_CLASSES, LUGGAGE_CLASSES, USE_FUSED_DETECTION,
+                    USE_INFERENCE_SCHEDULER, ADAPTIVE_DETECTION_STRIDE, WEAPON_CASCADE_MODE, MOTION_GATE_ENABLED,
+                    ALERT_PERSISTENCE_TTL_FRAMES, MAX_TRACKS)
 from core_pipeline.tracker_state import TrackerState
 from core_pipeline.real_layer1 import get_yolo_detections
+from core_pipeline.fused_layer1 import FusedDetectionEngine
+from core_pipeline.inference_scheduler import get_scheduler
+from core_pipeline.detection_stride import DetectionStrideController
+from core_pipeline.motion_gate import MotionGate
+from core_pipeline.detections import Detections, CLASS_IDS
 from utils.logger import setup_logger
-from utils.stats_manager import StatsManager
+from utils.state_expiry import ExpiringDict
 from core_pipeline.reid_manager import ReIDManager
+from core_pipeline.reid_scheduler import ReIDExtractionScheduler
 from core_pipeline.fight_detector import FightDetector
 
 logger = setup_logger(__name__)
 
+CAPTURE_DIR = os.path.join(os.path.dirname(__file__), '..', 'captures')
+
+# How a frame skipped by Layer 1 is covered (see SecureVisionPipeline._start_layer1)
+_STATIC_FRAME = 'static'     # Motion gate: replay the last detections
+_PREDICTED_FRAME = 'predict' # Detection stride: constant-velocity prediction
+
 class SecureVisionPipeline:
-    def __init__(self, stream_id="default"):
+    def __init__(self, stream_id="default", scheduler=None, stats_manager=None, capture_dir=CAPTURE_DIR):
+        """
+        Args:
+            stream_id (str): Camera / source name used in logs and events.
+            scheduler (InferenceScheduler): Shared Layer 1 scheduler (defaults to config).
+            stats_manager: Event sink with `log_event(event_type, details)`; defaults to the
+                PostgreSQL-backed StatsManager. Offline analysis passes its own recorder.
+            capture_dir (str): Where critical-event snapshots are written; None disables them.
+        """
         self.stream_id = stream_id
         # Initialize Tracker State per instance
         self.tracker_state = TrackerState()
-        self.stats_manager = StatsManager()
+        if stats_manager is None:
+            from utils.stats_manager import StatsManager # psycopg2 is only needed for the DB-backed sink
+            stats_manager = StatsManager()
+        self.stats_manager = stats_manager
+        self.capture_dir = capture_dir
         self.reid_manager = ReIDManager() # Initialize ReID
+        self.reid_scheduler = ReIDExtractionScheduler() # Which people get a new embedding each frame
         self.fight_detector = FightDetector() # Initialize Fight Detector
         self.recording_frames_left = 0 # Initialize recording state
         self.fight_snapshot_cooldown = 0 # Prevent taking thousands of screenshots for continuous fights
-        self.alert_persistence = {} # {tid: {'status': ..., 'details': ..., 'color': ..., 'frames': 30}}
+        # {tid: {'status': ..., 'details': ..., 'color': ..., 'frames': 30}}; bounded by TTL and dropped with the track
+        self.alert_persistence = ExpiringDict('alert_persistence', ttl=ALERT_PERSISTENCE_TTL_FRAMES,
+                                              max_size=MAX_TRACKS)
+        self.tracker_state.add_release_listener(self._forget_track)
+        # Layer 1 routing: shared cross-camera scheduler > per-stream fused engine > legacy .track()
+        if scheduler is None and USE_INFERENCE_SCHEDULER:
+            scheduler = get_scheduler()
+        self.scheduler = scheduler
+        if self.scheduler is not None:
+            if WEAPON_CASCADE_MODE:
+                raise ValueError("WEAPON_CASCADE_MODE needs the per-stream FusedDetectionEngine; "
+                                 "disable USE_INFERENCE_SCHEDULER or WEAPON_CASCADE_MODE")
+            self.scheduler.register_stream(stream_id) # Fresh tracker for this stream
+            self.detector = None
+        else:
+            # Fused Layer 1 keeps its own tracker per pipeline (stream); models are shared
+            self.detector = FusedDetectionEngine() if USE_FUSED_DETECTION else None
+        self.stride_controller = DetectionStrideController() if ADAPTIVE_DETECTION_STRIDE else None
+        self.motion_gate = MotionGate() if MOTION_GATE_ENABLED else None
+        self._last_detections = Detections.empty() # Refreshed in TrackerState on static frames
+        self._pending_layer1 = None # (frame_number, Layer 1 start) from submit_frame
+
+    def _forget_track(self, track_id):
+        """Drops per-track state when TrackerState releases a track."""
+        self.alert_persistence.pop(track_id, None)
+        self.fight_detector.pose_filter.keypoint_history.pop(track_id, None)
+        self.reid_scheduler.forget(track_id)
+
+    def get_state_stats(self):
+        """Sizes and eviction counters of every long-lived structure in this pipeline."""
+        return {
+            'tracks': self.tracker_state.get_stats(),
+            'alert_persistence': self.alert_persistence.get_stats(),
+            'keypoint_history': self.fight_detector.pose_filter.keypoint_history.get_stats(),
+            'known_identities': self.reid_manager.known_identities.get_stats(),
+            'reid_schedule': self.reid_scheduler.tracks.get_stats(),
+        }
 
-    def process_frame(self, frame, frame_number, capture_callback=None):
+    def _detect(self, frame, frame_number, full_res_frame=None):
+        """Runs Layer 1 inline (per-stream fused engine or legacy .track()); scheduler frames go through `_start_layer1`."""
+        if self.detector is not None:
+            if WEAPON_CASCADE_MODE and full_res_frame is not None:
+                return self.detector.detect_cascade(frame, full_res_frame)
+            return self.detector.detect(frame, frame_number)
+        return get_yolo_detections(frame, frame_number)
+
+    def submit_frame(self, frame, frame_number, full_res_frame=None):
         """
-        Main processing function for the pipeline instance.
+        Starts Layer 1 for a frame without waiting for it; `process_frame` with the same
+        frame_number picks the result up.
+
+        A worker driving several pipelines through one shared scheduler submits every due
+        stream's frame first and only then processes them, so their frames land in one
+        batch instead of one blocking batch of one per stream. Without a scheduler there is
+        nothing to overlap and this is a no-op.
         """
-        # 1. Layer 1: Get Detections
-        detections = get_yolo_detections(frame, frame_number)
-        
-        # 2. Update Tracker State
+        if self.scheduler is not None:
+            self._pending_layer1 = (frame_number, self._start_layer1(frame, frame_number, full_res_frame))
+
+    def _start_layer1(self, frame, frame_number, full_res_frame=None):
+        """
+        Decides how a frame is covered: _STATIC_FRAME (motion gate), _PREDICTED_FRAME (stride
+        frame), or detections, as a Future when they were queued on the shared scheduler.
+        """
+        if self.motion_gate is not None and self.motion_gate.is_static(frame, frame_number):
+            return _STATIC_FRAME
+        if self.stride_controller is not None and not self.stride_controller.should_detect():
+            return _PREDICTED_FRAME
+        if self.scheduler is not None:
+            return self.scheduler.submit(self.stream_id, frame, frame_number)
+        return self._detect(frame, frame_number, full_res_frame)
+
+    def _run_layer1(self, frame, frame_number, full_res_frame=None):
+        """
+        Layer 1 + tracker update for one frame.
+
+        - Static frame (motion gate): the last detected tracks are refreshed in TrackerState so
+          last_seen and luggage timers keep advancing without running inference. No history
+          is appended, so history-based checks (weapon debounce) only count real detections.
+        - Stride frame: tracks are advanced by the constant-velocity model.
+        - Otherwise: full detection (already queued if `submit_frame` was called).
+
+        Returns:
+            Detections: Fresh detections for downstream per-detection work (empty when skipped).
+        """
+        pending, self._pending_layer1 = self._pending_layer1, None
+        if pending is not None and pending[0] == frame_number:
+            started = pending[1]
+        else:
+            started = self._start_layer1(frame, frame_number, full_res_frame)
+
+        if started is _STATIC_FRAME:
+            self.tracker_state.refresh(self._last_detections, frame_number)
+            return Detections.empty()
+
+        if started is _PREDICTED_FRAME:
+            self.tracker_state.predict(frame_number)
+            return Detections.empty()
+
+        detections = started.result() if isinstance(started, Future) else started
+        if not isinstance(detections, Detections):
+            detections = Detections.from_dicts(detections) # Legacy/mock layers return dicts
         self.tracker_state.update(detections, frame_number)
+        self._last_detections = detections
+        return detections
+
+    def _needs_full_detection_rate(self, frame_number):
+        """True while a weapon, fight candidate or luggage countdown is active (stride must be 1)."""
+        if self.fight_detector.active_pairs:
+            return True
+        for _ in self.tracker_state.iter_active(WEAPON_CLASSES, max_age=10):
+            return True
+        for _, track in self.tracker_state.iter_active(LUGGAGE_CLASSES, max_age=10):
+            if track['abandoned_timer'] > 0:
+                return True
+        return False
+
+    def process_frame(self, frame, frame_number, capture_callback=None, full_res_frame=None):
+        """
+        Main processing function for the pipeline instance.
+
+        `full_res_frame` is the same frame before resizing to PROCESSING_WIDTH; when given
+        and WEAPON_CASCADE_MODE is on, weapons are searched in full-resolution person crops.
+        """
+        # 1-2. Layer 1 + Tracker State (detect, predict on stride frames, or carry forward on static frames)
+        detections = self._run_layer1(frame, frame_number, full_res_frame)
         
         # Decrement snapshot cooldown
         if self.fight_snapshot_cooldown > 0:
             self.fight_snapshot_cooldown -= 1
             
         # 3. Layer 2: Check for Fight
-        fight_events = self.fight_detector.process(self.tracker_state.get_all_tracks(), frame_number, frame)
+        recent_people = dict(self.tracker_state.iter_active(['person'], max_age=4))
+        fight_events = self.fight_detector.process(recent_people, frame_number, frame, detections)
         
         # Map fight status to IDs for O(1) lookup during drawing
         # format: {id: {'status': 'WARNING'|'CONFIRMED', 'partner': id}}
@@ -61,14 +206,14 @@ class SecureVisionPipeline:
                     self._last_critical_reason = f"CRITICAL: FIGHT DETECTED! IDs: {id1}-{id2}"
                 
         # 3.1. Frame Recording Logic
+        if self.recording_frames_left > 0 and self.capture_dir is None:
+            self.recording_frames_left = 0
         if self.recording_frames_left > 0:
-            import os
             # Ensure directory exists (can be moved to init usually, but safe here)
-            capture_dir = os.path.join(os.path.dirname(__file__), '..', 'captures')
-            os.makedirs(capture_dir, exist_ok=True)
+            os.makedirs(self.capture_dir, exist_ok=True)
             
             # Save Frame
-            filename = os.path.join(capture_dir, f"critical_event_frame_{frame_number}.jpg")
+            filename = os.path.join(self.capture_dir, f"critical_event_frame_{frame_number}.jpg")
             try:
                 cv2.imwrite(filename, frame)
                 if capture_callback and hasattr(self, '_last_critical_reason'):
@@ -84,57 +229,61 @@ class SecureVisionPipeline:
         # 3.2. ReID Processing (Person Identification)
         all_tracks = self.tracker_state.get_all_tracks()
         
-        # Only process active tracks in current detections
-        for det in detections:
-            bbox = det['bbox']
-            tid = det['track_id']
-            cls = det['class']
+        # Only process active tracks in current detections (person rows only)
+        # Logic:
+        # 1. The scheduler picks tracks that are new, changed appearance or are due a refresh
+        # 2. Extract features (one batched pass for every person due this frame)
+        # 3. Find match
+        person_rows = np.flatnonzero(detections.class_id == CLASS_IDS['person'])
+        person_ids, person_boxes, history_lens = [], [], []
+        for tid, bbox in zip(detections.track_id[person_rows].tolist(), detections.xyxy[person_rows].tolist()):
+            # Track age/history len tells the scheduler whether it is stable enough to extract
+            track_info = all_tracks.get(tid)
+            if track_info:
+                person_ids.append(tid)
+                person_boxes.append(bbox)
+                history_lens.append(len(track_info['centroid']))
+
+        due = self.reid_scheduler.select(frame, person_ids, person_boxes, history_lens, frame_number) if person_ids else []
+        due_ids = [person_ids[i] for i in due]
+        due_boxes = [person_boxes[i] for i in due]
+
+        embeddings = self.reid_manager.extract_features_batch(frame, due_boxes) if due_ids else []
+        extracted = [(tid, embedding) for tid, embedding in zip(due_ids, embeddings) if embedding is not None]
+        for tid, embedding in extracted:
+            self.reid_scheduler.record(tid, embedding, frame_number)
+        # Try to match (all crops against the gallery as it stood before this frame)
+        matches = self.reid_manager.find_matches([embedding for _, embedding in extracted]) if extracted else []
+        for (tid, embedding), (matched_id, score) in zip(extracted, matches):
+            current_mapped_id = self.tracker_state.get_mapped_id(tid)
             
-            if cls == 'person':
-                current_mapped_id = self.tracker_state.get_mapped_id(tid)
-                
-                # Logic:
-                # 1. If this BoTSORT ID is new (not in our map) OR we want to verify it periodically
-                # 2. Extract features
-                # 3. Find match
-                
-                # Check track age/history len to decide if stable enough to extract
-                track_info = all_tracks.get(tid)
-                if track_info:
-                    history_len = len(track_info['centroid'])
-                    
-                    # Heuristic: Extract on first few frames (stable) and then periodically
-                    should_extract = (history_len == 5) or (history_len % 30 == 0)
-                    
-                    if should_extract:
-                        embedding = self.reid_manager.extract_features(frame, bbox)
-                        if embedding is not None:
-                            # Try to match
-                            matched_id, score = self.reid_manager.find_match(embedding)
-                            
-                            if matched_id is not None:
-                                # Found a match! Remap current BoTSORT ID (tid) -> Matched Persistent ID (matched_id)
-                                if current_mapped_id != matched_id:
-                                    logger.info(f"[ReID] Matched BoTSORT {tid} -> Person {matched_id} (Score: {score:.2f})")
-                                    self.tracker_state.set_mapping(tid, matched_id)
-                                    # Also update the feature bank for the matched ID
-                                    self.reid_manager.update_identity(matched_id, embedding, frame_number)
-                            else:
-                                # No match found. 
-                                # If this is a new track (no mapping yet), register as NEW Identity
-                                # Check if it's already mapped to something (means we registered it before).
-                                if tid not in self.tracker_state.id_map:
-                                    new_pid = self.reid_manager.register_new_identity(embedding, frame_number)
-                                    self.tracker_state.set_mapping(tid, new_pid)
-                                    logger.info(f"[ReID] New Identity Registered: Person {new_pid} (from BoTSORT {tid})")
-                                else:
-                                    # Already mapped (it represents an identity we created for this track)
-                                    # Just update features
-                                    pid = self.tracker_state.get_mapped_id(tid)
-                                    self.reid_manager.update_identity(pid, embedding, frame_number)
+            if matched_id is not None:
+                # Found a match! Remap current BoTSORT ID (tid) -> Matched Persistent ID (matched_id)
+                if current_mapped_id != matched_id:
+                    logger.info(f"[ReID] Matched BoTSORT {tid} -> Person {matched_id} (Score: {score:.2f})")
+                    self.tracker_state.set_mapping(tid, matched_id)
+                    # Also update the feature bank for the matched ID
+                    self.reid_manager.update_identity(matched_id, embedding, frame_number)
+            else:
+                # No match found. 
+                # If this is a new track (no mapping yet), register as NEW Identity
+                # Check if it's already mapped to something (means we registered it before).
+                if tid not in self.tracker_state.id_map:
+                    new_pid = self.reid_manager.register_new_identity(embedding, frame_number)
+                    self.tracker_state.set_mapping(tid, new_pid)
+                    logger.info(f"[ReID] New Identity Registered: Person {new_pid} (from BoTSORT {tid})")
+                else:
+                    # Already mapped (it represents an identity we created for this track)
+                    # Just update features
+                    pid = self.tracker_state.get_mapped_id(tid)
+                    self.reid_manager.update_identity(pid, embedding, frame_number)
 
         # 3.5. Luggage Association
         self.tracker_state.assign_owners()
+
+        # 3.6. Adapt detection stride to scene activity
+        if self.stride_controller is not None:
+            self.stride_controller.update(self._needs_full_detection_rate(frame_number))
         
         # State Collection for Dashboard
         luggage_dashboard_data = []
@@ -142,13 +291,11 @@ class SecureVisionPipeline:
         # Annotation
         from config import ABANDONED_DURATION_FRAMES, LUGGAGE_CLASSES, GHOST_FRAMES_WEAPON, GHOST_FRAMES_LUGGAGE, GHOST_FRAMES_PERSON
         
-        # Get all updated tracks to access metadata like owner_id
-        all_tracks = self.tracker_state.get_all_tracks()
-        
-        all_tracks = self.tracker_state.get_all_tracks()
-        
-        # Iterate over ALL tracks to handle persistence (Ghost Tracking)
-        for tid, track in all_tracks.items():
+        self.alert_persistence.expire(frame_number)
+
+        # Iterate over live tracks (active index) to handle persistence (Ghost Tracking).
+        # ACTIVE_TRACK_WINDOW covers every ghost window plus the 30-frame alert hold.
+        for tid, track in self.tracker_state.iter_active():
             # Decrement persistence timer for this track if it exists
             if tid in self.alert_persistence:
                 self.alert_persistence[tid]['frames'] -= 1
@@ -203,7 +350,7 @@ class SecureVisionPipeline:
             
             # Weapon Detection Alert
             if cls in WEAPON_CLASSES:
-                frames_seen = len(track['bbox'])
+                frames_seen = track['frames_detected'] # Predicted (stride) entries don't count
                 
                 # Debounce: Require at least 3 frames of tracking to confirm it's a real weapon and not a glitch
                 if frames_seen >= 3:
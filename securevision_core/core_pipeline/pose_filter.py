@@ -2,9 +2,43 @@
 import numpy as np
 import cv2
 try:
+    import torch
     from ultralytics import YOLO
+    from ultralytics.nn.autobackend import AutoBackend
+    from ultralytics.utils import ops
 except ImportError:
     YOLO = None
+from config import USE_CUDA, POSE_HISTORY_TTL_SECONDS, MAX_POSE_HISTORIES, POSE_IMGSZ, POSE_MAX_BATCH, POSE_KEYPOINT_CONF
+from utils.state_expiry import ExpiringDict
+from utils.pose_window import PoseWindow
+from core_pipeline.inference_backend import use_onnx, load_yolo_backend
+from core_pipeline.fused_layer1 import letterbox
+
+
+def roi_keypoints(kpts, ratio, pad, roi_shape, conf_threshold=POSE_KEYPOINT_CONF):
+    """
+    Maps one person's keypoints from the letterboxed model input back to ROI pixels.
+
+    Joints below `conf_threshold` are set to (0, 0), as Ultralytics `Keypoints.xy` does;
+    downstream checks (`p[0] > 0`, FightNet features) treat those as not visible.
+
+    Args:
+        kpts (np.ndarray): (17, 3) x, y, confidence in model-input pixels.
+        ratio (float): Resize ratio returned by `letterbox`.
+        pad (tuple): (pad_w, pad_h) returned by `letterbox`.
+        roi_shape (tuple): (h, w) of the ROI.
+
+    Returns:
+        np.ndarray: (17, 2) float32 keypoints in ROI pixels.
+    """
+    kpts = np.asarray(kpts, dtype=np.float32)
+    left, top = int(round(pad[0] - 0.1)), int(round(pad[1] - 0.1)) # Same rounding as letterbox's border
+    xy = (kpts[:, :2] - (left, top)) / ratio
+    np.clip(xy[:, 0], 0, roi_shape[1], out=xy[:, 0])
+    np.clip(xy[:, 1], 0, roi_shape[0], out=xy[:, 1])
+    xy[kpts[:, 2] < conf_threshold] = 0
+    return xy
+
 
 class PoseKeypointFilter:
     """
@@ -13,69 +47,124 @@ class PoseKeypointFilter:
     """
     def __init__(self, model_name='yolov8m-pose.pt'):
         self.model = None
+        self.backend = None # Raw batched forward: ONNX Runtime session, or AutoBackend (created on first use)
+        self.device = 0 if (YOLO and USE_CUDA and torch.cuda.is_available()) else 'cpu'
         if YOLO:
             # We assume the model will be downloaded automatically by Ultralytics
             # or exists in the cache. 'yolov8m-pose.pt' is the Medium version (better accuracy).
             try:
-                self.model = YOLO(model_name).to('cuda')
+                self.model = YOLO(model_name).to('cuda' if self.device == 0 else 'cpu')
             except Exception as e:
-                print(f"[Warning] Could not load Pose Model to CUDA: {e}. Trying fallback 'yolov8n-pose.pt'")
+                print(f"[Warning] Could not load Pose Model to {self.device}: {e}. Trying fallback 'yolov8n-pose.pt'")
                 try:
                     self.model = YOLO('yolov8n-pose.pt')
                 except:
                      print("[Error] Failed to load any Pose model.")
+
+            if self.model is not None and use_onnx():
+                try:
+                    self.backend = load_yolo_backend(self.model, 'pose', self.model.ckpt_path)
+                except Exception as e:
+                    print(f"[Warning] ONNX pose export failed ({e}). Using PyTorch.")
         
         # History of keypoints for velocity calculation
-        # Key: track_id, Value: list of (wrists_xy, timestamp)
-        self.keypoint_history = {} 
+        # Key: track_id, Value: PoseWindow of (left_wrist, right_wrist) xy, shape (HISTORY_SIZE, 2, 2)
+        # Wall-clock TTL: frame_number is optional for callers, so frames can't drive expiry
+        self.keypoint_history = ExpiringDict('keypoint_history', ttl=POSE_HISTORY_TTL_SECONDS,
+                                             max_size=MAX_POSE_HISTORIES, clock='seconds')
         self.HISTORY_SIZE = 10
 
-    def get_arm_velocity_score(self, frame, track_id, bbox):
+        # (track_id, frame_number) -> (score, kpts) for the current frame only
+        self._pose_cache = {}
+        self._cache_frame = None
+
+    def get_arm_velocity_score(self, frame, track_id, bbox, frame_number=None):
         """
         Runs pose estimation on the person within the bbox.
         Returns a score (0.0 to 1.0) representing arm activity/velocity.
+
+        Single-person form of `score_people`; with `frame_number` the result is cached
+        for the rest of that frame.
+        """
+        return self.score_people(frame, [(track_id, bbox)], frame_number)[track_id]
+
+    def score_people(self, frame, people, frame_number=None):
+        """
+        Arm activity scores for a set of people, with one batched pose inference.
+
+        Each person is pose-estimated (and their wrist history advanced) at most once per
+        frame: results are cached by (track_id, frame_number), so a person who appears in
+        several candidate pairs costs one ROI in the batch.
+
+        Args:
+            frame (np.array): Current frame (ROIs are cropped from it).
+            people (iterable): (track_id, bbox) tuples; repeated track IDs are fine.
+            frame_number (int, optional): Cache key; without it nothing is cached.
+
+        Returns:
+            dict: track_id -> (score, (17, 2) keypoints in ROI pixels)
         """
+        if frame_number != self._cache_frame:
+            self._pose_cache.clear()
+            self._cache_frame = frame_number
+
+        results = {}
+        pending = {}
+        for track_id, bbox in people:
+            if track_id in results or track_id in pending:
+                continue
+            cached = self._pose_cache.get((track_id, frame_number)) if frame_number is not None else None
+            if cached is not None:
+                results[track_id] = cached
+            else:
+                pending[track_id] = bbox
+        if not pending:
+            return results
+
         if not self.model:
-            return 0.0, np.zeros((17, 2))
+            for track_id in pending:
+                results[track_id] = (0.0, np.zeros((17, 2)))
+            return results
 
-        # 1. Crop ROI (with padding)
+        # 1. Crop ROIs (with padding)
         h, w = frame.shape[:2]
-        x1, y1, x2, y2 = map(int, bbox)
         pad = 20
-        x1, y1 = max(0, x1-pad), max(0, y1-pad)
-        x2, y2 = min(w, x2+pad), min(h, y2+pad)
-        
-        roi = frame[y1:y2, x1:x2]
-        if roi.size == 0:
-            return 0.0, np.zeros((17, 2))
-
-        # 2. Preprocess: Resize ROI to expected input size (e.g. 320px height) to help small object detection
-        input_h = 320
-        scale_factor = input_h / roi.shape[0]
-        input_w = int(roi.shape[1] * scale_factor)
-        input_roi = cv2.resize(roi, (input_w, input_h))
-
-        # 3. Run Inference on Resized ROI
-        results = self.model(input_roi, verbose=False, device=0, conf=0.01) 
-        
-        if not results or not results[0].keypoints or results[0].keypoints.shape[1] == 0:
-            return 0.0, np.zeros((17, 2))
+        crops = []
+        for track_id, bbox in pending.items():
+            x1, y1, x2, y2 = map(int, bbox)
+            x1, y1 = max(0, x1-pad), max(0, y1-pad)
+            x2, y2 = min(w, x2+pad), min(h, y2+pad)
+            roi = frame[y1:y2, x1:x2]
+            if roi.size == 0:
+                results[track_id] = (0.0, np.zeros((17, 2)))
+            else:
+                crops.append((track_id, roi))
 
-        # 4. Extract Keypoints and Scale Back
-        kpts = results[0].keypoints.xy.cpu().numpy()[0]
-        
-        # Scale keypoints back to original ROI size
-        kpts[:, 0] /= scale_factor
-        kpts[:, 1] /= scale_factor
-        
-        # Check confidence? (kpts has confidence?) kpts.conf
-        
+        # 2-3. One inference per POSE_MAX_BATCH ROIs instead of one per call
+        for start in range(0, len(crops), POSE_MAX_BATCH):
+            chunk = crops[start:start + POSE_MAX_BATCH]
+            for (track_id, roi), kpts in zip(chunk, self._infer_keypoints([roi for _, roi in chunk])):
+                if kpts is None:
+                    results[track_id] = (0.0, np.zeros((17, 2)))
+                else:
+                    results[track_id] = (self._update_score(track_id, kpts, roi.shape[0]), kpts)
+                    # Draw Debug Info on ROI (which is a view of Frame)
+                    self._draw_debug(roi, kpts, results[track_id][0])
+        self.keypoint_history.expire()
+
+        if frame_number is not None:
+            for track_id in pending:
+                self._pose_cache[(track_id, frame_number)] = results[track_id]
+        return results
+
+    def _update_score(self, track_id, kpts, roi_h):
+        """Combines wrist velocity against the track's history with wrist-torso contact, then records the pose."""
         left_wrist = kpts[9]
         right_wrist = kpts[10]
         
         # Estimate torso center
         valid_torso = [p for p in [kpts[5], kpts[6], kpts[11], kpts[12]] if p[0] > 0]
-        roi_h = max(y2 - y1, 1) # Ensure roi_h is always defined
+        roi_h = max(roi_h, 1) # Ensure roi_h is always defined
         
         if len(valid_torso) > 0 and (left_wrist[0] > 0 or right_wrist[0] > 0):
             torso = np.mean(valid_torso, axis=0)
@@ -90,45 +179,72 @@ class PoseKeypointFilter:
             contact_score = 0.0
         
         # Current Positions
-        current_pose = (left_wrist, right_wrist)
+        current_pose = np.stack([left_wrist, right_wrist])
         
         # 4. Calculate Velocity against history
         velocity_score = 0.0
         
-        if track_id in self.keypoint_history:
-            prev_pose_list = self.keypoint_history[track_id]
-            
+        history = self.keypoint_history.get(track_id)
+        if history is not None:
             # Compare with average of last few frames to get robust movement
             # For simplicity, compare with immediate previous
-            if prev_pose_list:
-                prev_lw, prev_rw = prev_pose_list[-1]
+            if len(history):
+                prev_lw, prev_rw = history[-1]
                 
                 # Euclidean distance moved
                 d_left = np.linalg.norm(left_wrist - prev_lw)
                 d_right = np.linalg.norm(right_wrist - prev_rw)
                 
                 # Normalize by ROI height
-                norm_factor = roi_h if roi_h > 0 else 1.0
-                
-                speed_l = d_left / norm_factor
-                speed_r = d_right / norm_factor
+                speed_l = d_left / roi_h
+                speed_r = d_right / roi_h
                 
                 # Total speed score
                 velocity_score = (speed_l + speed_r) * 100 # Scale up
                 
         final_score = velocity_score + (contact_score * 50)
                 
-        # Update History
-        if track_id not in self.keypoint_history:
-            self.keypoint_history[track_id] = []
-        self.keypoint_history[track_id].append(current_pose)
-        if len(self.keypoint_history[track_id]) > self.HISTORY_SIZE:
-             self.keypoint_history[track_id].pop(0)
-
-        # Draw Debug Info on ROI (which is a view of Frame)
-        self._draw_debug(roi, kpts, final_score)
-             
-        return final_score, kpts
+        # Update History (re-assigning refreshes the entry's TTL)
+        if history is None:
+            history = PoseWindow(self.HISTORY_SIZE, shape=(2, 2))
+        history.append(current_pose)
+        self.keypoint_history[track_id] = history
+        return final_score
+
+    def _raw_backend(self):
+        """Raw forward pass over a BCHW tensor (ONNX session, or the PyTorch model without its predictor)."""
+        if self.backend is None:
+            self.backend = AutoBackend(weights=self.model.model, device=torch.device('cuda:0' if self.device == 0 else 'cpu'),
+                                       fp16=self.device == 0, fuse=True, verbose=False)
+            self.backend.eval()
+        return self.backend
+
+    def _infer_keypoints(self, rois):
+        """
+        Batched pose inference. Every ROI is letterboxed to the same POSE_IMGSZ square so
+        they stack into one tensor.
+
+        Returns:
+            list: Per ROI, the top person's (17, 2) keypoints in ROI pixels, or None.
+        """
+        backend = self._raw_backend()
+        boxed = [letterbox(roi, new_shape=POSE_IMGSZ, auto=False) for roi in rois]
+        # BGR -> RGB swap mirrors what the Ultralytics predictor does with numpy input
+        batch = np.ascontiguousarray(np.stack([padded for padded, _, _ in boxed])[..., ::-1].transpose(0, 3, 1, 2))
+        tensor = torch.from_numpy(batch).to(backend.device)
+        tensor = tensor.half() if getattr(backend, 'fp16', False) else tensor.float()
+        tensor /= 255.0
+        with torch.no_grad():
+            dets = ops.non_max_suppression(backend(tensor), 0.01, 0.7, nc=1)
+
+        keypoints = []
+        for det, roi, (_, ratio, pad) in zip(dets, rois, boxed):
+            if len(det) == 0:
+                keypoints.append(None)
+                continue
+            kpts = det[0, 6:].view(-1, 3).float().cpu().numpy()
+            keypoints.append(roi_keypoints(kpts, ratio, pad, roi.shape[:2]))
+        return keypoints
 
     def _draw_debug(self, roi, kpts, velocity_score):
         """Draws full skeleton on the ROI."""
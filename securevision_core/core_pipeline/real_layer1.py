@@ -2,17 +2,27 @@ import cv2
 import numpy as np
 import os
 try:
+    import torch
     from ultralytics import YOLO
 except ImportError:
     YOLO = None
     print("Warning: ultralytics not installed. Real object detection will not work.")
 from config import WEAPON_CLASSES
+from core_pipeline.detections import Detections, build_class_lookup
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
 # Storage for both models
 _models = {'base': None, 'weapons': None}
+# Per-model (vocab_ids, thresholds) arrays indexed by raw class id
+_class_lookups = {}
+
+def get_model_path(key):
+    """Absolute path of the 'base' or 'weapons' YOLO weights."""
+    from config import MODEL_BASE, MODEL_WEAPONS
+    filename = MODEL_BASE if key == 'base' else MODEL_WEAPONS
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', filename)
 
 def get_models():
     """Lazy load both models into VRAM to ensure we don't blow up init times."""
@@ -21,10 +31,8 @@ def get_models():
         logger.error("Ultralytics not installed. Cannot load models.")
         return None
 
-    from config import MODEL_BASE, MODEL_WEAPONS
-
     if _models['base'] is None:
-        path_base = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', MODEL_BASE)
+        path_base = get_model_path('base')
         if not os.path.exists(path_base):
             raise FileNotFoundError(f"YOLO Base model not found at {path_base}")
         logger.info(f"Loading Base model from {path_base}...")
@@ -32,7 +40,7 @@ def get_models():
         _models['base'] = YOLO(path_base)
 
     if _models['weapons'] is None:
-        path_weapons = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', MODEL_WEAPONS)
+        path_weapons = get_model_path('weapons')
         if not os.path.exists(path_weapons):
              raise FileNotFoundError(f"YOLO Weapon model not found at {path_weapons}")
         logger.info(f"Loading Weapon model from {path_weapons}...")
@@ -40,6 +48,30 @@ def get_models():
 
     return _models
 
+def _class_lookup(key, model_instance, valid_classes):
+    if key not in _class_lookups:
+        _class_lookups[key] = build_class_lookup(model_instance.names, valid_classes)
+    return _class_lookups[key]
+
+def _results_to_detections(results, class_lookup):
+    """
+    Converts one Ultralytics result into a columnar Detections batch with a single
+    device-to-host transfer. Class gating and per-class thresholds are one mask.
+    """
+    if not results or results[0].boxes is None or len(results[0].boxes) == 0:
+        return Detections.empty()
+
+    data = results[0].boxes.data.float().cpu().numpy()
+    # Tracked results carry an ID column: [x1, y1, x2, y2, id, conf, cls]
+    if data.shape[1] == 7:
+        track_ids, conf, cls_ids = data[:, 4], data[:, 5], data[:, 6].astype(np.int64)
+    else:
+        track_ids, conf, cls_ids = np.full(len(data), -1), data[:, 4], data[:, 5].astype(np.int64)
+
+    vocab_ids, thresholds = class_lookup
+    keep = conf >= thresholds[cls_ids]
+    return Detections(np.trunc(data[keep, :4]), vocab_ids[cls_ids[keep]], conf[keep], track_ids[keep])
+
 def get_yolo_detections(frame, frame_number):
     """
     Real Layer 1 output using YOLOv8+.
@@ -53,68 +85,27 @@ def get_yolo_detections(frame, frame_number):
         frame_number (int): Current frame number.
         
     Returns:
-        list: List of dicts representing active tracks.
+        Detections: Columnar batch of active tracks (iterates as the legacy dicts).
     """
     models = get_models()
-    detections = []
     
     if models is None:
-        return detections
+        return Detections.empty()
     
-    from config import WEAPON_CLASSES, BASE_CLASSES, TRACKER_TYPE, USE_CUDA, CONFIDENCE_THRESHOLDS, MIN_CONFIDENCE
+    from config import WEAPON_CLASSES, BASE_CLASSES, TRACKER_TYPE, USE_CUDA, MIN_CONFIDENCE
     
-    device = 0 if USE_CUDA else 'cpu'
+    device = 0 if USE_CUDA and torch.cuda.is_available() else 'cpu'
 
     # --- SEQUENTIAL BRUTE FORCE LOGIC ---
     # Run both models on every single frame to maximize accuracy
     # 1. Base Model (People, Luggage, Knives)
-    results_base = models['base'].track(frame, persist=True, tracker=TRACKER_TYPE, device=device, verbose=False, conf=MIN_CONFIDENCE, half=USE_CUDA)
+    results_base = models['base'].track(frame, persist=True, tracker=TRACKER_TYPE, device=device, verbose=False, conf=MIN_CONFIDENCE, half=device != 'cpu')
     
     # 2. Weapon Model (Guns, Rifles)
-    results_weapons = models['weapons'].track(frame, persist=True, tracker=TRACKER_TYPE, device=device, verbose=False, conf=MIN_CONFIDENCE, half=USE_CUDA)
+    results_weapons = models['weapons'].track(frame, persist=True, tracker=TRACKER_TYPE, device=device, verbose=False, conf=MIN_CONFIDENCE, half=device != 'cpu')
     
-    # Helper function to process results
-    def process_results(results, model_instance, valid_classes):
-        if not results:
-            return
-            
-        r = results[0]
-        if r.boxes:
-            for box in r.boxes:
-                coords = box.xyxy[0].cpu().numpy() # [x1, y1, x2, y2]
-                x1, y1, x2, y2 = map(int, coords)
-                
-                cls_id = int(box.cls[0].item())
-                cls_name = model_instance.names[cls_id]
-                
-                # Model-Specific Class Gating
-                if cls_name not in valid_classes:
-                    continue
-                    
-                conf = float(box.conf[0].item())
-                
-                # Apply per-class confidence threshold filtering
-                req_conf = CONFIDENCE_THRESHOLDS.get(cls_name, 0.4)
-                if conf < req_conf:
-                    continue
-                
-                # Track ID might be None if just detected and not tracked yet? 
-                track_id = int(box.id[0].item()) if box.id is not None else -1
-                
-                centroid_x = (x1 + x2) / 2
-                centroid_y = (y1 + y2) / 2
-                
-                detection = {
-                    'track_id': track_id,
-                    'class': cls_name,
-                    'bbox': [x1, y1, x2, y2],
-                    'centroid': [centroid_x, centroid_y],
-                    'confidence': conf
-                }
-                detections.append(detection)
-
     # Process both arrays
-    process_results(results_base, models['base'], BASE_CLASSES)
-    process_results(results_weapons, models['weapons'], WEAPON_CLASSES)
-    
-    return detections
+    return Detections.concatenate([
+        _results_to_detections(results_base, _class_lookup('base', models['base'], BASE_CLASSES)),
+        _results_to_detections(results_weapons, _class_lookup('weapons', models['weapons'], WEAPON_CLASSES)),
+    ])
@@ -0,0 +1,80 @@
+import numpy as np
+
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+
+class EmbeddingProjection:
+    """
+    Linear projection of backbone embeddings to a compact space, fitted offline by
+    `fit_reid_projection.py` on person crops.
+
+    The components are the top right-singular vectors of the (uncentred) embedding
+    matrix, the rank-k map that best preserves inner products between embeddings, so
+    cosine similarities of projected, re-normalized vectors stay on the same scale as
+    the full-width ones and `ReIDManager.similarity_threshold` keeps its meaning.
+
+    Args:
+        components (np.ndarray): (D, k) projection matrix.
+    """
+    def __init__(self, components):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+
+    @property
+    def input_dim(self):
+        return self.components.shape[0]
+
+    @property
+    def output_dim(self):
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, embeddings, dim):
+        """
+        Fits to (N, D) L2-normalized embeddings.
+
+        Returns:
+            tuple: (EmbeddingProjection with min(dim, N, D) components,
+                    fraction of the embeddings' energy the components retain).
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        _, singular, vt = np.linalg.svd(embeddings, full_matrices=False)
+        k = min(dim, len(singular))
+        energy = singular ** 2
+        return cls(vt[:k].T), float(energy[:k].sum() / energy.sum())
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path)['components'])
+
+    def save(self, path):
+        np.savez(path, components=self.components)
+
+    def __call__(self, embeddings):
+        """(N, D) -> (N, k) L2-normalized float32."""
+        projected = np.asarray(embeddings, dtype=np.float32) @ self.components
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.where(norms > 0, norms, 1.0)
+
+
+def encode(vectors, storage):
+    """
+    Compacts (N, D) float32 vectors for storage.
+
+    Args:
+        storage (str): 'float32' (as is), 'float16', or 'int8' (symmetric, one scale per vector).
+
+    Returns:
+        tuple: (codes (N, D) of the storage dtype, scales (N,) float32; ones unless int8).
+    """
+    vectors = np.atleast_2d(vectors)
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if storage == 'int8':
+        peak = np.abs(vectors).max(axis=1)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales
+    return vectors.astype(storage), scales
+
+
+def decode(codes, scales):
+    """Inverse of `encode` (float32)."""
+    return codes.astype(np.float32) * scales[:, None]
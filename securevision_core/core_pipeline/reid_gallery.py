@@ -0,0 +1,195 @@
+import numpy as np
+from config import REID_EMBEDDINGS_PER_IDENTITY, REID_GALLERY_INITIAL_IDENTITIES, REID_STORAGE_DTYPE
+from core_pipeline.reid_compaction import STORAGE_DTYPES, encode, decode
+
+# Rows decoded to float32 at a time when the gallery is stored compact
+_DECODE_CHUNK = 65536
+
+
+class ReIDGallery:
+    """
+    Every stored ReID embedding in one contiguous, L2-normalized matrix, stored as
+    float32, float16 or int8 with a per-row scale (see `reid_compaction.encode`).
+
+    Each identity owns a fixed block of `per_identity` rows (its slot range
+    `[block * per_identity, (block + 1) * per_identity)`), used as a ring so the newest
+    embeddings replace the oldest like the old per-identity `deque(maxlen=5)`. Freed
+    blocks are reused and the matrix doubles when full, so inserts never shift rows.
+
+    Matching a batch of queries is one (Q, D) x (D, rows) product; reshaping the result
+    to (Q, blocks, per_identity) and taking the max over the last axis gives each
+    identity's best score (the segmented max), with empty slots masked to -inf.
+    Compact storage is decoded to float32 in bounded chunks for the product.
+
+    With an `index` (e.g. `IVFIndex`) every embedding is also inserted into it, keyed by
+    matrix row, and queries are answered by the index instead of the full product: the
+    best row's owner is the best identity, so a top-1 search is the same segmented max.
+
+    Args:
+        dim (int): Embedding size (inferred from the first insert when None).
+        per_identity (int): Embeddings kept per identity.
+        initial_identities (int): Blocks allocated up front.
+        storage (str): 'float32' | 'float16' | 'int8'.
+        index: Optional approximate search structure with add(label, vector),
+               remove(label) and search(queries) -> (labels, scores).
+    """
+    def __init__(self, dim=None, per_identity=REID_EMBEDDINGS_PER_IDENTITY,
+                 initial_identities=REID_GALLERY_INITIAL_IDENTITIES, storage=REID_STORAGE_DTYPE, index=None):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown storage '{storage}' (expected one of {STORAGE_DTYPES})")
+        self.per_identity = per_identity
+        self.storage = storage
+        self.index = index
+        self.dim = dim
+        self._blocks = max(1, initial_identities)
+        self._matrix = None if dim is None else np.zeros((self._blocks * per_identity, dim), dtype=storage)
+        self._scales = np.ones(self._blocks * per_identity, dtype=np.float32)  # Per-row int8 scale
+        self._owner = np.full(self._blocks, -1, dtype=np.int64)  # Identity per block (-1 = free)
+        self._count = np.zeros(self._blocks, dtype=np.int64)     # Filled slots per block
+        self._next = np.zeros(self._blocks, dtype=np.int64)      # Ring position per block
+        self._block_of = {}                                      # identity -> block
+        self._free = []
+        self._high_water = 0  # Blocks [0, high_water) have been used at least once
+
+    def __len__(self):
+        return len(self._block_of)
+
+    def __contains__(self, identity):
+        return identity in self._block_of
+
+    def slot_range(self, identity):
+        """(start, stop) rows of `identity`'s block in the matrix."""
+        start = self._block_of[identity] * self.per_identity
+        return start, start + self.per_identity
+
+    @property
+    def nbytes(self):
+        """Bytes held by the embedding matrix and its scales (excluding any index)."""
+        return 0 if self._matrix is None else self._matrix.nbytes + self._scales.nbytes
+
+    def embeddings(self, identity):
+        """Stored embeddings of `identity`, oldest first, decoded to an (N, D) float32 array."""
+        block = self._block_of[identity]
+        start = block * self.per_identity
+        count, head = self._count[block], self._next[block]
+        rows = start + (head - count + np.arange(count)) % self.per_identity
+        return decode(self._matrix[rows], self._scales[rows])
+
+    def add(self, identity, embedding):
+        """
+        Appends an embedding to `identity`, creating its block on first use.
+
+        Args:
+            identity (int): Persistent person ID.
+            embedding (np.ndarray | torch.Tensor): (D,) or (1, D) vector.
+        """
+        vector = _as_rows(embedding)[0]
+        if self._matrix is None:
+            self.dim = len(vector)
+            self._matrix = np.zeros((self._blocks * self.per_identity, self.dim), dtype=self.storage)
+
+        block = self._block_of.get(identity)
+        if block is None:
+            block = self._allocate()
+            self._block_of[identity] = block
+            self._owner[block] = identity
+
+        norm = np.linalg.norm(vector)
+        row = int(block * self.per_identity + self._next[block])
+        codes, scales = encode(vector / norm if norm > 0 else vector, self.storage)
+        self._matrix[row], self._scales[row] = codes[0], scales[0]
+        if self.index is not None:
+            # Replaces the overwritten ring slot, if any
+            self.index.add(row, decode(codes, scales)[0])
+        self._next[block] = (self._next[block] + 1) % self.per_identity
+        self._count[block] = min(self._count[block] + 1, self.per_identity)
+
+    def remove(self, identity):
+        """Frees `identity`'s block (no-op if unknown)."""
+        block = self._block_of.pop(identity, None)
+        if block is None:
+            return
+        if self.index is not None:
+            start = block * self.per_identity
+            for row in range(start, start + int(self._count[block])):
+                self.index.remove(row)
+        self._owner[block] = -1
+        self._count[block] = 0
+        self._next[block] = 0
+        self._free.append(block)
+
+    def best_matches(self, queries):
+        """
+        Best-scoring identity for each query embedding.
+
+        Args:
+            queries (np.ndarray | torch.Tensor | list): (Q, D) batch, or a list of (1, D) tensors.
+
+        Returns:
+            tuple: (identities (Q,) int64 array with -1 where nothing was found,
+                    scores (Q,) float32 cosine similarities, -1.0 where nothing was found).
+        """
+        queries = _as_rows(queries)
+        q = len(queries)
+        if not self._block_of or q == 0:
+            return np.full(q, -1, dtype=np.int64), np.full(q, -1.0, dtype=np.float32)
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+
+        if self.index is not None:
+            rows, scores = self.index.search(queries)
+            found = rows >= 0
+            identities = np.where(found, self._owner[rows // self.per_identity], -1)
+            return identities, np.where(found, scores, -1.0).astype(np.float32)
+
+        blocks = self._high_water
+        rows = blocks * self.per_identity
+        if self.storage == 'float32':
+            sims = queries @ self._matrix[:rows].T
+        else:
+            sims = np.empty((q, rows), dtype=np.float32)
+            for start in range(0, rows, _DECODE_CHUNK):
+                stop = min(start + _DECODE_CHUNK, rows)
+                sims[:, start:stop] = queries @ decode(self._matrix[start:stop], self._scales[start:stop]).T
+        sims = sims.reshape(q, blocks, self.per_identity)
+        empty = np.arange(self.per_identity) >= self._count[:blocks, None]  # (blocks, per_identity)
+        sims[:, empty] = -np.inf
+        best_per_block = sims[:, :, 0].copy()                                # (Q, blocks)
+        for slot in range(1, self.per_identity): # Much faster than .max(axis=2) over a tiny axis
+            np.maximum(best_per_block, sims[:, :, slot], out=best_per_block)
+        sims = best_per_block
+
+        best = sims.argmax(axis=1)
+        scores = sims[np.arange(q), best].astype(np.float32)
+        return self._owner[best], scores
+
+    def _allocate(self):
+        if self._free:
+            return self._free.pop()
+        if self._high_water == self._blocks:
+            self._grow()
+        block = self._high_water
+        self._high_water += 1
+        return block
+
+    def _grow(self):
+        blocks = self._blocks * 2
+        matrix = np.zeros((blocks * self.per_identity, self.dim), dtype=self.storage)
+        matrix[:len(self._matrix)] = self._matrix
+        self._matrix = matrix
+        self._scales = np.concatenate([self._scales, np.ones(len(self._scales), dtype=np.float32)])
+        self._owner = np.concatenate([self._owner, np.full(self._blocks, -1, dtype=np.int64)])
+        self._count = np.concatenate([self._count, np.zeros(self._blocks, dtype=np.int64)])
+        self._next = np.concatenate([self._next, np.zeros(self._blocks, dtype=np.int64)])
+        self._blocks = blocks
+
+
+def _as_rows(embeddings):
+    """(N, D) float32 array from a tensor, array or list of (1, D) / (D,) embeddings."""
+    if isinstance(embeddings, (list, tuple)):
+        embeddings = [_as_rows(e) for e in embeddings]
+        return np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    if hasattr(embeddings, 'detach'):
+        embeddings = embeddings.detach().cpu().numpy()
+    return np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
@@ -0,0 +1,178 @@
+import numpy as np
+from config import REID_ANN_NPROBE, REID_ANN_MIN_TRAIN
+
+
+class _InvertedList:
+    """Contiguous vectors + labels of one IVF cell, grown by doubling, compacted by swap-remove."""
+    __slots__ = ('vectors', 'labels', 'size')
+
+    def __init__(self, dim, capacity=16):
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.labels = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, label, vector):
+        if self.size == len(self.labels):
+            self.vectors = np.concatenate([self.vectors, np.empty_like(self.vectors)])
+            self.labels = np.concatenate([self.labels, np.empty_like(self.labels)])
+        self.vectors[self.size] = vector
+        self.labels[self.size] = label
+        self.size += 1
+        return self.size - 1
+
+    def pop(self, position):
+        """Removes `position` by moving the last entry into it; returns the moved label (or None)."""
+        last = self.size - 1
+        moved = None
+        if position != last:
+            self.vectors[position] = self.vectors[last]
+            self.labels[position] = self.labels[last]
+            moved = int(self.labels[position])
+        self.size = last
+        return moved
+
+
+class IVFIndex:
+    """
+    Inverted-file index for approximate max-inner-product search over L2-normalized
+    embeddings (inner product = cosine similarity).
+
+    Vectors are assigned to the nearest of `nlist` k-means centroids; a query scores the
+    centroids and scans only the `nprobe` closest cells. Raising `nprobe` trades latency
+    for recall (`nprobe >= nlist` is an exact search). Until `min_train` vectors exist
+    everything lives in a single cell, i.e. exact search; the index trains itself then
+    and retrains (rebuilding all cells) each time it grows 4x, so centroids follow the
+    gallery through a shift.
+
+    Labels are caller-chosen ints (ReIDGallery uses matrix rows); adding an existing
+    label replaces its vector.
+
+    Args:
+        dim (int): Embedding size (inferred from the first insert when None).
+        nprobe (int): Cells scanned per query.
+        min_train (int): Vectors needed before the first k-means.
+        seed (int): k-means initialisation seed.
+    """
+    def __init__(self, dim=None, nprobe=REID_ANN_NPROBE, min_train=REID_ANN_MIN_TRAIN, seed=0):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self._rng = np.random.default_rng(seed)
+        self.centroids = None  # (nlist, dim) once trained
+        self._lists = [] if dim is None else [_InvertedList(dim)]
+        self._where = {}       # label -> (cell, position)
+        self._next_train = min_train
+
+    def __len__(self):
+        return len(self._where)
+
+    @property
+    def nlist(self):
+        return len(self._lists)
+
+    def add(self, label, vector):
+        """Inserts (or replaces) one normalized (dim,) vector."""
+        if self.dim is None:
+            self.dim = len(vector)
+            self._lists = [_InvertedList(self.dim)]
+        if label in self._where:
+            self.remove(label)
+        cell = 0 if self.centroids is None else int(np.argmax(self.centroids @ vector))
+        self._where[label] = (cell, self._lists[cell].append(label, vector))
+        if len(self._where) >= self._next_train:
+            self.train()
+
+    def remove(self, label):
+        """Deletes a label (no-op if unknown)."""
+        location = self._where.pop(label, None)
+        if location is None:
+            return
+        cell, position = location
+        moved = self._lists[cell].pop(position)
+        if moved is not None:
+            self._where[moved] = (cell, position)
+
+    def search(self, queries):
+        """
+        Best match per query among the probed cells.
+
+        Args:
+            queries (np.ndarray): (Q, dim) normalized float32 queries.
+
+        Returns:
+            tuple: (labels (Q,) int64, -1 where nothing was scanned; scores (Q,) float32, -inf there).
+        """
+        q = len(queries)
+        best_labels = np.full(q, -1, dtype=np.int64)
+        best_scores = np.full(q, -np.inf, dtype=np.float32)
+        if q == 0 or not self._where:
+            return best_labels, best_scores
+
+        if self.centroids is None or self.nprobe >= self.nlist:
+            probes = np.broadcast_to(np.arange(self.nlist), (q, self.nlist))
+        else:
+            coarse = queries @ self.centroids.T
+            probes = np.argpartition(-coarse, self.nprobe - 1, axis=1)[:, :self.nprobe]
+
+        # Scan cell by cell for every query that probes it, so each cell is one matmul
+        query_ids, cells = np.nonzero(_one_hot(probes, self.nlist))
+        order = np.argsort(cells, kind='stable')
+        query_ids, cells = query_ids[order], cells[order]
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        for members, cell in zip(np.split(query_ids, bounds), cells[np.r_[0, bounds]]):
+            inverted = self._lists[cell]
+            if inverted.size == 0:
+                continue
+            sims = queries[members] @ inverted.vectors[:inverted.size].T
+            top = sims.argmax(axis=1)
+            scores = sims[np.arange(len(members)), top]
+            better = scores > best_scores[members]
+            best_scores[members[better]] = scores[better]
+            best_labels[members[better]] = inverted.labels[top[better]]
+        return best_labels, best_scores
+
+    def train(self, iterations=10):
+        """(Re)clusters every stored vector into ~sqrt(N) cells and rebuilds the lists."""
+        labels = np.concatenate([inverted.labels[:inverted.size] for inverted in self._lists])
+        vectors = np.concatenate([inverted.vectors[:inverted.size] for inverted in self._lists])
+        n = len(labels)
+        nlist = max(1, min(n // 39, int(np.sqrt(n)))) # >= 39 training points per centroid
+        self._next_train = max(self.min_train, 4 * n)
+        if nlist == 1:
+            return
+
+        # Spherical k-means on a sample (max 64 points per centroid)
+        sample = vectors[self._rng.choice(n, min(n, 64 * nlist), replace=False)]
+        centroids = sample[self._rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            centroids[~empty] = sums[~empty] / norms[~empty]
+
+        assign = np.concatenate([np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+                                 for start in range(0, n, 65536)]) # Bounded (chunk, nlist) score matrix
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        positions = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        self.centroids = centroids
+        self._lists = []
+        start = 0
+        for count in counts.tolist():
+            inverted = _InvertedList(self.dim, capacity=max(16, count))
+            inverted.vectors[:count] = vectors[order[start:start + count]]
+            inverted.labels[:count] = labels[order[start:start + count]]
+            inverted.size = count
+            self._lists.append(inverted)
+            start += count
+        self._where = dict(zip(labels[order].tolist(), zip(assign[order].tolist(), positions.tolist())))
+
+
+def _one_hot(indices, width):
+    """(Q, width) bool mask with True at each row's `indices`."""
+    mask = np.zeros((len(indices), width), dtype=bool)
+    np.put_along_axis(mask, np.asarray(indices), True, axis=1)
+    return mask
@@ -1,12 +1,18 @@
+import cv2
 import torch
 import torch.nn as nn
-from torchvision import models, transforms
-from collections import deque
+from torchvision import models
 import numpy as np
-from config import USE_CUDA
+from config import (USE_CUDA, REID_IDENTITY_TTL_FRAMES, MAX_REID_IDENTITIES, REID_INPUT_SIZE, REID_MAX_BATCH, REID_ANN_INDEX,
+                    REID_USE_PROJECTION, REID_PROJECTION_PATH)
+from core_pipeline.inference_backend import use_onnx, load_module_backend
+from core_pipeline.reid_compaction import EmbeddingProjection
+from core_pipeline.reid_gallery import ReIDGallery
+from core_pipeline.reid_index import IVFIndex
+from utils.state_expiry import ExpiringDict
 
 class ReIDManager:
-    def __init__(self, use_cuda=USE_CUDA):
+    def __init__(self, use_cuda=USE_CUDA, use_projection=REID_USE_PROJECTION):
         self.device = torch.device('cuda' if use_cuda and torch.cuda.is_available() else 'cpu')
         print(f"[ReID] Initializing MobileNetV3 on {self.device}...")
         
@@ -19,84 +25,136 @@ class ReIDManager:
         # Structure: features -> avgpool -> classifier
         self.model.classifier = nn.Identity()
         self.model.to(self.device).eval()
+
+        if use_onnx():
+            # Same call signature (tensor in, tensor out), executed by ONNX Runtime on CPU
+            self.device = torch.device('cpu')
+            self.model = load_module_backend(self.model, 'reid', torch.zeros(1, 3, REID_INPUT_SIZE, REID_INPUT_SIZE), {0: 'batch'})
+
+        # Optional compact embedding space (fit_reid_projection.py); full-width embeddings otherwise
+        self.projection = None
+        if use_projection:
+            try:
+                self.projection = EmbeddingProjection.load(REID_PROJECTION_PATH)
+                print(f"[ReID] Projecting embeddings {self.projection.input_dim} -> {self.projection.output_dim} dims.")
+            except Exception as e:
+                print(f"[ReID] Could not load projection {REID_PROJECTION_PATH} ({e}); using full-width embeddings.")
         
         # Store known identities
-        # Format: { persistent_id: { 'embeddings': deque(maxlen=5), 'last_seen': frame_num } }
-        self.known_identities = {}
+        # Format: { persistent_id: { 'last_seen': frame_num } }; their last embeddings live in
+        # self.gallery (one contiguous matrix, REID_STORAGE_DTYPE). Identities not seen for REID_IDENTITY_TTL_FRAMES
+        # are forgotten and the table is LRU-capped; evictions free the gallery rows too.
+        # With REID_ANN_INDEX the gallery is searched through an IVF index instead of a full scan.
+        self.gallery = ReIDGallery(index=IVFIndex() if REID_ANN_INDEX else None)
+        self.known_identities = ExpiringDict('known_identities', ttl=REID_IDENTITY_TTL_FRAMES,
+                                             max_size=MAX_REID_IDENTITIES,
+                                             on_evict=lambda pid, _: self.gallery.remove(pid))
         self.next_id = 1
         
-        # Preprocessing
-        self.transform = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-        ])
+        # Preprocessing (ImageNet normalization): x = pixel * scale - offset, per RGB channel,
+        # written straight into one reusable NCHW input buffer
+        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+        self._scale = (1.0 / (255.0 * std))[:, None, None]
+        self._offset = (mean / std)[:, None, None]
+        self._resized = np.empty((REID_MAX_BATCH, REID_INPUT_SIZE, REID_INPUT_SIZE, 3), dtype=np.uint8)
+        self._input = np.empty((REID_MAX_BATCH, 3, REID_INPUT_SIZE, REID_INPUT_SIZE), dtype=np.float32)
         
         self.similarity_threshold = 0.5 # Cosine similarity threshold (0-1). Tune this.
 
     def extract_features(self, frame, bbox):
         """
-        Extracts 1280-dim feature vector from the person crop.
+        Extracts the embedding of one person crop (see `extract_features_batch`).
         bbox: [x1, y1, x2, y2]
         """
-        x1, y1, x2, y2 = map(int, bbox)
-        
-        # Clip bbox to frame dimensions
-        h, w, _ = frame.shape
-        x1 = max(0, x1)
-        y1 = max(0, y1)
-        x2 = min(w, x2)
-        y2 = min(h, y2)
-        
-        if x2 - x1 < 10 or y2 - y1 < 10:
-            return None # Too small
+        return self.extract_features_batch(frame, [bbox])[0]
+
+    def extract_features_batch(self, frame, bboxes):
+        """
+        Extracts L2-normalized embeddings for several person crops with one forward pass
+        per REID_MAX_BATCH crops. Crops are resized with cv2 and normalized in place into
+        a preallocated input buffer (no PIL / per-crop tensors). With a projection loaded
+        the embeddings are the compact, re-normalized vectors.
+
+        Args:
+            frame (np.array): RGB frame.
+            bboxes (list): [x1, y1, x2, y2] per person.
+
+        Returns:
+            list: (1, D) CPU tensor per bbox, or None where the crop is too small.
+        """
+        h, w = frame.shape[:2]
+        crops = []
+        for index, bbox in enumerate(bboxes):
+            x1, y1, x2, y2 = map(int, bbox)
             
-        crop = frame[y1:y2, x1:x2]
-        
-        try:
-            tensor = self.transform(crop).unsqueeze(0).to(self.device)
-            with torch.no_grad():
-                embedding = self.model(tensor)
-                # Normalize embedding
-                embedding = torch.nn.functional.normalize(embedding, p=2, dim=1)
-                return embedding.cpu() # Keep on CPU for storage
-        except Exception as e:
-            print(f"[ReID] Extraction Failed: {e}")
-            return None
+            # Clip bbox to frame dimensions
+            x1 = max(0, x1)
+            y1 = max(0, y1)
+            x2 = min(w, x2)
+            y2 = min(h, y2)
+            
+            if x2 - x1 < 10 or y2 - y1 < 10:
+                continue # Too small
+            crops.append((index, frame[y1:y2, x1:x2]))
+
+        embeddings = [None] * len(bboxes)
+        for start in range(0, len(crops), REID_MAX_BATCH):
+            chunk = crops[start:start + REID_MAX_BATCH]
+            try:
+                batch = self._preprocess([crop for _, crop in chunk])
+                with torch.no_grad():
+                    out = self.model(batch.to(self.device))
+                    # Normalize embedding
+                    out = torch.nn.functional.normalize(out, p=2, dim=1).cpu() # Keep on CPU for storage
+                if self.projection is not None:
+                    out = torch.from_numpy(self.projection(out.numpy()))
+            except Exception as e:
+                print(f"[ReID] Extraction Failed: {e}")
+                continue
+            for row, (index, _) in enumerate(chunk):
+                embeddings[index] = out[row:row + 1]
+        return embeddings
+
+    def _preprocess(self, crops):
+        """Resizes and normalizes crops into the shared (N, 3, S, S) buffer and returns it as a tensor view."""
+        n = len(crops)
+        size = (REID_INPUT_SIZE, REID_INPUT_SIZE)
+        for i, crop in enumerate(crops):
+            cv2.resize(crop, size, dst=self._resized[i], interpolation=cv2.INTER_LINEAR)
+        batch = self._input[:n]
+        np.multiply(self._resized[:n].transpose(0, 3, 1, 2), self._scale, out=batch)
+        batch -= self._offset
+        return torch.from_numpy(batch)
 
     def find_match(self, embedding):
         """
         Compares embedding against known identities.
         Returns (matched_id, score) or (None, 0.0)
         """
-        best_score = -1.0
-        best_id = None
-        
         if embedding is None:
             return None, 0.0
+        return self.find_matches([embedding])[0]
 
-        for pid, data in self.known_identities.items():
-            # Check against recent embeddings of this person
-            # We can average them or max-score them. Max score is often more robust for quick retrieval.
-            # Compare against the mean of stored embeddings for stability?
-            # Let's compare against ALL stored embeddings and take max.
-            
-            stored_embeddings = torch.cat(list(data['embeddings'])) # Shape [N, 1280]
-            # embedding is [1, 1280]
-            
-            # Compute cosine similarity
-            sims = torch.nn.functional.cosine_similarity(embedding, stored_embeddings)
-            max_sim = sims.max().item()
-            
-            if max_sim > best_score:
-                best_score = max_sim
-                best_id = pid
-                
-        if best_score > self.similarity_threshold:
-            return best_id, best_score
-        
-        return None, best_score
+    def find_matches(self, embeddings):
+        """
+        Matches a batch of embeddings against the gallery in one matrix product; each is
+        scored against every stored embedding of every identity, keeping the max per identity.
+
+        Args:
+            embeddings (list): (1, D) tensors, e.g. from `extract_features_batch` (no Nones).
+
+        Returns:
+            list: (matched_id, score) per embedding, matched_id None below the threshold.
+        """
+        identities, scores = self.gallery.best_matches(embeddings)
+        matches = []
+        for pid, score in zip(identities.tolist(), scores.tolist()):
+            if score > self.similarity_threshold:
+                matches.append((pid, score))
+            else:
+                matches.append((None, score))
+        return matches
 
     def update_identity(self, persistent_id, embedding, frame_num):
         """
@@ -105,14 +163,15 @@ class ReIDManager:
         if embedding is None:
             return
 
+        self.known_identities.advance(frame_num)
         if persistent_id not in self.known_identities:
-            self.known_identities[persistent_id] = {
-                'embeddings': deque(maxlen=5), # Keep last 5 features
-                'last_seen': frame_num
-            }
+            self.known_identities[persistent_id] = {'last_seen': frame_num}
         
-        self.known_identities[persistent_id]['embeddings'].append(embedding)
-        self.known_identities[persistent_id]['last_seen'] = frame_num
+        identity = self.known_identities[persistent_id]
+        self.gallery.add(persistent_id, embedding) # Keeps the last REID_EMBEDDINGS_PER_IDENTITY features
+        identity['last_seen'] = frame_num
+        self.known_identities.touch(persistent_id)
+        self.known_identities.expire(frame_num)
 
     def register_new_identity(self, embedding, frame_num):
         """
@@ -0,0 +1,173 @@
+import cv2
+import numpy as np
+from collections import Counter
+from config import (FRAME_RATE, TRACK_TTL_FRAMES, MAX_TRACKS, REID_ADAPTIVE_SCHEDULING, REID_MIN_TRACK_AGE_FRAMES,
+                    REID_MAX_EXTRACTION_INTERVAL_FRAMES, REID_OCCLUSION_GAP_FRAMES, REID_SIGNATURE_HIST_THRESHOLD,
+                    REID_SIGNATURE_GEOMETRY_THRESHOLD)
+from utils.state_expiry import ExpiringDict
+
+# Appearance signature: crop shrunk to this (w, h), RGB quantized to 4 levels per channel
+_SIGNATURE_SIZE = (8, 16)
+_HIST_BINS = 4 ** 3
+
+
+class AppearanceSignature:
+    """Cheap stand-in for a person's appearance: bbox geometry plus a 64-bin colour histogram."""
+    __slots__ = ('aspect', 'area', 'hist')
+
+    def __init__(self, aspect, area, hist):
+        self.aspect = aspect
+        self.area = area
+        self.hist = hist
+
+    @classmethod
+    def from_crop(cls, frame, bbox):
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = map(int, bbox)
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+        bw, bh = max(1, x2 - x1), max(1, y2 - y1)
+        if x2 > x1 and y2 > y1:
+            tiny = cv2.resize(frame[y1:y2, x1:x2], _SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+            levels = (tiny >> 6).astype(np.int64) # 0..3 per channel
+            codes = (levels[..., 0] * 4 + levels[..., 1]) * 4 + levels[..., 2]
+            hist = np.bincount(codes.ravel(), minlength=_HIST_BINS) / codes.size
+        else:
+            hist = np.zeros(_HIST_BINS)
+        return cls(bw / bh, float(bw * bh), hist)
+
+    def changed_from(self, reference):
+        """
+        True if this signature differs enough from `reference` to warrant a new embedding:
+        colour histogram distance (half L1, 0..1) or relative bbox area/aspect change.
+        """
+        if 0.5 * np.abs(self.hist - reference.hist).sum() > REID_SIGNATURE_HIST_THRESHOLD:
+            return True
+        area_change = abs(self.area - reference.area) / max(reference.area, 1.0)
+        aspect_change = abs(self.aspect - reference.aspect) / max(reference.aspect, 1e-6)
+        return max(area_change, aspect_change) > REID_SIGNATURE_GEOMETRY_THRESHOLD
+
+
+class _TrackSchedule:
+    __slots__ = ('embedding', 'signature', 'pending', 'last_extracted', 'last_seen')
+
+    def __init__(self, frame_number):
+        self.embedding = None        # Last extracted embedding (cache)
+        self.signature = None        # Appearance when `embedding` was extracted
+        self.pending = None          # Signature of a due crop, committed by `record`
+        self.last_extracted = None
+        self.last_seen = frame_number
+
+
+class ReIDExtractionScheduler:
+    """
+    Decides which person tracks get a ReID embedding this frame.
+
+    With `adaptive`, a track is embedded once it is REID_MIN_TRACK_AGE_FRAMES old, and
+    again only when its appearance signature moves away from the one recorded at the
+    last extraction, when it comes back after more than REID_OCCLUSION_GAP_FRAMES
+    unseen, or at least every REID_MAX_EXTRACTION_INTERVAL_FRAMES. Otherwise the
+    original fixed rule (history length 5 or a multiple of 30) applies.
+
+    Either way the fixed rule is evaluated alongside, so `get_stats` reports how many
+    extractions it would have made that the scheduler skipped, per minute of video.
+
+    Args:
+        adaptive (bool): Use the appearance-driven policy instead of the fixed rule.
+        fps (float): Frame rate used to convert frame counts to minutes.
+    """
+    def __init__(self, adaptive=REID_ADAPTIVE_SCHEDULING, fps=FRAME_RATE):
+        self.adaptive = adaptive
+        self.fps = fps
+        self.tracks = ExpiringDict('reid_schedule', ttl=TRACK_TTL_FRAMES, max_size=MAX_TRACKS)
+
+        # Statistics
+        self.extractions = Counter()  # reason -> count
+        self.saved = 0                # Fixed-rule extractions skipped
+        self.forced = 0               # Extractions the fixed rule would not have made
+        self._first_frame = None
+        self._last_frame = None
+
+    def select(self, frame, track_ids, bboxes, history_lens, frame_number):
+        """
+        Args:
+            frame (np.array): RGB frame the crops come from.
+            track_ids (list): Person track IDs detected this frame.
+            bboxes (list): [x1, y1, x2, y2] per track.
+            history_lens (list): Tracker history length per track (its age, capped).
+            frame_number (int): Current frame.
+
+        Returns:
+            list: Indices into `track_ids` due for extraction.
+        """
+        if self._first_frame is None:
+            self._first_frame = frame_number
+        self._last_frame = frame_number
+        self.tracks.advance(frame_number)
+
+        due = []
+        for index, (tid, bbox, history_len) in enumerate(zip(track_ids, bboxes, history_lens)):
+            state = self.tracks.get(tid)
+            if state is None:
+                state = self.tracks[tid] = _TrackSchedule(frame_number)
+            fixed_rule = history_len == 5 or history_len % 30 == 0
+
+            reason = self._reason(frame, state, bbox, history_len, frame_number) if self.adaptive else (
+                'fixed' if fixed_rule else None)
+            state.last_seen = frame_number
+            self.tracks.touch(tid)
+
+            if reason is None:
+                self.saved += fixed_rule
+                continue
+            self.extractions[reason] += 1
+            self.forced += not fixed_rule
+            due.append(index)
+
+        self.tracks.expire(frame_number)
+        return due
+
+    def _reason(self, frame, state, bbox, history_len, frame_number):
+        """Why `state`'s track needs a new embedding now, or None to reuse the cached one."""
+        if history_len < REID_MIN_TRACK_AGE_FRAMES:
+            return None
+        signature = AppearanceSignature.from_crop(frame, bbox)
+        state.pending = signature
+        if state.embedding is None:
+            return 'new'
+        if frame_number - state.last_seen > REID_OCCLUSION_GAP_FRAMES:
+            return 'reappeared'
+        if frame_number - state.last_extracted >= REID_MAX_EXTRACTION_INTERVAL_FRAMES:
+            return 'interval'
+        if signature.changed_from(state.signature):
+            return 'appearance'
+        return None
+
+    def record(self, track_id, embedding, frame_number):
+        """Caches a track's new embedding and the signature it was extracted with."""
+        state = self.tracks.get(track_id)
+        if state is None:
+            return
+        state.embedding = embedding
+        state.signature = state.pending
+        state.last_extracted = frame_number
+
+    def cached_embedding(self, track_id):
+        """Last embedding extracted for a track (None if it has none yet)."""
+        state = self.tracks.get(track_id)
+        return None if state is None else state.embedding
+
+    def forget(self, track_id):
+        self.tracks.pop(track_id, None)
+
+    def get_stats(self):
+        """Extraction counts by reason and extractions saved versus the fixed rule."""
+        frames = 0 if self._first_frame is None else self._last_frame - self._first_frame + 1
+        minutes = frames / (self.fps * 60.0)
+        return {
+            'adaptive': self.adaptive,
+            'extractions': sum(self.extractions.values()),
+            'by_reason': dict(self.extractions),
+            'saved': self.saved,
+            'forced': self.forced,
+            'saved_per_minute': round(self.saved / minutes, 1) if minutes else 0.0,
+        }
@@ -0,0 +1,140 @@
+import numpy as np
+
+# 3x3 block of neighbouring cells; with cell_size >= radius every neighbour within
+# `radius` of a point lies in one of these cells
+_NEIGHBOUR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+class SpatialGrid:
+    """
+    Uniform-grid spatial hash over a fixed set of 2D points (rebuilt once per frame).
+
+    Points are bucketed into square cells of `cell_size` and sorted by cell key, so a
+    radius query only has to look at the 3x3 block of cells around each query point
+    (`cell_size` must be >= the query radius). All queries are vectorized: candidate
+    pairs for every query point come out of `searchsorted` on the sorted keys, with no
+    Python loop over points.
+
+    Args:
+        points (np.ndarray): (N, 2) x/y coordinates.
+        cell_size (float): Cell edge length in the same units (e.g. the proximity threshold).
+    """
+    def __init__(self, points, cell_size):
+        self.points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        self.cell_size = float(cell_size)
+
+        cells = np.floor(self.points / self.cell_size).astype(np.int64)
+        if len(cells):
+            self._min = cells.min(axis=0)
+            self._max = cells.max(axis=0)
+        else:
+            self._min = self._max = np.zeros(2, dtype=np.int64)
+        # Row width of the key space (cells are unique per key inside [min, max])
+        self._width = int(self._max[1] - self._min[1]) + 1
+
+        keys = self._keys(cells)
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _keys(self, cells):
+        rel = cells - self._min
+        return rel[:, 0] * self._width + rel[:, 1]
+
+    def query_pairs(self, queries, radius):
+        """
+        All (query, point) pairs closer than `radius`.
+
+        Args:
+            queries (np.ndarray): (Q, 2) query coordinates.
+            radius (float): Strict distance bound (must be <= cell_size).
+
+        Returns:
+            tuple: (query_idx, point_idx, distance) arrays of equal length.
+        """
+        if radius > self.cell_size:
+            raise ValueError(f"radius {radius} exceeds grid cell size {self.cell_size}")
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, 2)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if len(queries) == 0 or len(self.points) == 0:
+            return empty
+
+        query_cells = np.floor(queries / self.cell_size).astype(np.int64)
+        # (Q * 9) neighbouring cells per query
+        cells = (query_cells[:, None, :] + _NEIGHBOUR_OFFSETS[None, :, :]).reshape(-1, 2)
+        owner = np.repeat(np.arange(len(queries)), len(_NEIGHBOUR_OFFSETS))
+        inside = np.all((cells >= self._min) & (cells <= self._max), axis=1)
+        cells, owner = cells[inside], owner[inside]
+
+        keys = self._keys(cells)
+        lo = np.searchsorted(self._sorted_keys, keys, side='left')
+        hi = np.searchsorted(self._sorted_keys, keys, side='right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if total == 0:
+            return empty
+
+        # Expand each [lo, hi) run into explicit candidate indices
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        point_idx = self._order[np.arange(total) + starts]
+        query_idx = np.repeat(owner, counts)
+
+        dist = np.linalg.norm(queries[query_idx] - self.points[point_idx], axis=1)
+        keep = dist < radius
+        return query_idx[keep], point_idx[keep], dist[keep]
+
+    def nearest_within(self, queries, radius):
+        """
+        Closest point to each query within `radius`.
+
+        Returns:
+            tuple: (point_idx, distance) per query; point_idx is -1 (distance inf) when
+                   nothing is in range. Ties go to the lower point index.
+        """
+        n = len(np.asarray(queries).reshape(-1, 2))
+        nearest = np.full(n, -1, dtype=np.int64)
+        best = np.full(n, np.inf, dtype=np.float32)
+        query_idx, point_idx, dist = self.query_pairs(queries, radius)
+        if len(query_idx):
+            order = np.lexsort((point_idx, dist, query_idx))
+            query_idx, point_idx, dist = query_idx[order], point_idx[order], dist[order]
+            first = np.r_[True, query_idx[1:] != query_idx[:-1]]
+            nearest[query_idx[first]] = point_idx[first]
+            best[query_idx[first]] = dist[first]
+        return nearest, best
+
+    def pairs_within(self, radius):
+        """
+        All unordered point pairs (i < j) closer than `radius` (self-join).
+
+        Returns:
+            tuple: (i, j, distance) arrays.
+        """
+        i, j, dist = self.query_pairs(self.points, radius)
+        keep = i < j
+        return i[keep], j[keep], dist[keep]
+
+
+def nearest_within(queries, points, radius, cell_size=None, dense_limit=4096):
+    """
+    Nearest point within `radius` for each query, choosing the cheaper strategy:
+    a single (Q, P) distance matrix for small inputs, a SpatialGrid otherwise.
+
+    Returns:
+        tuple: (point_idx, distance) per query, as `SpatialGrid.nearest_within`.
+    """
+    queries = np.asarray(queries, dtype=np.float32).reshape(-1, 2)
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    if len(queries) * len(points) <= dense_limit:
+        nearest = np.full(len(queries), -1, dtype=np.int64)
+        best = np.full(len(queries), np.inf, dtype=np.float32)
+        if len(queries) and len(points):
+            dist = np.linalg.norm(queries[:, None, :] - points[None, :, :], axis=2)
+            closest = dist.argmin(axis=1)
+            closest_dist = dist[np.arange(len(queries)), closest]
+            hit = closest_dist < radius
+            nearest[hit], best[hit] = closest[hit], closest_dist[hit]
+        return nearest, best
+    return SpatialGrid(points, cell_size or radius).nearest_within(queries, radius)
@@ -0,0 +1,312 @@
+import numpy as np
+from core_pipeline.detections import CLASS_NAMES
+
+_NO_OWNER = -1
+
+# Keys every track exposes through its dict view (anything else lands in the per-track extras)
+_SCALAR_KEYS = ('class', 'last_seen', 'frames_detected', 'owner_id', 'abandoned_timer', 'is_abandoned_event_triggered')
+_HISTORY_KEYS = ('bbox', 'centroid')
+
+
+class TrackStore:
+    """
+    Struct-of-arrays storage for TrackerState.
+
+    Each track owns one slot. Kinematic history lives in preallocated NumPy rings of
+    shape (capacity, history_len, 4) for bboxes and (capacity, history_len, 2) for
+    centroids; per-track scalars (class, last_seen, detection count, owner, abandoned
+    timer, alert flag) are slot-indexed arrays. Capacity doubles when full and released
+    slots are reused.
+
+    Callers that only need one track can keep using dict syntax through `view`
+    (`tracks[tid]['centroid'][-1]`, `track.get('owner_id')`, `track['abandoned_timer'] += 1`),
+    while hot paths work on whole slot arrays at once (`latest_centroid`, `velocity`).
+    """
+    def __init__(self, history_len, capacity=256):
+        self.history_len = history_len
+        self.capacity = 0
+        self.slot_of = {}  # track_id -> slot (insertion ordered, like the old dict of dicts)
+        self._free = []
+        self._extras = {}  # slot -> dict of ad-hoc keys set through the dict view
+        self._views = {}   # slot -> TrackView (created lazily, reused)
+        self._allocate(capacity)
+        self.view = TrackStoreView(self)
+
+    def _allocate(self, capacity):
+        old = self.capacity
+        H = self.history_len
+
+        def grow(array, shape, dtype, fill=0):
+            new = np.full((capacity,) + shape, fill, dtype=dtype)
+            if old:
+                new[:old] = array
+            return new
+
+        self.bbox = grow(getattr(self, 'bbox', None), (H, 4), np.float32)
+        self.centroid = grow(getattr(self, 'centroid', None), (H, 2), np.float32)
+        self.head = grow(getattr(self, 'head', None), (), np.int32)      # Next write position in the ring
+        self.length = grow(getattr(self, 'length', None), (), np.int32)  # Valid entries (<= history_len)
+        self.track_id = grow(getattr(self, 'track_id', None), (), np.int64, -1)
+        self.class_id = grow(getattr(self, 'class_id', None), (), np.int64, -1)
+        self.last_seen = grow(getattr(self, 'last_seen', None), (), np.int64)
+        self.detected = grow(getattr(self, 'detected', None), (), np.int64)  # Frames with a real detection
+        self.owner_id = grow(getattr(self, 'owner_id', None), (), np.int64, _NO_OWNER)
+        self.has_owner = grow(getattr(self, 'has_owner', None), (), bool, False)
+        self.abandoned_timer = grow(getattr(self, 'abandoned_timer', None), (), np.int64)
+        self.triggered = grow(getattr(self, 'triggered', None), (), bool, False)
+        self.in_use = grow(getattr(self, 'in_use', None), (), bool, False)
+
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def __contains__(self, track_id):
+        return track_id in self.slot_of
+
+    def add(self, track_id, class_id, frame_number):
+        """Allocates a slot for a new track and returns it."""
+        if not self._free:
+            self._allocate(self.capacity * 2)
+        slot = self._free.pop()
+        self.slot_of[track_id] = slot
+        self.in_use[slot] = True
+        self.track_id[slot] = track_id
+        self.class_id[slot] = class_id
+        self.last_seen[slot] = frame_number
+        self.detected[slot] = 0
+        self.head[slot] = 0
+        self.length[slot] = 0
+        self.owner_id[slot] = _NO_OWNER
+        self.has_owner[slot] = False
+        self.abandoned_timer[slot] = 0
+        self.triggered[slot] = False
+        return slot
+
+    def release(self, track_id):
+        """Frees a track's slot for reuse."""
+        slot = self.slot_of.pop(track_id, None)
+        if slot is None:
+            return
+        self.in_use[slot] = False
+        self.track_id[slot] = -1
+        self._extras.pop(slot, None)
+        self._views.pop(slot, None)
+        self._free.append(slot)
+
+    def slots_for(self, track_ids, class_ids, frame_number):
+        """Slot per track id, allocating slots for unseen tracks."""
+        slot_of = self.slot_of
+        slots = np.empty(len(track_ids), dtype=np.int64)
+        for i, (tid, cls) in enumerate(zip(track_ids, class_ids)):
+            slot = slot_of.get(tid)
+            slots[i] = slot if slot is not None else self.add(tid, cls, frame_number)
+        return slots
+
+    def append(self, slots, bboxes, centroids):
+        """
+        Pushes one history entry per slot (vectorized).
+
+        Args:
+            slots (np.ndarray): (N,) unique slot indices.
+            bboxes (np.ndarray): (N, 4) boxes.
+            centroids (np.ndarray): (N, 2) centres.
+        """
+        if len(slots) == 0:
+            return
+        pos = self.head[slots]
+        self.bbox[slots, pos] = bboxes
+        self.centroid[slots, pos] = centroids
+        self.head[slots] = (pos + 1) % self.history_len
+        self.length[slots] = np.minimum(self.length[slots] + 1, self.history_len)
+
+    def _ring_index(self, slots, back):
+        """Ring position `back` entries before the newest (back=1 is the newest)."""
+        return (self.head[slots] - back) % self.history_len
+
+    def latest_bbox(self, slots):
+        return self.bbox[slots, self._ring_index(slots, 1)]
+
+    def latest_centroid(self, slots):
+        return self.centroid[slots, self._ring_index(slots, 1)]
+
+    def centroid_back(self, slots, back):
+        """Centroid `back` entries ago (clamped to the oldest entry held)."""
+        back = np.minimum(back, np.maximum(self.length[slots], 1))
+        return self.centroid[slots, self._ring_index(slots, back)]
+
+    def velocity(self, slots, lag=3):
+        """
+        Mean speed (pixels/frame) between the newest centroid and the one `lag - 1` entries
+        earlier, for every slot at once. Tracks with fewer than `lag` entries get 0.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) == 0:
+            return np.zeros(0, dtype=np.float32)
+        dist = np.linalg.norm(self.latest_centroid(slots) - self.centroid_back(slots, lag), axis=1)
+        speed = dist / float(lag)
+        speed[self.length[slots] < lag] = 0.0
+        return speed
+
+    def history(self, slot, key='centroid'):
+        """Oldest-to-newest copy of one track's history, shape (length, 4 | 2)."""
+        ring = self.bbox if key == 'bbox' else self.centroid
+        n = int(self.length[slot])
+        idx = (int(self.head[slot]) - n + np.arange(n)) % self.history_len
+        return ring[slot, idx]
+
+    def active_slots(self):
+        """Slots currently holding a track, in insertion order."""
+        return np.fromiter(self.slot_of.values(), dtype=np.int64, count=len(self.slot_of))
+
+    def track(self, track_id):
+        slot = self.slot_of.get(track_id)
+        if slot is None:
+            return None
+        view = self._views.get(slot)
+        if view is None:
+            view = self._views[slot] = TrackView(self, slot)
+        return view
+
+
+class HistoryView:
+    """Read-only, deque-like window onto one track's bbox or centroid ring."""
+    __slots__ = ('_store', '_slot', '_key')
+
+    def __init__(self, store, slot, key):
+        self._store = store
+        self._slot = slot
+        self._key = key
+
+    def __len__(self):
+        return int(self._store.length[self._slot])
+
+    def __getitem__(self, index):
+        n = len(self)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(n))]
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("track history index out of range")
+        store = self._store
+        pos = (int(store.head[self._slot]) - n + index) % store.history_len
+        # Rings are reallocated on growth, so always look them up through the store
+        ring = store.bbox if self._key == 'bbox' else store.centroid
+        return ring[self._slot, pos].tolist()
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self):
+        return f"HistoryView({list(self)})"
+
+
+class TrackView:
+    """Dict-compatible view of one slot (the legacy `tracks[tid]` dict)."""
+    __slots__ = ('_store', 'slot')
+
+    def __init__(self, store, slot):
+        self._store = store
+        self.slot = slot
+
+    @property
+    def store(self):
+        """The TrackStore holding this track (for vectorized access by slot)."""
+        return self._store
+
+    def __getitem__(self, key):
+        store, slot = self._store, self.slot
+        if key in _HISTORY_KEYS:
+            return HistoryView(store, slot, key)
+        if key == 'class':
+            return CLASS_NAMES[store.class_id[slot]]
+        if key == 'last_seen':
+            return int(store.last_seen[slot])
+        if key == 'frames_detected':
+            return int(store.detected[slot])
+        if key == 'owner_id':
+            return int(store.owner_id[slot]) if store.has_owner[slot] else None
+        if key == 'abandoned_timer':
+            return int(store.abandoned_timer[slot])
+        if key == 'is_abandoned_event_triggered':
+            return bool(store.triggered[slot])
+        return store._extras.get(slot, {})[key]
+
+    def __setitem__(self, key, value):
+        store, slot = self._store, self.slot
+        if key == 'last_seen':
+            store.last_seen[slot] = value
+        elif key == 'owner_id':
+            store.has_owner[slot] = value is not None
+            store.owner_id[slot] = _NO_OWNER if value is None else value
+        elif key == 'abandoned_timer':
+            store.abandoned_timer[slot] = value
+        elif key == 'is_abandoned_event_triggered':
+            store.triggered[slot] = bool(value)
+        elif key in _HISTORY_KEYS or key in ('class', 'frames_detected'):
+            raise KeyError(f"'{key}' is managed by TrackerState")
+        else:
+            store._extras.setdefault(slot, {})[key] = value
+
+    def __contains__(self, key):
+        return key in _HISTORY_KEYS or key in _SCALAR_KEYS or key in self._store._extras.get(self.slot, ())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(_HISTORY_KEYS + _SCALAR_KEYS) + list(self._store._extras.get(self.slot, ()))
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return f"TrackView(id={int(self._store.track_id[self.slot])}, class={self['class']!r}, " \
+               f"last_seen={self['last_seen']}, history={len(self['centroid'])})"
+
+
+class TrackStoreView:
+    """Read-only mapping track_id -> TrackView (what `TrackerState.tracks` used to be)."""
+    __slots__ = ('_store',)
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, track_id):
+        view = self._store.track(track_id)
+        if view is None:
+            raise KeyError(track_id)
+        return view
+
+    def get(self, track_id, default=None):
+        view = self._store.track(track_id)
+        return default if view is None else view
+
+    def __contains__(self, track_id):
+        return track_id in self._store.slot_of
+
+    def __len__(self):
+        return len(self._store.slot_of)
+
+    def __iter__(self):
+        return iter(list(self._store.slot_of))
+
+    def keys(self):
+        return list(self._store.slot_of)
+
+    def values(self):
+        return [self._store.track(tid) for tid in list(self._store.slot_of)]
+
+    def items(self):
+        return [(tid, self._store.track(tid)) for tid in list(self._store.slot_of)]
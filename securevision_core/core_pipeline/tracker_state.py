@@ -1,15 +1,34 @@
 import numpy as np
-from collections import deque
-from config import SUSTAINED_DURATION_FRAMES
+from collections import OrderedDict
+from config import (SUSTAINED_DURATION_FRAMES, ACTIVE_TRACK_WINDOW, TRACK_TTL_FRAMES, MAX_TRACKS,
+                    SPATIAL_GRID_MIN_PAIRS)
+from core_pipeline.detections import Detections, class_ids_for
+from core_pipeline.track_store import TrackStore
+from core_pipeline.spatial_index import nearest_within
+from utils.state_expiry import ExpiringDict
 
 class TrackerState:
     """
     Maintains the state of BoTSORT Track IDs and their kinematic history.
     """
     def __init__(self, history_len=SUSTAINED_DURATION_FRAMES + 10):
-        self.tracks = {}  # Dict[track_id, {'bbox': [], 'centroid': [], 'class': str}]
+        # Struct-of-arrays storage; `tracks` is its dict-compatible view
+        # (tracks[tid] -> {'bbox': history, 'centroid': history, 'class': str, 'last_seen': int, ...})
+        self.store = TrackStore(history_len)
+        self.tracks = self.store.view
         self.history_len = history_len
         self.frame_count = 0
+
+        # Active index: class_id -> OrderedDict[track_id, None], oldest last_seen first.
+        # Maintained incrementally by update/predict; tracks unseen for ACTIVE_TRACK_WINDOW frames drop out.
+        self.active_window = ACTIVE_TRACK_WINDOW
+        self._active = {}
+
+        # Lifecycle: tracks unseen for TRACK_TTL_FRAMES (or beyond MAX_TRACKS, LRU) are released
+        # from the store together with their id_map entry; listeners drop their per-track state.
+        self._lifecycle = ExpiringDict('tracks', ttl=TRACK_TTL_FRAMES, max_size=MAX_TRACKS,
+                                       on_evict=self._release)
+        self._release_listeners = []
         
         # ID Mapping: BoTSORT ID (int) -> Persistent Person ID (int)
         # This allows us to remap a new BoTSORT track to an old Person ID if ReID matches.
@@ -23,6 +42,80 @@ class TrackerState:
         """Maps a (likely new) BoTSORT ID to an existing Persistent ID."""
         self.id_map[botsort_id] = persistent_id
 
+    def add_release_listener(self, callback):
+        """Registers callback(track_id), called when a track is released from memory."""
+        self._release_listeners.append(callback)
+
+    def _release(self, track_id, _=None):
+        slot = self.store.slot_of.get(track_id)
+        if slot is not None:
+            index = self._active.get(int(self.store.class_id[slot]))
+            if index is not None:
+                index.pop(track_id, None)
+        self.store.release(track_id)
+        self.id_map.pop(track_id, None)
+        for callback in self._release_listeners:
+            callback(track_id)
+
+    def _touch(self, track_ids, class_ids):
+        """Moves just-updated tracks to the newest end of their class index and lifecycle."""
+        active, lifecycle = self._active, self._lifecycle
+        for tid, cls in zip(track_ids, class_ids):
+            index = active.get(cls)
+            if index is None:
+                index = active[cls] = OrderedDict()
+            index[tid] = None
+            index.move_to_end(tid)
+            lifecycle[tid] = None
+
+    def _expire(self, frame_number):
+        """Pops tracks older than the active window off the front of each class index and releases dead ones."""
+        self._lifecycle.expire(frame_number)
+        cutoff = frame_number - self.active_window
+        slot_of, last_seen = self.store.slot_of, self.store.last_seen
+        for index in self._active.values():
+            while index:
+                tid = next(iter(index))
+                slot = slot_of.get(tid)
+                if slot is not None and last_seen[slot] >= cutoff:
+                    break
+                index.popitem(last=False)
+
+    def _active_ids(self, classes=None, max_age=None):
+        """Track IDs in the active index, newest first within each class."""
+        if classes is None:
+            indices = self._active.values()
+        else:
+            indices = [self._active[c] for c in class_ids_for(classes).tolist() if c in self._active]
+        slot_of, last_seen = self.store.slot_of, self.store.last_seen
+        for index in indices:
+            for tid in reversed(index):
+                if max_age is not None and self.frame_count - last_seen[slot_of[tid]] > max_age:
+                    break
+                yield tid
+
+    def iter_active(self, classes=None, max_age=None):
+        """
+        Iterates live tracks without touching long-dead ones.
+
+        Args:
+            classes (list, optional): Class names to include, e.g. ['person'] or LUGGAGE_CLASSES.
+            max_age (int, optional): Only tracks seen within this many frames (<= active_window).
+
+        Yields:
+            tuple: (track_id, track) with the same dict view as `get_track`, newest first per class.
+        """
+        for tid in list(self._active_ids(classes, max_age)):
+            yield tid, self.store.track(tid)
+
+    def active_slots(self, classes=None, max_age=None):
+        """Store slots of live tracks, for vectorized consumers."""
+        slot_of = self.store.slot_of
+        return np.fromiter((slot_of[tid] for tid in self._active_ids(classes, max_age)), dtype=np.int64)
+
+    def active_count(self):
+        return sum(len(index) for index in self._active.values())
+
     def assign_owners(self):
         """
         Associates luggage (backpack, handbag, suitcase) with the closest person.
@@ -30,110 +123,142 @@ class TrackerState:
         """
         from config import LUGGAGE_CLASSES, LUGGAGE_PROXIMITY_THRESHOLD
 
-        persons = {} # Map Persistent ID to centroid
-        luggage = []
-
-        # Separate people and luggage
-        for tid, track in self.tracks.items():
-            # Check if track was updated recently (e.g. within last 5 frames) to be considered 'active'
-            if self.frame_count - track['last_seen'] > 10:
-                continue
-
-            # RESOLVE ID
-            effective_id = self.get_mapped_id(tid)
-
-            if track['class'] == 'person':
-                persons[effective_id] = track['centroid'][-1]
-            elif track['class'] in LUGGAGE_CLASSES:
-                luggage.append(tid)
-
-        for lug_id in luggage:
-            lug_track = self.tracks[lug_id]
-            lug_centroid = np.array(lug_track['centroid'][-1])
-            
-            # Initialize metadata if missing
-            if 'abandoned_timer' not in lug_track:
-                lug_track['abandoned_timer'] = 0
-            if 'owner_id' not in lug_track:
-                lug_track['owner_id'] = None
-            if 'is_abandoned_event_triggered' not in lug_track:
-                lug_track['is_abandoned_event_triggered'] = False
-
-            current_owner_id = lug_track['owner_id']
-            owner_nearby = False
+        store = self.store
+        # Tracks updated within the last 10 frames are considered 'active'
+        luggage_slots = self.active_slots(LUGGAGE_CLASSES, max_age=10)
+        if len(luggage_slots) == 0:
+            return
+        person_slots = self.active_slots(['person'], max_age=10)[::-1] # Oldest first
 
+        # RESOLVE IDs: persons keyed by Persistent ID (the most recently seen track wins a shared ID)
+        person_ids = np.fromiter((self.id_map.get(t, t) for t in store.track_id[person_slots].tolist()),
+                                 dtype=np.int64, count=len(person_slots))
+        _, last = np.unique(person_ids[::-1], return_index=True)
+        keep = np.sort(len(person_ids) - 1 - last)
+        person_ids = person_ids[keep]
+        person_centroids = store.latest_centroid(person_slots[keep])
+
+        lug_centroids = store.latest_centroid(luggage_slots)
+        has_owner = store.has_owner[luggage_slots]
+        owner_nearby = np.zeros(len(luggage_slots), dtype=bool)
+
+        if len(person_ids):
             # Valid Owner Check Strategy:
             # 1. If we have an owner, ONLY check against that owner (using Persistent ID).
-            # 2. If we don't have an owner, find the closest person to assign.
-
-            if current_owner_id is not None:
-                # Check if specific owner is present and close
-                # current_owner_id is ALREADY a persistent ID (saved previously)
-                if current_owner_id in persons:
-                    owner_centroid = np.array(persons[current_owner_id])
-                    dist = np.linalg.norm(lug_centroid - owner_centroid)
-                    
-                    if dist < LUGGAGE_PROXIMITY_THRESHOLD:
-                        owner_nearby = True
-                
-                # Note: If owner is NOT in 'persons' (left the scene), owner_nearby remains False
-                
-            else:
-                # No owner assigned yet, try to find one
-                closest_person_id = None
-                min_dist = float('inf')
-
-                for pid, p_centroid in persons.items():
-                    dist = np.linalg.norm(lug_centroid - np.array(p_centroid))
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_person_id = pid
-                
-                if closest_person_id is not None and min_dist < LUGGAGE_PROXIMITY_THRESHOLD:
-                    lug_track['owner_id'] = closest_person_id # Assign new owner (Persistent ID)
-                    owner_nearby = True
-
-            if owner_nearby:
-                # Reset Timer
-                lug_track['abandoned_timer'] = 0
-            else:
-                # Owner away or unknown -> Increment Timer
-                lug_track['abandoned_timer'] += 1
+            owned = np.flatnonzero(has_owner)
+            if len(owned):
+                sorter = np.argsort(person_ids)
+                pos = np.searchsorted(person_ids, store.owner_id[luggage_slots[owned]], sorter=sorter)
+                pos = sorter[np.minimum(pos, len(person_ids) - 1)]
+                present = person_ids[pos] == store.owner_id[luggage_slots[owned]]
+                dist = np.linalg.norm(lug_centroids[owned] - person_centroids[pos], axis=1)
+                owner_nearby[owned] = present & (dist < LUGGAGE_PROXIMITY_THRESHOLD)
+                # Note: If owner is NOT among the active persons (left the scene), owner_nearby remains False
+
+            # 2. If we don't have an owner, find the closest person to assign
+            #    (dense distance matrix for small scenes, spatial grid for crowded ones).
+            unowned = np.flatnonzero(~has_owner)
+            if len(unowned):
+                closest, _ = nearest_within(lug_centroids[unowned], person_centroids, LUGGAGE_PROXIMITY_THRESHOLD,
+                                            dense_limit=SPATIAL_GRID_MIN_PAIRS)
+                hit = closest >= 0
+                assign = unowned[hit]
+                store.owner_id[luggage_slots[assign]] = person_ids[closest[hit]] # Assign new owner (Persistent ID)
+                store.has_owner[luggage_slots[assign]] = True
+                owner_nearby[assign] = True
+
+        # Owner nearby -> reset timer; owner away or unknown -> increment timer
+        store.abandoned_timer[luggage_slots[owner_nearby]] = 0
+        store.abandoned_timer[luggage_slots[~owner_nearby]] += 1
 
     def update(self, detections, frame_number):
         """
         Updates the tracker state with new detections.
         
         Args:
-            detections (list): List of dicts [{'track_id': int, 'class': str, 'bbox': [x1, y1, x2, y2], 'centroid': [cx, cy]}]
+            detections (Detections | list): Columnar Detections batch, or the legacy list of dicts
+                                            [{'track_id': int, 'class': str, 'bbox': [x1, y1, x2, y2], 'centroid': [cx, cy]}]
             frame_number (int): Current frame number
         """
         self.frame_count = frame_number
-        current_ids = set()
-
-        for det in detections:
-            tid = det['track_id']
-            current_ids.add(tid)
-            
-            if tid not in self.tracks:
-                self.tracks[tid] = {
-                    'bbox': deque(maxlen=self.history_len),
-                    'centroid': deque(maxlen=self.history_len),
-                    'class': det['class'],
-                    'last_seen': frame_number,
-                    'is_abandoned_event_triggered': False
-                }
-            
-            self.tracks[tid]['bbox'].append(det['bbox'])
-            self.tracks[tid]['centroid'].append(det['centroid'])
-            self.tracks[tid]['last_seen'] = frame_number
-
-        # Optional: Clean up old tracks (not strictly required for this demo but good practice)
-        # self._cleanup_old_tracks(frame_number)
+        self._lifecycle.advance(frame_number)
+        if not isinstance(detections, Detections):
+            detections = Detections.from_dicts(detections)
+        if len(detections) == 0:
+            self._expire(frame_number)
+            return
+
+        slots = self.store.slots_for(detections.track_id.tolist(), detections.class_id.tolist(), frame_number)
+        if len(np.unique(slots)) == len(slots):
+            self.store.append(slots, detections.xyxy, detections.centroid)
+        else:
+            # Same track ID twice in one frame: keep the legacy append-in-order behaviour
+            for i, slot in enumerate(slots):
+                self.store.append(slots[i:i + 1], detections.xyxy[i:i + 1], detections.centroid[i:i + 1])
+        self.store.last_seen[slots] = frame_number
+        self.store.detected[slots] += 1 # Once per track even if its ID appears twice
+        self._touch(detections.track_id.tolist(), detections.class_id.tolist())
+        self._expire(frame_number)
+
+    def refresh(self, detections, frame_number):
+        """
+        Marks the tracks in `detections` as seen at `frame_number` without adding history
+        (motion-gated frames replay the last detections, so nothing new was observed).
+
+        Args:
+            detections (Detections): Last real detections batch.
+            frame_number (int): Current frame number
+        """
+        self.frame_count = frame_number
+        self._lifecycle.advance(frame_number)
+        slot_of = self.store.slot_of
+        track_ids = [tid for tid in detections.track_id.tolist() if tid in slot_of]
+        if track_ids:
+            slots = np.fromiter((slot_of[tid] for tid in track_ids), dtype=np.int64, count=len(track_ids))
+            self.store.last_seen[slots] = frame_number
+            self._touch(track_ids, self.store.class_id[slots].tolist())
+        self._expire(frame_number)
+
+    def predict(self, frame_number):
+        """
+        Advances live tracks without a detection pass (detection stride frames).
+        Uses a constant-velocity model on the last two bbox/centroid entries; predicted
+        entries extend the history but not a track's `frames_detected`.
+
+        Args:
+            frame_number (int): Current frame number
+        """
+        last_frame = self.frame_count
+        self.frame_count = frame_number
+        self._lifecycle.advance(frame_number)
+
+        store = self.store
+        # Only tracks seen on the previous (detected or predicted) frame are advanced
+        slots = np.fromiter((store.slot_of[tid] for tid in self._active_ids(max_age=frame_number - last_frame)),
+                            dtype=np.int64)
+        slots = slots[(store.last_seen[slots] == last_frame) & (store.length[slots] > 0)]
+        if len(slots) == 0:
+            self._expire(frame_number)
+            return
+
+        centroid = store.latest_centroid(slots)
+        velocity = centroid - store.centroid_back(slots, 2)
+        velocity[store.length[slots] < 2] = 0.0
+
+        store.append(slots, store.latest_bbox(slots) + np.tile(velocity, 2), centroid + velocity)
+        store.last_seen[slots] = frame_number
+        self._touch(store.track_id[slots].tolist(), store.class_id[slots].tolist())
+        self._expire(frame_number)
 
     def get_track(self, track_id):
-        return self.tracks.get(track_id)
+        return self.store.track(track_id)
 
     def get_all_tracks(self):
         return self.tracks
 
+    def get_stats(self):
+        """Sizes and eviction counters for memory telemetry."""
+        stats = self._lifecycle.get_stats()
+        stats.update(active=self.active_count(), id_map=len(self.id_map), capacity=self.store.capacity)
+        return stats
+
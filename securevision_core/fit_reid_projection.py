@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import REID_PROJECTION_PATH, REID_PROJECTION_DIM
+from core_pipeline.reid_compaction import EmbeddingProjection, STORAGE_DTYPES, encode, decode
+from calibrate_onnx import read_frames, person_crops
+
+
+def embed_crops(crops):
+    """Full-width ReID embeddings of each crop and its mirror image (projection disabled)."""
+    from core_pipeline.reid_manager import ReIDManager
+    manager = ReIDManager(use_cuda=False, use_projection=False)
+    embeddings = []
+    for crop in crops:
+        for view in (crop, np.ascontiguousarray(crop[:, ::-1])):
+            h, w = view.shape[:2]
+            embedding = manager.extract_features_batch(view, [[0, 0, w, h]])[0]
+            if embedding is not None:
+                embeddings.append(embedding.numpy()[0])
+    return np.stack(embeddings)
+
+
+def similarity_error(full, compact):
+    """Mean / max absolute change of pairwise cosine similarity on held-out embeddings."""
+    diff = np.abs(full @ full.T - compact @ compact.T)
+    return float(diff.mean()), float(diff.max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the compact ReID projection on person crops from testvideos/.")
+    parser.add_argument('--videos', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testvideos'))
+    parser.add_argument('--frames', type=int, default=200, help="Frames sampled across all videos")
+    parser.add_argument('--dim', type=int, default=REID_PROJECTION_DIM, help="Components kept (128-256)")
+    parser.add_argument('--output', default=REID_PROJECTION_PATH)
+    args = parser.parse_args()
+
+    print(f"Sampling {args.frames} frames from {args.videos} ...")
+    frames = read_frames(args.videos, args.frames)
+    if not frames:
+        sys.exit(1)
+
+    from core_pipeline.real_layer1 import get_models
+    models = get_models()
+    if models is None:
+        print("Ultralytics not installed; cannot detect person crops.")
+        sys.exit(1)
+    crops = person_crops(frames, models['base'])
+    print(f"Found {len(crops)} person crops")
+
+    embeddings = embed_crops(crops)
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(embeddings))
+    holdout = embeddings[order[:min(500, len(order) // 5)]]
+    train = embeddings[order[len(holdout):]]
+    if len(train) < args.dim:
+        print(f"Warning: {len(train)} training embeddings for {args.dim} components; sample more frames.")
+
+    projection, energy = EmbeddingProjection.fit(train, args.dim)
+    print(f"Projection {projection.input_dim} -> {projection.output_dim} dims, retains {energy:.1%} of the energy")
+
+    compact = projection(holdout)
+    for storage in STORAGE_DTYPES:
+        stored = decode(*encode(compact, storage))
+        bytes_per_vector = stored.shape[1] * np.dtype(storage).itemsize + (4 if storage == 'int8' else 0)
+        mean_err, max_err = similarity_error(holdout, stored)
+        print(f"  {storage:>7}: {bytes_per_vector:5d} B/embedding "
+              f"({holdout.shape[1] * 4 / bytes_per_vector:4.1f}x smaller), "
+              f"held-out cosine error mean {mean_err:.4f} / max {max_err:.4f}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    projection.save(args.output)
+    print(f"Saved -> {args.output}")
+    print("Enable with REID_USE_PROJECTION = True (and REID_STORAGE_DTYPE = 'float16' or 'int8') in config.py")
+
+
+if __name__ == "__main__":
+    main()
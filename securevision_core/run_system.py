@@ -7,12 +7,16 @@ import asyncio
 import os
 import signal
 import sys
-import sys
 import queue
+import multiprocessing
 
 from api.main import app, broadcast_log_sync
-from config import VIDEO_PATH, PROCESSING_WIDTH, LUGGAGE_CLASSES
+from api.stream import run_stream_server
+from config import (VIDEO_PATH, PROCESSING_WIDTH, USE_SHARED_FRAME_RING, FRAME_RING_SLOTS, STREAM_PORT,
+                    STATE_STATS_INTERVAL_FRAMES)
 from core_pipeline.pipeline import SecureVisionPipeline
+from utils.frame_ring import SharedFrameRing
+from utils.alert_throttle import LuggageAlertThrottle
 from utils.logger import setup_logger
 
 # Setup Logger
@@ -62,10 +66,99 @@ class VideoReaderThread(threading.Thread):
              self.cap.release()
 
 
-# Alert Throttling State
-# Dict[str, float] -> "LuggageID": timestamp
-sent_alerts = {}
-ALERT_COOLDOWN = 10.0 # Seconds before re-alerting for same luggage ID if it recurs
+def probe_frame_shapes(playlist):
+    """
+    Sizes the shared-memory ring slots from the playlist.
+
+    Returns:
+        tuple: (largest decoded (h, w, 3), largest (h, w, 3) after resizing to PROCESSING_WIDTH)
+    """
+    height, width, processed_height = 0, 0, 0
+    for path in playlist:
+        cap = cv2.VideoCapture(path)
+        h, w = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        cap.release()
+        height, width = max(height, h), max(width, w)
+        if w:
+            processed_height = max(processed_height, int(PROCESSING_WIDTH * h / w))
+    return (height, width, 3), (processed_height, PROCESSING_WIDTH, 3)
+
+
+class VideoDecoderProcess(multiprocessing.Process):
+    """
+    Process-based replacement for VideoReaderThread.
+
+    Decodes the playlist on its own core and writes raw BGR frames into a SharedFrameRing.
+    A playlist advance bumps the frame epoch instead of queueing a sentinel, so the
+    consumer sees the VIDEO_RESET exactly at the first frame of the next video.
+    """
+    def __init__(self, playlist, ring_spec):
+        super().__init__(daemon=True, name="VideoDecoder")
+        self.playlist = playlist
+        self.ring_spec = ring_spec
+        self.stop_event = multiprocessing.Event()
+
+    def run(self):
+        ring = SharedFrameRing.attach(**self.ring_spec)
+        current_idx, epoch = 0, 0
+        cap = cv2.VideoCapture(self.playlist[current_idx])
+        try:
+            while not self.stop_event.is_set() and cap.isOpened():
+                ret, frame = cap.read()
+                if not ret:
+                    cap.release()
+                    current_idx = (current_idx + 1) % len(self.playlist)
+                    epoch += 1
+                    cap = cv2.VideoCapture(self.playlist[current_idx])
+                    continue
+
+                # Back-pressure: wait for the inference loop, re-checking for shutdown
+                while ring.write(frame, epoch=epoch, block=True, timeout=0.5) < 0:
+                    if self.stop_event.is_set() or ring.closed:
+                        return
+        finally:
+            cap.release()
+            ring.close_writer()
+            ring.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class RingFrameSource:
+    """
+    Queue-like reader over the decoder's ring, so the main loop treats both sources alike.
+
+    `get` returns ("VIDEO_RESET", None) when the epoch changes and ("FRAME", view)
+    otherwise. The view points into shared memory and stays valid until the next `get`,
+    which is when the previous slot is handed back to the decoder.
+    """
+    def __init__(self, ring):
+        self.ring = ring
+        self.last_seq = 0
+        self.epoch = 0
+        self._pending = None
+
+    def get(self, timeout=1.0):
+        if self._pending is not None:
+            frame, self._pending = self._pending, None
+            return ("FRAME", frame)
+
+        self.ring.ack(self.last_seq)
+        item = self.ring.read_next(self.last_seq, timeout=timeout)
+        if item is None:
+            raise queue.Empty
+        self.last_seq, epoch, frame = item
+
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self._pending = frame
+            return ("VIDEO_RESET", None)
+        return ("FRAME", frame)
+
+
+# Alert Throttling State (one abandoned-luggage alert per ID per cooldown)
+alert_throttle = LuggageAlertThrottle()
 
 
 def run_api():
@@ -83,6 +176,29 @@ def main():
     # Register Signal Handler
     signal.signal(signal.SIGINT, signal_handler)
 
+    # 0. Optional process-based frame bus (before any threads start)
+    playlist = [
+        os.path.join(os.path.dirname(__file__), 'testvideos', 'test6.mp4'),
+        os.path.join(os.path.dirname(__file__), 'testvideos', 'test-ismaeel2.mp4'),
+        os.path.join(os.path.dirname(__file__), 'testvideos', 'livefight-test3.mp4')
+    ]
+    input_ring = output_ring = None
+    processes = []
+    if USE_SHARED_FRAME_RING:
+        frame_shape, processed_shape = probe_frame_shapes(playlist)
+        input_ring = SharedFrameRing(slots=FRAME_RING_SLOTS, frame_shape=frame_shape)
+        output_ring = SharedFrameRing(slots=FRAME_RING_SLOTS, frame_shape=processed_shape)
+
+        video_reader = VideoDecoderProcess(playlist, input_ring.spec())
+        stream_server = multiprocessing.Process(target=run_stream_server, args=(output_ring.spec(), STREAM_PORT),
+                                                daemon=True, name="StreamServer")
+        processes = [video_reader, stream_server]
+        for process in processes:
+            process.start()
+        frame_source = RingFrameSource(input_ring)
+        logger.info(f"[FrameRing] Decoder and MJPEG server running in separate processes "
+                    f"({FRAME_RING_SLOTS} slots of {frame_shape}). Stream: http://localhost:{STREAM_PORT}/video_feed")
+
     # 1. Start API in Background Thread
     api_thread = threading.Thread(target=run_api, daemon=True)
     api_thread.start()
@@ -91,16 +207,11 @@ def main():
     # 2. Add delay to let API start
     time.sleep(2)
 
-    # 3. Start Video Pipeline (Main Thread)
-    playlist = [
-        os.path.join(os.path.dirname(__file__), 'testvideos', 'test6.mp4'),
-        os.path.join(os.path.dirname(__file__), 'testvideos', 'test-ismaeel2.mp4'),
-        os.path.join(os.path.dirname(__file__), 'testvideos', 'livefight-test3.mp4')
-    ]
-    
     # 3. Start Async Video Reader Thread
-    video_reader = VideoReaderThread(playlist, queue_size=60)
-    video_reader.start()
+    if not USE_SHARED_FRAME_RING:
+        video_reader = VideoReaderThread(playlist, queue_size=60)
+        video_reader.start()
+        frame_source = video_reader.frame_queue
 
     pipeline = SecureVisionPipeline(stream_id="desktop_stream")
     frame_count = 0
@@ -111,7 +222,7 @@ def main():
     while running:
         # Pull pre-decoded frame instantly from memory (will block lightly if thread is catching up)
         try:
-            action, frame = video_reader.frame_queue.get(timeout=1.0)
+            action, frame = frame_source.get(timeout=1.0)
         except queue.Empty:
             continue # Try again
             
@@ -135,27 +246,16 @@ def main():
         frame_small = cv2.resize(frame_rgb, (PROCESSING_WIDTH, process_h))
         
         # Run Heavy Pipeline
-        annotated_frame, status, log_data = pipeline.process_frame(frame_small, frame_count)
+        annotated_frame, status, log_data = pipeline.process_frame(frame_small, frame_count, full_res_frame=frame_rgb)
         
         # Broadcast Logs to API/Frontend
-        if log_data:
-            for item in log_data:
-                # Check for Abandoned Luggage Alert
-                # item structure: {id, category, status, details}
-                if item.get("category") in LUGGAGE_CLASSES:
-                    if "ABANDONED" in item.get("details", "") and item.get("status") == "CRITICAL":
-                         lug_id = item['id']
-                         current_time = time.time()
-                         
-                         # Check throttling
-                         last_sent = sent_alerts.get(lug_id, 0)
-                         if current_time - last_sent > ALERT_COOLDOWN:
-                             broadcast_log_sync({
-                                 "type": "CRITICAL",
-                                 "message": f"Abandoned Luggage {item['id']}! {item['details']}",
-                                 "timestamp": time.strftime("%H:%M:%S")
-                             })
-                             sent_alerts[lug_id] = current_time
+        # Abandoned Luggage Alerts (throttled per luggage ID)
+        for item in alert_throttle.due(log_data):
+            broadcast_log_sync({
+                "type": "CRITICAL",
+                "message": f"Abandoned Luggage {item['id']}! {item['details']}",
+                "timestamp": time.strftime("%H:%M:%S")
+            })
 
         if frame_count % 3 == 0: # Broadcast objects every 3rd frame to save bandwidth
              broadcast_log_sync({
@@ -178,6 +278,25 @@ def main():
                  }
              })
 
+        alert_throttle.expire()
+        if frame_count % STATE_STATS_INTERVAL_FRAMES == 0:
+            state_stats = pipeline.get_state_stats()
+            state_stats['sent_alerts'] = alert_throttle.get_stats()
+            logger.info("[State] " + ", ".join(f"{name}={stats['size']} (evicted {stats['evicted_ttl']} ttl / "
+                                                   f"{stats['evicted_lru']} lru)" for name, stats in state_stats.items()))
+            if pipeline.fight_detector.verifier is not None:
+                verifier = pipeline.fight_detector.verifier.get_stats()
+                logger.info(f"[FightNet] queue={verifier['queue_depth']} rejected={verifier['rejected']} "
+                            f"avg_batch={verifier['avg_batch_size']} latency avg={verifier['avg_latency_ms']}ms "
+                            f"p95={verifier['p95_latency_ms']}ms")
+            reid = pipeline.reid_scheduler.get_stats()
+            logger.info(f"[ReID] extractions={reid['extractions']} {reid['by_reason']} saved={reid['saved']} "
+                        f"({reid['saved_per_minute']}/min) forced={reid['forced']}")
+
+        if output_ring is not None:
+            # Best-effort hand-off to the MJPEG process; never waits on slow clients
+            output_ring.write(annotated_frame, block=False)
+
         # Display Native Window
         # Convert back to BGR for OpenCV imshow
         frame_bgr_out = cv2.cvtColor(annotated_frame, cv2.COLOR_RGB2BGR)
@@ -194,6 +313,16 @@ def main():
     running = False
     video_reader.stop()
     video_reader.join(timeout=2.0)
+    for ring in (input_ring, output_ring):
+        if ring is not None:
+            ring.close_writer()
+    for process in processes:
+        process.join(timeout=2.0)
+        if process.is_alive():
+            process.terminate()
+    for ring in (input_ring, output_ring):
+        if ring is not None:
+            ring.close()
     cv2.destroyAllWindows()
     logger.info("System Shutdown Complete.")
     sys.exit(0)
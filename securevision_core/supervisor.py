@@ -0,0 +1,384 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import (CAMERA_CONFIG_PATH, STREAMS_PER_WORKER, WORKER_CPU_PINNING, WORKER_HEARTBEAT_TIMEOUT_SECONDS,
+                    WORKER_STARTUP_TIMEOUT_SECONDS, WORKER_RESTART_BACKOFF_SECONDS, TELEMETRY_QUEUE_SIZE,
+                    PROCESSING_WIDTH)
+from utils.alert_throttle import LuggageAlertThrottle
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HEARTBEAT_INTERVAL = 5.0
+MAX_RESTART_BACKOFF = 60.0
+
+
+def load_cameras(path):
+    """Reads the camera list. Relative file sources resolve against the config file's directory."""
+    with open(path) as f:
+        cameras = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for cam in cameras:
+        if 'id' not in cam or 'source' not in cam:
+            raise ValueError(f"Camera entry needs 'id' and 'source': {cam}")
+        source = str(cam['source'])
+        cam['is_file'] = '://' not in source and not source.isdigit()
+        if cam['is_file'] and not os.path.isabs(source):
+            cam['source'] = os.path.join(base_dir, source)
+        cam.setdefault('loop', cam['is_file'])
+    return cameras
+
+
+def plan_workers(cameras, streams_per_worker, cores):
+    """
+    Splits cameras into groups of `streams_per_worker` and gives each group a disjoint
+    slice of `cores` (or shares cores round-robin when there are more workers than cores).
+
+    Returns:
+        list: [(camera_group, core_list), ...]
+    """
+    groups = [cameras[i:i + streams_per_worker] for i in range(0, len(cameras), streams_per_worker)]
+    if not cores:
+        return [(group, []) for group in groups]
+    per_worker = max(1, len(cores) // max(len(groups), 1))
+    plan = []
+    for i, group in enumerate(groups):
+        start = (i * per_worker) % len(cores)
+        plan.append((group, cores[start:start + per_worker]))
+    return plan
+
+
+def _emit(telemetry, message):
+    """Best-effort telemetry: a slow supervisor must never stall inference."""
+    try:
+        telemetry.put_nowait(message)
+    except queue.Full:
+        pass
+
+
+def _control(telemetry, message):
+    """Lifecycle messages ('started', 'heartbeat', 'finished') wait for room; only logs are dropped."""
+    telemetry.put(message)
+
+
+class _CameraStream:
+    """Capture + pipeline state for one camera inside a worker."""
+    def __init__(self, cam):
+        from core_pipeline.pipeline import SecureVisionPipeline
+        self.cam = cam
+        self.stream_id = cam['id']
+        self.source = int(cam['source']) if str(cam['source']).isdigit() else cam['source']
+        self.cap = cv2.VideoCapture(self.source)
+        self.pipeline = SecureVisionPipeline(stream_id=self.stream_id)
+        self.pipeline_cls = SecureVisionPipeline
+        self.frame_count = 0
+        self.alert_throttle = LuggageAlertThrottle()
+        # File sources are paced at their native FPS so they behave like live cameras
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if cam['is_file'] else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.next_due = time.monotonic()
+        self.started = 0.0 # When the frame being processed was submitted
+        self.fps = 0.0
+
+    def due(self):
+        return time.monotonic() >= self.next_due
+
+    def warm_up(self):
+        """
+        Pushes one blank frame through the pipeline so lazily loaded models (and any ONNX
+        export) load now rather than on the first real frame, then starts a fresh pipeline.
+        """
+        blank = np.zeros((PROCESSING_WIDTH * 9 // 16, PROCESSING_WIDTH, 3), dtype=np.uint8)
+        self.pipeline.process_frame(blank, 1)
+        self.reset()
+
+    def reset(self):
+        self.pipeline = self.pipeline_cls(stream_id=self.stream_id)
+        self.frame_count = 0
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if ret:
+            return frame
+        self.cap.release()
+        if self.cam['is_file'] and not self.cam['loop']:
+            return None
+        # Looping file or dropped live stream: reopen and start a fresh pipeline (like VIDEO_RESET)
+        if not self.cam['is_file']:
+            time.sleep(1.0)
+        self.cap = cv2.VideoCapture(self.source)
+        self.reset()
+        return None
+
+    def submit(self, frame):
+        """Converts a captured frame and starts its Layer 1 (queued on the shared scheduler, if any)."""
+        self.frame_count += 1
+        self.started = time.time()
+
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w = frame_rgb.shape[:2]
+        frame_small = cv2.resize(frame_rgb, (PROCESSING_WIDTH, int(PROCESSING_WIDTH * h / w)))
+        self.pipeline.submit_frame(frame_small, self.frame_count, full_res_frame=frame_rgb)
+        return frame_small, frame_rgb
+
+    def process(self, frame_small, frame_rgb, telemetry):
+        _, _, log_data = self.pipeline.process_frame(frame_small, self.frame_count, full_res_frame=frame_rgb)
+
+        self.alert_throttle.expire()
+        for item in self.alert_throttle.due(log_data):
+            _emit(telemetry, ('log', self.stream_id, {
+                "type": "CRITICAL",
+                "message": f"[{self.stream_id}] Abandoned Luggage {item['id']}! {item['details']}",
+                "timestamp": time.strftime("%H:%M:%S")
+            }))
+
+        if self.frame_count % 3 == 0:
+            _emit(telemetry, ('log', self.stream_id, {
+                "type": "LIVE_FEED",
+                "objects": log_data,
+                "timestamp": time.strftime("%H:%M:%S")
+            }))
+
+        elapsed = time.time() - self.started
+        self.fps = 1.0 / elapsed if elapsed > 0 else 30.0
+        if self.frame_count % 30 == 0:
+            _emit(telemetry, ('log', self.stream_id, {
+                "fps": round(self.fps, 1),
+                "log": {
+                    "type": "INFO",
+                    "message": f"[{self.stream_id}] Pipeline Running - Frame {self.frame_count}",
+                    "timestamp": time.strftime("%H:%M:%S")
+                }
+            }))
+
+        if self.frame_interval:
+            self.next_due = max(self.next_due + self.frame_interval, time.monotonic() - self.frame_interval)
+
+
+def camera_worker(worker_id, cameras, cores, telemetry, stop_event):
+    """
+    Worker process entry point: runs one SecureVisionPipeline per camera, round-robin.
+
+    Models load once per worker and are shared by its streams; each stream keeps its
+    own tracker, ReID gallery and fight state.
+    """
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+        try:
+            import torch
+            torch.set_num_threads(len(cores))
+        except ImportError:
+            pass
+        cv2.setNumThreads(len(cores))
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The supervisor coordinates shutdown
+
+    streams = [_CameraStream(cam) for cam in cameras]
+    # Models are shared by the worker's streams, so one warm-up loads them all. It runs
+    # before 'started' because the supervisor's heartbeat watchdog arms on that message.
+    if streams:
+        streams[0].warm_up()
+    _control(telemetry, ('started', worker_id, {'streams': [s.stream_id for s in streams], 'cores': list(cores)}))
+
+    last_heartbeat = 0.0
+    while not stop_event.is_set() and streams:
+        # Submit every due stream before processing any, so a shared scheduler batches them
+        submitted = []
+        for stream in list(streams):
+            if not stream.due():
+                continue
+            frame = stream.read()
+            if frame is None:
+                if stream.cam['is_file'] and not stream.cam['loop'] and not stream.cap.isOpened():
+                    streams.remove(stream)
+                continue
+            submitted.append((stream, stream.submit(frame)))
+        for stream, (frame_small, frame_rgb) in submitted:
+            stream.process(frame_small, frame_rgb, telemetry)
+        worked = bool(submitted)
+
+        now = time.monotonic()
+        if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+            _control(telemetry, ('heartbeat', worker_id, {s.stream_id: round(s.fps, 1) for s in streams}))
+            last_heartbeat = now
+        if not worked:
+            time.sleep(0.002)
+
+    _control(telemetry, ('finished', worker_id, None))
+
+
+class _WorkerSlot:
+    __slots__ = ('worker_id', 'cameras', 'cores', 'process', 'last_heartbeat', 'restarts', 'backoff',
+                 'restart_at', 'started_at', 'finished')
+
+    def __init__(self, worker_id, cameras, cores):
+        self.worker_id = worker_id
+        self.cameras = cameras
+        self.cores = cores
+        self.process = None
+        self.last_heartbeat = 0.0
+        self.restarts = 0
+        self.backoff = WORKER_RESTART_BACKOFF_SECONDS
+        self.restart_at = 0.0
+        self.started_at = 0.0
+        self.finished = False
+
+
+class StreamSupervisor:
+    """
+    Starts and watches the camera worker processes.
+
+    - One process per `streams_per_worker` cameras, pinned to a slice of the node's cores.
+    - Crashed or hung (no heartbeat) workers are restarted with exponential backoff.
+    - Worker telemetry arrives over a multiprocessing.Queue and is handed to `on_log`
+      (normally `api.main.broadcast_log_sync`) tagged with its stream_id.
+    """
+    def __init__(self, cameras, on_log, streams_per_worker=STREAMS_PER_WORKER, pin_cpus=WORKER_CPU_PINNING):
+        # 'spawn' gives every worker a clean interpreter (no inherited CUDA context or threads)
+        self.ctx = multiprocessing.get_context('spawn')
+        self.telemetry = self.ctx.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+        self.stop_event = self.ctx.Event()
+        self.on_log = on_log
+
+        cores = sorted(os.sched_getaffinity(0)) if pin_cpus and hasattr(os, 'sched_getaffinity') else []
+        self.workers = [_WorkerSlot(i, group, group_cores)
+                        for i, (group, group_cores) in enumerate(plan_workers(cameras, streams_per_worker, cores))]
+
+    def _start(self, slot):
+        slot.process = self.ctx.Process(target=camera_worker, name=f"CameraWorker-{slot.worker_id}", daemon=True,
+                                        args=(slot.worker_id, slot.cameras, slot.cores, self.telemetry,
+                                              self.stop_event))
+        slot.process.start()
+        slot.started_at = time.monotonic()
+        slot.last_heartbeat = 0.0 # Startup deadline until the first report, then the heartbeat watchdog
+        logger.info(f"[Supervisor] Worker {slot.worker_id} (pid {slot.process.pid}) -> "
+                    f"{[c['id'] for c in slot.cameras]} on cores {slot.cores or 'any'}")
+
+    def start(self):
+        for slot in self.workers:
+            self._start(slot)
+
+    def _drain_telemetry(self, timeout=0.5):
+        try:
+            kind, source, payload = self.telemetry.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            if kind == 'log':
+                payload['stream_id'] = source
+                self.on_log(payload)
+            elif kind in ('heartbeat', 'started'):
+                slot = self.workers[source]
+                slot.last_heartbeat = time.monotonic()
+                # Only a worker that stayed up for a while earns a fresh backoff
+                if slot.last_heartbeat - slot.started_at > MAX_RESTART_BACKOFF:
+                    slot.backoff = WORKER_RESTART_BACKOFF_SECONDS
+            elif kind == 'finished':
+                self.workers[source].finished = True
+            try:
+                kind, source, payload = self.telemetry.get_nowait()
+            except queue.Empty:
+                return
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for slot in self.workers:
+            if slot.finished:
+                continue
+            alive = slot.process.is_alive()
+            if alive and slot.last_heartbeat:
+                hung = now - slot.last_heartbeat > WORKER_HEARTBEAT_TIMEOUT_SECONDS
+                reason = "missed heartbeats"
+            else:
+                # Not started yet: capture setup or model warm-up may hang (dead RTSP source, stuck export)
+                hung = now - slot.started_at > WORKER_STARTUP_TIMEOUT_SECONDS
+                reason = "did not start in time"
+            if alive and hung:
+                logger.error(f"[Supervisor] Worker {slot.worker_id} {reason}; terminating.")
+                slot.process.terminate()
+                slot.process.join(timeout=5.0)
+                alive = False
+
+            if alive:
+                continue
+            if not slot.restart_at:
+                # A worker that just finished may exit before its 'finished' message is drained
+                self._drain_telemetry(timeout=0.1)
+                if slot.finished:
+                    continue
+                slot.restart_at = now + slot.backoff
+                logger.error(f"[Supervisor] Worker {slot.worker_id} exited (code {slot.process.exitcode}); "
+                             f"restarting in {slot.backoff:.1f}s.")
+                self.on_log({"type": "CRITICAL",
+                             "message": f"Camera worker for {[c['id'] for c in slot.cameras]} crashed. Restarting.",
+                             "timestamp": time.strftime("%H:%M:%S")})
+            elif now >= slot.restart_at:
+                slot.restarts += 1
+                slot.backoff = min(slot.backoff * 2, MAX_RESTART_BACKOFF)
+                slot.restart_at = 0.0
+                self._start(slot)
+
+    def run(self, running=lambda: True):
+        """Supervises until `running()` is False or every (non-looping) stream has finished."""
+        self.start()
+        while running() and not all(slot.finished for slot in self.workers):
+            self._drain_telemetry()
+            self._check_workers()
+        self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        for slot in self.workers:
+            if slot.process is not None:
+                slot.process.join(timeout=5.0)
+                if slot.process.is_alive():
+                    slot.process.terminate()
+
+    def get_stats(self):
+        return {slot.worker_id: {'streams': [c['id'] for c in slot.cameras], 'cores': slot.cores,
+                                 'alive': slot.process is not None and slot.process.is_alive(),
+                                 'restarts': slot.restarts}
+                for slot in self.workers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one SecureVision pipeline per camera across worker processes.")
+    parser.add_argument('--cameras', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          CAMERA_CONFIG_PATH))
+    parser.add_argument('--streams-per-worker', type=int, default=STREAMS_PER_WORKER)
+    parser.add_argument('--no-pin', action='store_true', help="Disable CPU affinity pinning")
+    args = parser.parse_args()
+
+    # API (and its DB/pipeline imports) live only in the supervisor process
+    import uvicorn
+    from api.main import app, broadcast_log_sync
+
+    api_thread = threading.Thread(target=lambda: uvicorn.run(app, host="0.0.0.0", port=8001, log_level="info"),
+                                  daemon=True)
+    api_thread.start()
+
+    cameras = load_cameras(args.cameras)
+    supervisor = StreamSupervisor(cameras, broadcast_log_sync, args.streams_per_worker, not args.no_pin)
+    logger.info(f"[Supervisor] {len(cameras)} cameras across {len(supervisor.workers)} worker processes.")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda sig, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda sig, frame: stop.set())
+    supervisor.run(running=lambda: not stop.is_set())
+    logger.info("[Supervisor] Shutdown complete.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import sys
+import os
+import unittest
+import numpy as np
+import torch
+
+# Adjust path to import core modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core_pipeline.fightnet_integration import extract_features, compute_angle, normalize_skeleton, FightNet
+from core_pipeline.fightnet_streaming import StreamingFightNet, frame_feature_rows
+from utils.pose_window import PoseWindow
+
+def loop_extract_features(pose_window):
+    """Original per-frame implementation of `extract_features`, kept as the reference."""
+    if pose_window.ndim == 4:
+        T, P, K, D = pose_window.shape
+        pose_window = pose_window.reshape(T, P*K*D)
+
+    pose_window = np.nan_to_num(pose_window, nan=0.0)
+    T = pose_window.shape[0]
+
+    if T < 2:
+        return np.zeros((1, 150), dtype=np.float32)
+
+    p1 = pose_window[:, :34].reshape(T, 17, 2)
+    p2 = pose_window[:, 34:].reshape(T, 17, 2)
+
+    p1 = normalize_skeleton(p1)
+    p2 = normalize_skeleton(p2)
+
+    rel_joints = p1 - p2
+    rel_joints_flat = rel_joints.reshape(T, -1)
+
+    def get_angles(person):
+        return np.stack([
+            compute_angle(person[:, 5], person[:, 7], person[:, 9]),
+            compute_angle(person[:, 6], person[:, 8], person[:, 10]),
+            compute_angle(person[:, 11], person[:, 13], person[:, 15]),
+            compute_angle(person[:, 12], person[:, 14], person[:, 16])
+        ], axis=1)
+
+    angle_features = np.concatenate([get_angles(p1), get_angles(p2)], axis=1)
+
+    p1_center = p1.mean(axis=1)
+    p2_center = p2.mean(axis=1)
+    inter_dist = np.linalg.norm(p1_center - p2_center, axis=1, keepdims=True)
+
+    combined = np.concatenate([p1.reshape(T, -1), p2.reshape(T, -1)], axis=1)
+    velocities = combined[1:] - combined[:-1]
+    speed = np.linalg.norm(velocities, axis=1, keepdims=True)
+
+    rel_vel = rel_joints[1:] - rel_joints[:-1]
+    rel_speed = np.linalg.norm(rel_vel.reshape(T - 1, -1), axis=1, keepdims=True)
+
+    # Contact-Aware Features
+    wrists = [9, 10]
+    knees = [15, 16]
+    head = [0]
+    torso = [5, 6, 11, 12]
+
+    contact_features = []
+    for t in range(T):
+        frame_features = []
+        for w in wrists:
+            for h in head:
+                frame_features.append(np.linalg.norm(p1[t, w] - p2[t, h]))
+                frame_features.append(np.linalg.norm(p2[t, w] - p1[t, h]))
+            for tr in torso:
+                frame_features.append(np.linalg.norm(p1[t, w] - p2[t, tr]))
+                frame_features.append(np.linalg.norm(p2[t, w] - p1[t, tr]))
+        for k in knees:
+            for tr in torso:
+                frame_features.append(np.linalg.norm(p1[t, k] - p2[t, tr]))
+                frame_features.append(np.linalg.norm(p2[t, k] - p1[t, tr]))
+
+        dists = np.linalg.norm(p1[t][:, None, :] - p2[t][None, :, :], axis=-1)
+        frame_features.append(np.min(dists))
+        contact_features.append(frame_features)
+
+    contact_features = np.array(contact_features)
+
+    features = np.concatenate([
+        velocities,
+        speed,
+        rel_joints_flat[1:],
+        rel_speed,
+        angle_features[1:],
+        inter_dist[1:],
+        contact_features[1:]
+    ], axis=1)
+
+    return features.astype(np.float32)
+
+
+class TestFightNetFeatures(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def window(self, T):
+        window = self.rng.normal(0, 80, (T, 2, 17, 2)).astype(np.float32)
+        window[0, 1, 3] = np.nan # Missing keypoint
+        return window
+
+    def test_matches_loop_implementation(self):
+        for T in (1, 2, 15, 30):
+            window = self.window(T)
+            expected = loop_extract_features(window.copy())
+            actual = extract_features(window.copy())
+            self.assertEqual(actual.shape, expected.shape)
+            self.assertEqual(actual.dtype, np.float32)
+            np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-4)
+
+        flat = self.window(10)
+        np.testing.assert_allclose(extract_features(flat.reshape(10, 68)), loop_extract_features(flat.reshape(10, 68)),
+                                   rtol=1e-5, atol=1e-4)
+
+    def test_batch_matches_single_windows(self):
+        windows = np.stack([self.window(20) for _ in range(4)])
+        batch = extract_features(windows)
+        self.assertEqual(batch.shape, (4, 19, 150))
+        for window, features in zip(windows, batch):
+            np.testing.assert_allclose(features, loop_extract_features(window), rtol=1e-5, atol=1e-4)
+
+    def test_pose_window_slides_without_copies(self):
+        window = PoseWindow(4, shape=(2, 17, 2))
+        frames = [self.rng.normal(0, 50, (2, 17, 2)).astype(np.float32) for _ in range(11)]
+        for t, frame in enumerate(frames):
+            window.append(frame)
+            expected = np.stack(frames[max(0, t - 3):t + 1])
+            view = window.view()
+            np.testing.assert_array_equal(view, expected)
+            self.assertTrue(np.shares_memory(view, window._data), "view() must not copy")
+            np.testing.assert_array_equal(window[-1], frame)
+        np.testing.assert_array_equal(extract_features(np.array(window)), extract_features(np.stack(frames[-4:])))
+
+    def test_streaming_matches_full_window(self):
+        torch.manual_seed(0)
+        model = FightNet().eval()
+        for module in model.temporal:
+            if isinstance(module, torch.nn.BatchNorm1d): # Non-trivial folded BatchNorm
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+
+        streaming = StreamingFightNet(model, capacity=9)
+        state, features = streaming.new_state(), PoseWindow(9, shape=(150,))
+        poses = []
+        for t in range(25): # Window fills, then slides
+            pose = self.rng.normal(0, 60, (2, 17, 2)).astype(np.float32)
+            if poses:
+                row = frame_feature_rows(poses[-1][None], pose[None])[0]
+                features.append(row)
+                prob = streaming.push(state, row)
+            poses = (poses + [pose])[-10:]
+            if len(poses) < 2:
+                continue
+
+            window = extract_features(np.array(poses))
+            np.testing.assert_allclose(features.view(), window, rtol=1e-5, atol=1e-4)
+            with torch.no_grad():
+                expected = torch.sigmoid(model(torch.from_numpy(window)[None])).item()
+            self.assertAlmostEqual(prob, expected, places=5)
+
+    def test_padded_batch_matches_single_windows(self):
+        torch.manual_seed(1)
+        model = FightNet().eval()
+        for module in model.temporal:
+            if isinstance(module, torch.nn.BatchNorm1d):
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+
+        windows = [self.rng.normal(0, 1, (n, 150)).astype(np.float32) for n in (14, 21, 28, 14)]
+        batch = np.zeros((len(windows), 28, 150), dtype=np.float32)
+        for row, window in enumerate(windows):
+            batch[row, :len(window)] = window
+        with torch.no_grad():
+            padded = model(torch.from_numpy(batch), torch.tensor([len(w) for w in windows]))
+            for row, window in enumerate(windows):
+                self.assertAlmostEqual(padded[row].item(), model(torch.from_numpy(window)[None]).item(), places=5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,8 @@ from collections import deque
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core_pipeline.tracker_state import TrackerState
+from core_pipeline.detections import Detections, CLASS_IDS
+from core_pipeline.spatial_index import SpatialGrid, nearest_within
 from config import LUGGAGE_PROXIMITY_THRESHOLD
 
 class TestLuggageLogic(unittest.TestCase):
@@ -85,5 +87,111 @@ class TestLuggageLogic(unittest.TestCase):
         self.assertIn('is_abandoned_event_triggered', bag_track, "Flag should be initialized")
         self.assertFalse(bag_track['is_abandoned_event_triggered'], "Flag should be False initially")
 
+    def test_columnar_detections_update(self):
+        # Same scene as the dict-based tests, delivered as a Detections batch
+        detections = Detections(
+            xyxy=[[90, 90, 110, 110], [100, 100, 110, 110]],
+            class_id=[CLASS_IDS['person'], CLASS_IDS['backpack']],
+            confidence=[0.9, 0.5],
+            track_id=[1, 99],
+        )
+        self.tracker.update(detections, self.step())
+        self.tracker.assign_owners()
+
+        self.assertEqual(self.tracker.get_track(1)['class'], 'person')
+        self.assertEqual(list(self.tracker.get_track(99)['centroid'][-1]), [105.0, 105.0])
+        self.assertEqual(self.tracker.get_track(99)['owner_id'], 1, "Owner should be assigned from columnar input")
+
+    def test_track_store_history_ring(self):
+        # History is a fixed-size ring per track; the dict view still reads like the old deque
+        tracker = TrackerState(history_len=4)
+        for f in range(1, 7):
+            tracker.update([{'track_id': 7, 'class': 'person', 'bbox': [f, f, f + 10, f + 10],
+                             'centroid': [f * 3.0, 0.0]}], f)
+
+        track = tracker.get_track(7)
+        self.assertEqual(len(track['centroid']), 4)
+        self.assertEqual([c[0] for c in track['centroid']], [9.0, 12.0, 15.0, 18.0])
+        self.assertEqual(track['bbox'][-1], [6.0, 6.0, 16.0, 16.0])
+
+        # Vectorized speed matches the per-track formula: |c[-1] - c[-3]| / 3
+        slot = tracker.store.slot_of[7]
+        self.assertAlmostEqual(float(tracker.store.velocity([slot])[0]), (18.0 - 12.0) / 3.0)
+
+        # Constant-velocity prediction continues the ring but is not a detection
+        tracker.predict(7)
+        self.assertEqual(track['centroid'][-1], [21.0, 0.0])
+        self.assertEqual(track['last_seen'], 7)
+        self.assertEqual(track['frames_detected'], 6)
+
+    def test_refresh_keeps_tracks_alive_without_history(self):
+        # Motion-gated frames refresh the last detections instead of appending them again
+        detections = Detections(xyxy=[[0, 0, 10, 10]], class_id=[CLASS_IDS['gun']], confidence=[0.9], track_id=[5])
+        self.tracker.update(detections, self.step())
+        for _ in range(3):
+            self.tracker.refresh(detections, self.step())
+
+        track = self.tracker.get_track(5)
+        self.assertEqual(len(track['bbox']), 1, "Replayed frames must not count towards the weapon debounce")
+        self.assertEqual(track['frames_detected'], 1)
+        self.assertEqual(track['last_seen'], self.frame_num)
+        self.assertEqual([tid for tid, _ in self.tracker.iter_active(max_age=0)], [5])
+
+    def test_active_index_skips_dead_tracks(self):
+        tracker = TrackerState()
+        tracker.update([{'track_id': 1, 'class': 'person', 'bbox': [0, 0, 10, 10], 'centroid': [5, 5]},
+                        {'track_id': 99, 'class': 'backpack', 'bbox': [0, 0, 10, 10], 'centroid': [5, 5]}], 1)
+        for f in range(2, tracker.active_window + 3):
+            tracker.update([{'track_id': 2, 'class': 'person', 'bbox': [0, 0, 10, 10], 'centroid': [5, 5]}], f)
+
+        # Track 1 and the bag fell out of the window; the store still holds them
+        self.assertEqual([tid for tid, _ in tracker.iter_active(['person'])], [2])
+        self.assertEqual(list(tracker.iter_active(['backpack'])), [])
+        self.assertIn(1, tracker.get_all_tracks())
+
+        # Seen again -> back in the index, newest first
+        tracker.update([{'track_id': 1, 'class': 'person', 'bbox': [0, 0, 10, 10], 'centroid': [5, 5]}], f + 1)
+        self.assertEqual([tid for tid, _ in tracker.iter_active(['person'])], [1, 2])
+        self.assertEqual([tid for tid, _ in tracker.iter_active(['person'], max_age=0)], [1])
+
+    def test_dead_tracks_are_released(self):
+        tracker = TrackerState()
+        released = []
+        tracker.add_release_listener(released.append)
+        tracker.update([{'track_id': 1, 'class': 'person', 'bbox': [0, 0, 10, 10], 'centroid': [5, 5]}], 1)
+        tracker.set_mapping(1, 42)
+
+        ttl = tracker._lifecycle.ttl
+        tracker.update([], ttl + 1)
+        self.assertIn(1, tracker.get_all_tracks(), "Track is kept until its TTL has fully elapsed")
+        tracker.update([], ttl + 2)
+
+        self.assertNotIn(1, tracker.get_all_tracks())
+        self.assertNotIn(1, tracker.id_map)
+        self.assertEqual(released, [1])
+        self.assertEqual(tracker.get_stats()['evicted_ttl'], 1)
+
+        # The freed slot is reused with a fresh history
+        tracker.update([{'track_id': 2, 'class': 'person', 'bbox': [0, 0, 10, 10], 'centroid': [5, 5]}], ttl + 3)
+        self.assertEqual(len(tracker.get_track(2)['centroid']), 1)
+        self.assertEqual(len(tracker.store), 1)
+
+    def test_spatial_grid_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        radius = float(LUGGAGE_PROXIMITY_THRESHOLD)
+        persons = rng.uniform(-500, 2500, (300, 2))
+        luggage = rng.uniform(-500, 2500, (120, 2))
+        luggage[:10] = persons[:10]  # Exact overlaps
+
+        dense_idx, dense_dist = nearest_within(luggage, persons, radius, dense_limit=10 ** 9)
+        grid_idx, grid_dist = SpatialGrid(persons, radius).nearest_within(luggage, radius)
+        np.testing.assert_array_equal(grid_idx, dense_idx)
+        np.testing.assert_allclose(grid_dist, dense_dist, rtol=1e-5)
+
+        i, j, _ = SpatialGrid(persons, radius).pairs_within(radius)
+        dist = np.linalg.norm(persons[:, None] - persons[None], axis=2)
+        expected = set(zip(*np.nonzero(np.triu(dist < radius, 1))))
+        self.assertEqual(set(zip(i.tolist(), j.tolist())), {(int(a), int(b)) for a, b in expected})
+
 if __name__ == '__main__':
     unittest.main()
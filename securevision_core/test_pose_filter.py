@@ -0,0 +1,41 @@
+import sys
+import os
+import unittest
+import numpy as np
+
+# Adjust path to import core modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core_pipeline.fused_layer1 import letterbox
+from core_pipeline.pose_filter import roi_keypoints, PoseKeypointFilter
+
+
+class TestRoiKeypoints(unittest.TestCase):
+    def test_low_confidence_joints_are_not_visible(self):
+        roi = np.zeros((300, 120, 3), dtype=np.uint8)
+        _, ratio, pad = letterbox(roi, new_shape=640, auto=False)
+        left, top = int(round(pad[0] - 0.1)), int(round(pad[1] - 0.1))
+
+        expected = np.stack([np.linspace(10, 110, 17), np.linspace(20, 280, 17)], axis=1).astype(np.float32)
+        kpts = np.ones((17, 3), dtype=np.float32)
+        kpts[:, :2] = expected * ratio + (left, top)
+        kpts[9, 2] = 0.3 # Occluded left wrist
+
+        xy = roi_keypoints(kpts, ratio, pad, roi.shape[:2])
+        np.testing.assert_array_equal(xy[9], [0, 0])
+        visible = np.arange(17) != 9
+        np.testing.assert_allclose(xy[visible], expected[visible], atol=1e-3)
+
+    def test_occluded_wrist_gives_no_contact_score(self):
+        pose_filter = PoseKeypointFilter.__new__(PoseKeypointFilter) # Scoring only, no model
+        pose_filter.keypoint_history = {}
+        pose_filter.HISTORY_SIZE = 10
+        kpts = np.zeros((17, 2), dtype=np.float32)
+        kpts[[5, 6, 11, 12]] = [[40, 80], [80, 80], [40, 160], [80, 160]] # Torso
+        # Left wrist occluded (zeroed by roi_keypoints), right wrist far from the torso
+        kpts[10] = [115, 290]
+        self.assertEqual(pose_filter._update_score(1, kpts, roi_h=300), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,10 @@ import torch
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core_pipeline.reid_manager import ReIDManager
+from core_pipeline.reid_gallery import ReIDGallery
+from core_pipeline.reid_index import IVFIndex
+from core_pipeline.reid_compaction import EmbeddingProjection
+from core_pipeline.reid_scheduler import ReIDExtractionScheduler
 from config import USE_CUDA
 
 class TestReIDManager(unittest.TestCase):
@@ -46,5 +50,102 @@ class TestReIDManager(unittest.TestCase):
         # Ideally check score < threshold, but for random noise it's unpredictable 
         # without real data. We just assert no crash here.
 
+
+class TestReIDGallery(unittest.TestCase):
+    def test_batch_matches_per_identity_scan(self):
+        rng = np.random.default_rng(0)
+        gallery = ReIDGallery(dim=64, per_identity=5, initial_identities=2) # Forces growth
+        bank = {}
+        for _ in range(400):
+            pid = int(rng.integers(0, 60))
+            embedding = torch.nn.functional.normalize(torch.randn(1, 64), dim=1)
+            gallery.add(pid, embedding)
+            bank.setdefault(pid, []).append(embedding)
+            bank[pid] = bank[pid][-5:]
+        for pid in (3, 17, 42): # Freed blocks must never match
+            gallery.remove(pid)
+            bank.pop(pid, None)
+
+        queries = torch.nn.functional.normalize(torch.randn(16, 64), dim=1)
+        ids, scores = gallery.best_matches(queries)
+        for query, pid, score in zip(queries, ids, scores):
+            expected = {p: torch.nn.functional.cosine_similarity(query[None], torch.cat(e)).max().item()
+                        for p, e in bank.items()}
+            best = max(expected, key=expected.get)
+            self.assertEqual(pid, best)
+            self.assertAlmostEqual(float(score), expected[best], places=5)
+
+    def test_keeps_most_recent_embeddings(self):
+        gallery = ReIDGallery(dim=4, per_identity=2)
+        for value in range(1, 4):
+            gallery.add(7, np.eye(4, dtype=np.float32)[value])
+        np.testing.assert_allclose(gallery.embeddings(7), np.eye(4)[2:4])
+        self.assertEqual(gallery.best_matches(np.eye(4, dtype=np.float32)[[1]])[1][0], 0.0)
+
+    def test_ivf_index_with_full_probe_is_exact(self):
+        rng = np.random.default_rng(1)
+        exact = ReIDGallery(dim=32, initial_identities=4)
+        indexed = ReIDGallery(dim=32, initial_identities=4, index=IVFIndex(32, nprobe=10 ** 6, min_train=200))
+        for _ in range(2000): # Trains and retrains the index; ring overwrites and evictions update it
+            pid = int(rng.integers(0, 150))
+            if rng.random() < 0.05:
+                exact.remove(pid)
+                indexed.remove(pid)
+                continue
+            embedding = rng.standard_normal((1, 32)).astype(np.float32)
+            exact.add(pid, embedding)
+            indexed.add(pid, embedding)
+        self.assertGreater(indexed.index.nlist, 1)
+
+        queries = rng.standard_normal((20, 32)).astype(np.float32)
+        expected_ids, expected_scores = exact.best_matches(queries)
+        ids, scores = indexed.best_matches(queries)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(scores, expected_scores, atol=1e-5)
+
+    def test_compact_storage_matches_float32(self):
+        rng = np.random.default_rng(2)
+        embeddings = rng.standard_normal((300, 96)).astype(np.float32) @ rng.standard_normal((96, 256)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        projection, _ = EmbeddingProjection.fit(embeddings, 64)
+        compact = projection(embeddings)
+        self.assertEqual(compact.shape, (300, 64))
+
+        galleries = {storage: ReIDGallery(storage=storage) for storage in ('float32', 'float16', 'int8')}
+        for row, vector in enumerate(compact):
+            for gallery in galleries.values():
+                gallery.add(row // 5, vector)
+        self.assertLess(galleries['int8'].nbytes * 3, galleries['float32'].nbytes)
+
+        queries = projection(embeddings[::7] + 0.05 * rng.standard_normal((len(embeddings[::7]), 256)).astype(np.float32))
+        expected_ids, expected_scores = galleries['float32'].best_matches(queries)
+        for storage in ('float16', 'int8'):
+            ids, scores = galleries[storage].best_matches(queries)
+            np.testing.assert_array_equal(ids, expected_ids)
+            np.testing.assert_allclose(scores, expected_scores, atol=0.01)
+
+
+class TestReIDExtractionScheduler(unittest.TestCase):
+    def test_extracts_on_appearance_change_and_reappearance(self):
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        frame[:, :320] = (200, 30, 30)
+        frame[:, 320:] = (30, 30, 200)
+        scheduler = ReIDExtractionScheduler(adaptive=True)
+        extracted = []
+        for frame_number in range(1, 201):
+            ids = [1] if 100 < frame_number < 130 else [1, 2] # Track 2 occluded for a second
+            boxes = {1: [100, 100, 160, 260] if frame_number < 150 else [400, 100, 460, 260], # 1 walks into blue
+                     2: [500, 100, 560, 260]}
+            due = scheduler.select(frame, ids, [boxes[t] for t in ids], [min(frame_number, 70)] * len(ids), frame_number)
+            for index in due:
+                scheduler.record(ids[index], torch.zeros(1, 8), frame_number)
+                extracted.append((frame_number, ids[index]))
+
+        self.assertEqual(extracted, [(5, 1), (5, 2), (130, 2), (150, 1)])
+        stats = scheduler.get_stats()
+        self.assertEqual(stats['by_reason'], {'new': 2, 'reappeared': 1, 'appearance': 1})
+        self.assertEqual(stats['saved'], 4) # Fixed rule: ages 30 and 60 for both tracks
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,44 @@
+import time
+from config import LUGGAGE_CLASSES, LUGGAGE_ALERT_COOLDOWN_SECONDS, SENT_ALERTS_MAX
+from utils.state_expiry import ExpiringDict
+
+
+class LuggageAlertThrottle:
+    """
+    Picks the abandoned-luggage alerts worth sending from a frame's log_data, at most one
+    per luggage ID every `cooldown` seconds. Shared by run_system.py and the supervisor's
+    camera workers so both front ends alert the same way.
+
+    Args:
+        cooldown (float): Seconds before re-alerting for the same luggage ID if it recurs.
+    """
+    def __init__(self, cooldown=LUGGAGE_ALERT_COOLDOWN_SECONDS):
+        self.cooldown = cooldown
+        # Dict[luggage ID, time.monotonic() of the last alert]; entries are useless once
+        # the cooldown has passed, so they expire with it
+        self.sent_alerts = ExpiringDict('sent_alerts', ttl=cooldown, max_size=SENT_ALERTS_MAX, clock='seconds')
+
+    def due(self, log_data):
+        """
+        Args:
+            log_data (list): Pipeline objects ({id, category, status, details}) for one frame.
+
+        Returns:
+            list: Abandoned luggage items to alert on now (recorded as sent).
+        """
+        now = time.monotonic()
+        due = []
+        for item in log_data or []:
+            if (item.get("category") in LUGGAGE_CLASSES and "ABANDONED" in item.get("details", "")
+                    and item.get("status") == "CRITICAL"):
+                last_sent = self.sent_alerts.get(item['id'])
+                if last_sent is None or now - last_sent > self.cooldown:
+                    self.sent_alerts[item['id']] = now
+                    due.append(item)
+        return due
+
+    def expire(self):
+        self.sent_alerts.expire()
+
+    def get_stats(self):
+        return self.sent_alerts.get_stats()
@@ -0,0 +1,155 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# Header layout (int64): [write_seq, read_seq, closed, slot_0 meta..., slot_1 meta..., ...]
+# Slot meta: [seq, epoch, height, width]
+_GLOBAL_FIELDS = 3
+_SLOT_FIELDS = 4
+_WRITE_SEQ, _READ_SEQ, _CLOSED = 0, 1, 2
+_SEQ, _EPOCH, _HEIGHT, _WIDTH = 0, 1, 2, 3
+_WRITING = -1
+
+
+class SharedFrameRing:
+    """
+    Zero-copy frame bus between processes, built on `multiprocessing.shared_memory`.
+
+    A preallocated ring of fixed-size uint8 frame slots. One writer (the decoder) copies
+    each frame into the next slot and publishes it with a sequence number; readers get
+    NumPy views straight into shared memory, so nothing is pickled or copied per frame.
+
+    - The primary consumer (inference) calls `read_next` and `ack`, which gives the
+      writer back-pressure so file playback never drops frames.
+    - Best-effort consumers (MJPEG streaming) call `read_latest` and never block the writer.
+
+    Views stay valid until the writer laps the ring; `is_current(seq)` tells a reader
+    whether the slot was overwritten while it was using it.
+    """
+    def __init__(self, name=None, slots=8, frame_shape=(1080, 1920, 3), create=True):
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        self.slot_bytes = int(np.prod(self.frame_shape))
+        header_bytes = 8 * (_GLOBAL_FIELDS + slots * _SLOT_FIELDS)
+
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=header_bytes + slots * self.slot_bytes)
+        else:
+            # Child processes share the creator's resource tracker, so only the creator unlinks
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self._owner = create
+
+        self._header = np.ndarray((_GLOBAL_FIELDS + slots * _SLOT_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        self._meta = self._header[_GLOBAL_FIELDS:].reshape(slots, _SLOT_FIELDS)
+        self._data = np.ndarray((slots,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+
+        if create:
+            self._header[:] = 0
+            self._meta[:, _SEQ] = _WRITING
+
+    @classmethod
+    def attach(cls, name, slots, frame_shape):
+        """Opens an existing ring created by another process."""
+        return cls(name=name, slots=slots, frame_shape=frame_shape, create=False)
+
+    def spec(self):
+        """Everything another process needs to `attach` (picklable)."""
+        return {'name': self.name, 'slots': self.slots, 'frame_shape': self.frame_shape}
+
+    # --- Writer ---
+    def write(self, frame, epoch=0, block=True, timeout=None):
+        """
+        Copies `frame` into the next slot and publishes it.
+
+        Args:
+            frame (np.array): HxWx3 uint8, at most `frame_shape`.
+            epoch (int): Source generation (bumped when the playlist moves to a new video).
+            block (bool): Wait for the primary consumer if the ring is full.
+
+        Returns:
+            int: Sequence number of the written frame, or -1 if it timed out / ring closed.
+        """
+        h, w = frame.shape[:2]
+        if h > self.frame_shape[0] or w > self.frame_shape[1]:
+            raise ValueError(f"Frame {frame.shape} exceeds ring slot shape {self.frame_shape}")
+
+        seq = int(self._header[_WRITE_SEQ]) + 1
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while block and seq - int(self._header[_READ_SEQ]) >= self.slots:
+            if self._header[_CLOSED] or (deadline is not None and time.monotonic() > deadline):
+                return -1
+            time.sleep(0.001)
+
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        meta[_SEQ] = _WRITING
+        self._data[slot, :h, :w] = frame
+        meta[_EPOCH], meta[_HEIGHT], meta[_WIDTH] = epoch, h, w
+        meta[_SEQ] = seq
+        self._header[_WRITE_SEQ] = seq
+        return seq
+
+    def close_writer(self):
+        """Marks end of stream; blocked readers return None."""
+        self._header[_CLOSED] = 1
+
+    # --- Readers ---
+    def _view(self, seq):
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        if meta[_SEQ] != seq:
+            return None
+        frame = self._data[slot, :meta[_HEIGHT], :meta[_WIDTH]]
+        return int(meta[_EPOCH]), frame
+
+    def read_next(self, last_seq, timeout=1.0):
+        """
+        Waits for the frame after `last_seq` (primary consumer).
+
+        Returns:
+            tuple | None: (seq, epoch, frame_view), or None on timeout / closed ring.
+        """
+        seq = last_seq + 1
+        deadline = time.monotonic() + timeout
+        while int(self._header[_WRITE_SEQ]) < seq:
+            if self._header[_CLOSED] or time.monotonic() > deadline:
+                return None
+            time.sleep(0.001)
+
+        view = self._view(seq)
+        if view is None:
+            # Overwritten (consumer without ack fell a full ring behind): jump to the newest frame
+            return self.read_latest()
+        return (seq,) + view
+
+    def read_latest(self):
+        """Most recently published frame (best-effort consumers). Returns (seq, epoch, view) or None."""
+        seq = int(self._header[_WRITE_SEQ])
+        if seq == 0:
+            return None
+        view = self._view(seq)
+        return None if view is None else (seq,) + view
+
+    def ack(self, seq):
+        """Primary consumer is done with every frame up to `seq`; the writer may reuse their slots."""
+        self._header[_READ_SEQ] = seq
+
+    def is_current(self, seq):
+        """False if the slot holding `seq` was overwritten since it was read."""
+        return self._meta[seq % self.slots, _SEQ] == seq
+
+    @property
+    def closed(self):
+        return bool(self._header[_CLOSED])
+
+    def close(self):
+        # Drop array views before closing the mapping
+        del self._header, self._meta, self._data
+        try:
+            self.shm.close()
+        except BufferError:
+            # A caller still holds a frame view; the mapping is released with it
+            pass
+        if self._owner:
+            self.shm.unlink()
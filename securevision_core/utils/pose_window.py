@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class PoseWindow:
+    """
+    Fixed-capacity sliding window of equally shaped arrays (pose frames, wrist pairs,
+    feature rows) backed by one preallocated NumPy buffer.
+
+    Every item is written twice, at `i` and `i + capacity` of a (2 * capacity, ...)
+    array, so the window oldest-to-newest is always the contiguous slice
+    `[start, start + count)`: `view()` is zero-copy and appending never allocates or
+    shifts. Views are read-only and only valid until the next `append`.
+
+    Args:
+        capacity (int): Items kept; the oldest is dropped beyond this.
+        shape (tuple): Shape of one item, e.g. (2, 17, 2) for a pair's keypoints.
+        dtype: Element type of the buffer.
+    """
+    def __init__(self, capacity, shape=(2, 17, 2), dtype=np.float32):
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity,) + tuple(shape), dtype=dtype)
+        self._start = 0  # Physical index of the oldest item, in [0, capacity)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, item):
+        if self._count < self.capacity:
+            pos = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            # Full: overwrite the oldest item and move the window forward
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._data[pos] = item
+        self._data[pos + self.capacity] = item
+
+    def view(self):
+        """(count, *shape) window, oldest first, without copying."""
+        view = self._data[self._start:self._start + self._count]
+        view.flags.writeable = False
+        return view
+
+    def copy(self):
+        """Owned copy of the window (safe to keep or hand to another thread)."""
+        return self._data[self._start:self._start + self._count].copy()
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.view(), dtype=dtype)
+
+    def __repr__(self):
+        return f"PoseWindow({self._count}/{self.capacity}, shape={self._data.shape[1:]})"
@@ -0,0 +1,119 @@
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class ExpiringDict(MutableMapping):
+    """
+    Dict with per-entry TTL and an LRU size cap, for pipeline state that must stay bounded
+    during 24/7 operation.
+
+    Entries are kept in last-write order, so both the TTL sweep and LRU eviction only ever
+    pop from the front (O(evicted)). Reads do not refresh an entry; writes (`d[k] = v`)
+    and `touch(k)` do.
+
+    Args:
+        name (str): Label used in stats.
+        ttl (float): Entries not written for this long are dropped (None = no TTL).
+        max_size (int): Oldest entries are evicted beyond this many (None = unbounded).
+        clock (str): 'frames' (the caller advances time with `expire(frame_number)`) or
+                     'seconds' (wall clock, `time.monotonic`).
+        on_evict (callable): Called as on_evict(key, value) for every TTL/LRU eviction.
+    """
+    def __init__(self, name, ttl=None, max_size=None, clock='frames', on_evict=None):
+        if clock not in ('frames', 'seconds'):
+            raise ValueError(f"Unknown clock '{clock}' (expected 'frames' or 'seconds')")
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.on_evict = on_evict
+        self._data = OrderedDict()  # key -> (value, touched_at)
+        self._frame = 0
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+
+    def _now(self):
+        return time.monotonic() if self.clock == 'seconds' else self._frame
+
+    # --- Mapping protocol ---
+    def __getitem__(self, key):
+        return self._data[key][0]
+
+    def __setitem__(self, key, value):
+        self._data[key] = (value, self._now())
+        self._data.move_to_end(key)
+        if self.max_size is not None and len(self._data) > self.max_size:
+            self._evict_front(len(self._data) - self.max_size, ttl=False)
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def items(self):
+        return [(k, v) for k, (v, _) in self._data.items()]
+
+    def values(self):
+        return [v for v, _ in self._data.values()]
+
+    # --- Lifecycle ---
+    def touch(self, key):
+        """Marks an entry as used now (e.g. after mutating its value in place)."""
+        value, _ = self._data[key]
+        self._data[key] = (value, self._now())
+        self._data.move_to_end(key)
+
+    def _evict_front(self, count, ttl):
+        for _ in range(count):
+            key, (value, _) = self._data.popitem(last=False)
+            if ttl:
+                self.evicted_ttl += 1
+            else:
+                self.evicted_lru += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+
+    def advance(self, now):
+        """Moves a 'frames' clock forward without evicting (so writes this frame get `now`)."""
+        self._frame = now
+
+    def expire(self, now=None):
+        """
+        Drops entries older than the TTL.
+
+        Args:
+            now (int): Current frame number for 'frames' clocks (ignored for 'seconds').
+
+        Returns:
+            int: Number of entries evicted.
+        """
+        if now is not None and self.clock == 'frames':
+            self._frame = now
+        if self.ttl is None:
+            return 0
+        cutoff = self._now() - self.ttl
+        expired = 0
+        for _, touched_at in self._data.values():
+            if touched_at >= cutoff:
+                break
+            expired += 1
+        self._evict_front(expired, ttl=True)
+        return expired
+
+    def get_stats(self):
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'clock': self.clock,
+            'evicted_ttl': self.evicted_ttl,
+            'evicted_lru': self.evicted_lru,
+        }